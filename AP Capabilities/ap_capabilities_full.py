@@ -3,24 +3,65 @@ import json
 import os
 import sys
 import argparse
+import atexit
 import csv
+import functools
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-# --- MONITOR INTERFACE SETUP ---
-def setup_monitor(base_iface="wlan0", mon_iface="mon0"):
-    print(f"[INFO] Creating monitor interface '{mon_iface}' from '{base_iface}'...")
-    subprocess.run(["iw", "dev", base_iface, "interface", "add", mon_iface, "type", "monitor"], check=True)
-    subprocess.run(["ip", "link", "set", mon_iface, "up"], check=True)
-    print(f"[INFO] Monitor interface '{mon_iface}' is up.")
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if __name__ == "__main__":
+    # Run as a script; bench_capabilities.py and monitor_daemon.py set up the path when they import this module.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+
+from capability_cache import CapabilityCache, DEFAULT_CACHE
+from pcap_reader import BeaconRecord, iter_beacons, find_beacon, index_shards, iter_shard_beacons, TeeReader
+from monitor_client import MonitorClient, DaemonError, DEFAULT_SOCKET
+from monitor_iface import setup_monitor, teardown_monitor, set_channel
+from results_store import record_run, record_runs, DEFAULT_STORE
+from tracing import span, traced, run_traced, watch_process, enable_tracing, finish_tracing, add_trace_argument
 
 # --- CAPTURE ---
+@traced()
 def capture_pcap(interface, channel, duration, out_pcap):
-    print(f"[INFO] Setting channel {channel} on {interface}")
-    subprocess.run(["iw", interface, "set", "channel", str(channel)], check=True)
+    set_channel(interface, channel)
 
     print(f"[INFO] Capturing for {duration}s on {interface} -> {out_pcap}")
-    subprocess.run(["tshark", "-i", interface, "-a", f"duration:{duration}", "-w", out_pcap], check=True)
+    run_traced(["tshark", "-i", interface, "-a", f"duration:{duration}", "-w", out_pcap], check=True)
+
+# --- LIVE CAPTURE (EARLY EXIT) ---
+@traced()
+def capture_beacon_live(interface, channel, duration, ssid, out_pcap=None):
+    set_channel(interface, channel)
+
+    print(f"[INFO] Live capture on {interface}: waiting up to {duration}s for a beacon from '{ssid}'")
+    cmd = ["tshark", "-i", interface, "-f", "type mgt subtype beacon",
+           "-a", f"duration:{duration}", "-F", "pcap", "-w", "-", "-q"]
+    proc = watch_process(subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL))
+    sink = open(out_pcap, "wb") if out_pcap else None
+    try:
+        stream = TeeReader(proc.stdout, sink) if sink else proc.stdout
+        beacon = find_beacon(stream, ssid)
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+        proc.stdout.close()
+        proc.wait()
+        if sink:
+            sink.close()
+    if beacon is not None:
+        print(f"[INFO] Beacon from {beacon.bssid} decoded, capture stopped early")
+    return beacon
 
 # --- EXTRACT SINGLE BEACON TO JSON ---
+@traced()
 def extract_beacon_json(pcap_file, ssid, output_json):
     print(f"[INFO] Filtering beacon with SSID '{ssid}' and converting to JSON")
     cmd = [
@@ -30,32 +71,22 @@ def extract_beacon_json(pcap_file, ssid, output_json):
         "-c", "1"
     ]
     with open(output_json, "w") as f:
-        subprocess.run(cmd, stdout=f, check=True)
+        run_traced(cmd, stdout=f, check=True)
 
 # --- JSON TAG EXTRACTION ---
-def get_tag_by_number(packet, target_number):
-    try:
-        tags = packet["_source"]["layers"]["wlan.mgt"]["wlan.tagged.all"]["wlan.tag"]
+def index_tshark_tags(packet):
+    # One walk down to wlan.tagged.all; the first occurrence of each tag number wins.
+    tagged = get_nested(packet, "_source", "layers", "wlan.mgt", "wlan.tagged.all") or {}
+    index = {}
+    for key, number_key in (("wlan.tag", "wlan.tag.number"), ("wlan.ext_tag", "wlan.ext_tag.number")):
+        tags = tagged.get(key, [])
         if isinstance(tags, dict):
             tags = [tags]
-    except KeyError:
-        return None
-    for tag in tags:
-        if tag.get("wlan.tag.number") == str(target_number):
-            return tag
-    return None
-
-def get_ext_tag_by_number(packet, target_number):
-    try:
-        ext_tags = packet["_source"]["layers"]["wlan.mgt"]["wlan.tagged.all"]["wlan.ext_tag"]
-        if isinstance(ext_tags, dict):
-            ext_tags = [ext_tags]
-    except KeyError:
-        return None
-    for tag in ext_tags:
-        if tag.get("wlan.ext_tag.number") == str(target_number):
-            return tag
-    return None
+        by_number = {}
+        for tag in tags:
+            by_number.setdefault(tag.get(number_key), tag)
+        index[key] = by_number
+    return index["wlan.tag"], index["wlan.ext_tag"]
 
 def get_nested(d, *keys):
     for k in keys:
@@ -65,52 +96,75 @@ def get_nested(d, *keys):
             return None
     return d
 
+# --- DECODER TABLES ---
+# MCS maps are read a byte (4 streams of 2 bits) at a time through 256-entry tables.
+HE_MCS_CODES = {0b00: 7, 0b01: 9, 0b10: 11}
+VHT_MCS_CODES = {0b00: 7, 0b01: 8, 0b10: 9}
+
+def _mcs_byte_table(mcs_codes, streams=4):
+    table = []
+    for byte in range(256):
+        entries = []
+        for i in range(streams):
+            mcs = mcs_codes.get((byte >> (2 * i)) & 0b11)
+            if mcs is not None:
+                entries.append((i, mcs))
+        table.append(tuple(entries))
+    return table
+
+VHT_BYTE_TABLE = _mcs_byte_table(VHT_MCS_CODES)
+HE_LOW_BYTE_TABLE = _mcs_byte_table(HE_MCS_CODES)
+# The HE decoder has never reported stream 8 (bits 14-15); the table keeps that.
+HE_HIGH_BYTE_TABLE = _mcs_byte_table(HE_MCS_CODES, streams=3)
+BYTE_SET_BITS = [tuple(i for i in range(8) if (byte >> i) & 1) for byte in range(256)]
+
+@functools.lru_cache(maxsize=None)
+def _ht_bit_range_start(key):
+    bit_range = key.split('.')[-1]
+    if 'to' in bit_range:
+        return int(bit_range.split('to')[0])
+    if bit_range.isdigit():
+        return int(bit_range)
+    return None
+
 # --- DECODERS ---
 def decode_he_mcs_map_verbose(hex_val):
     result = {"total_nss": 0, "max_mcs": None, "streams": []}
     if not hex_val:
         return result
-    bits = bin(int(hex_val, 16))[2:].zfill(16)
-    for i in range(16, 0, -2):
-        stream_num = 8 - ((i // 2))
-        pair = bits[i:i+2]
-        if pair == "00": mcs = 7
-        elif pair == "01": mcs = 9
-        elif pair == "10": mcs = 11
-        else: continue
-        result["streams"].append({"nss": stream_num, "mcs_range": f"0–{mcs}"})
-        result["total_nss"] += 1
-        result["max_mcs"] = max(result["max_mcs"] or 0, mcs)
+    val = int(hex_val, 16)
+    for first_nss, table, byte in ((1, HE_LOW_BYTE_TABLE, val & 0xFF), (5, HE_HIGH_BYTE_TABLE, (val >> 8) & 0xFF)):
+        for i, mcs in table[byte]:
+            result["streams"].append({"nss": first_nss + i, "mcs_range": f"0–{mcs}"})
+            result["max_mcs"] = max(result["max_mcs"] or 0, mcs)
+    result["total_nss"] = len(result["streams"])
     return result
 
 def decode_eht_mcs_map(hex_string):
     if not hex_string:
         return {"rx": {}, "tx": {}, "max_nss": 0, "max_mcs": None}
     val = int(hex_string, 16)
-    nibbles = [(val >> (4 * i)) & 0xF for i in range(6)]
-    rx = {"0-9": nibbles[0], "10-11": nibbles[2], "12-13": nibbles[4]}
-    tx = {"0-9": nibbles[1], "10-11": nibbles[3], "12-13": nibbles[5]}
+    rx = {"0-9": val & 0xF, "10-11": (val >> 8) & 0xF, "12-13": (val >> 16) & 0xF}
+    tx = {"0-9": (val >> 4) & 0xF, "10-11": (val >> 12) & 0xF, "12-13": (val >> 20) & 0xF}
     max_nss, max_mcs = 0, None
     for mcs_range, mcs_max in [("0-9", 9), ("10-11", 11), ("12-13", 13)]:
         r, t = rx[mcs_range], tx[mcs_range]
         if r > 0 or t > 0:
             max_nss = max(max_nss, r, t)
-            max_mcs = max(max_mcs or 0, mcs_max)
+            max_mcs = mcs_max
     return {"rx": rx, "tx": tx, "max_nss": max_nss, "max_mcs": max_mcs}
 
 def decode_ht_rx_mcs_bitmask(rxbitmask_dict):
     supported_mcs_indices = []
     for key, hex_val in rxbitmask_dict.items():
-        bit_range = key.split('.')[-1]
-        if 'to' in bit_range:
-            start, end = map(int, bit_range.split('to'))
-        elif bit_range.isdigit():
-            start = end = int(bit_range)
-        else:
+        start = _ht_bit_range_start(key)
+        if start is None:
             continue
-        bits = bin(int(hex_val, 16))[2:].zfill(end - start + 1)[::-1]
-        for i, bit in enumerate(bits):
-            if bit == "1": supported_mcs_indices.append(start + i)
+        val = int(hex_val, 16)
+        while val:
+            supported_mcs_indices.extend(start + i for i in BYTE_SET_BITS[val & 0xFF])
+            val >>= 8
+            start += 8
     if not supported_mcs_indices:
         return {"total_nss": 0, "max_mcs": None, "supported_mcs_indices": []}
     max_mcs = max(supported_mcs_indices)
@@ -121,39 +175,227 @@ def decode_vht_mcs_map(mcs_map_hex):
     if not mcs_map_hex:
         return {"total_nss": 0, "max_mcs": None, "streams": []}
     val = int(mcs_map_hex, 16)
-    max_nss, max_mcs, streams = 0, 0, []
-    for i in range(8):
-        code = (val >> (i * 2)) & 0b11
-        if code == 0b00: streams.append((i + 1, 7)); max_nss += 1; max_mcs = max(max_mcs, 7)
-        elif code == 0b01: streams.append((i + 1, 8)); max_nss += 1; max_mcs = max(max_mcs, 8)
-        elif code == 0b10: streams.append((i + 1, 9)); max_nss += 1; max_mcs = max(max_mcs, 9)
-    return {"total_nss": max_nss, "max_mcs": max_mcs, "streams": [{"ss": ss, "mcs_range": f"0–{mcs}"} for ss, mcs in streams]}
+    streams = [{"ss": first_ss + i, "mcs_range": f"0–{mcs}"}
+               for first_ss, byte in ((1, val & 0xFF), (5, (val >> 8) & 0xFF))
+               for i, mcs in VHT_BYTE_TABLE[byte]]
+    max_mcs = max((int(s["mcs_range"][2:]) for s in streams), default=0)
+    return {"total_nss": len(streams), "max_mcs": max_mcs, "streams": streams}
+
+# --- BATCH DECODERS ---
+# Per-byte (nss, max mcs) summaries; -1 stands for "no MCS" (None in the single-value decoders).
+def _summary_table(byte_table):
+    return [(len(entries), max((mcs for _, mcs in entries), default=-1)) for entries in byte_table]
+
+BATCH_TABLES = {
+    "vht": (_summary_table(VHT_BYTE_TABLE), _summary_table(VHT_BYTE_TABLE)),
+    "he": (_summary_table(HE_LOW_BYTE_TABLE), _summary_table(HE_HIGH_BYTE_TABLE)),
+}
+
+def _map_values(maps):
+    values = []
+    for m in maps:
+        if m is None or m == "":
+            values.append(-1)
+        elif isinstance(m, str):
+            values.append(int(m, 16))
+        else:
+            values.append(int(m))
+    return values
+
+def _eht_summary(val):
+    nibbles = [(val >> (4 * i)) & 0xF for i in range(6)]
+    max_mcs = -1
+    for mcs_max, r, t in [(9, nibbles[0], nibbles[1]), (11, nibbles[2], nibbles[3]), (13, nibbles[4], nibbles[5])]:
+        if r or t:
+            max_mcs = mcs_max
+    return max(nibbles), max_mcs
+
+def decode_mcs_maps_batch(kind, maps):
+    '''Decode many "vht", "he" or "eht" MCS maps (ints or hex strings, None if absent) in one pass.
+
+    Returns (nss, max_mcs) as NumPy int arrays when NumPy is installed, lists otherwise.
+    They match total_nss/max_nss and max_mcs of the single-value decoders, with -1 for None.'''
+    values = _map_values(maps)
+    if np is not None:
+        return _decode_mcs_maps_numpy(kind, np.asarray(values, dtype=np.int64))
+
+    nss, max_mcs = [], []
+    for val in values:
+        if val < 0:
+            n, m = 0, -1
+        elif kind == "eht":
+            n, m = _eht_summary(val)
+        else:
+            low, high = BATCH_TABLES[kind]
+            (n_lo, m_lo), (n_hi, m_hi) = low[val & 0xFF], high[(val >> 8) & 0xFF]
+            n, m = n_lo + n_hi, max(m_lo, m_hi)
+            if kind == "vht" and m < 0:
+                m = 0
+        nss.append(n)
+        max_mcs.append(m)
+    return nss, max_mcs
+
+def _decode_mcs_maps_numpy(kind, values):
+    missing = values < 0
+    val = np.where(missing, 0, values)
+    if kind == "eht":
+        nibbles = [(val >> (4 * i)) & 0xF for i in range(6)]
+        nss = np.maximum.reduce(nibbles)
+        max_mcs = np.select([(nibbles[4] | nibbles[5]) > 0, (nibbles[2] | nibbles[3]) > 0, (nibbles[0] | nibbles[1]) > 0],
+                            [13, 11, 9], default=-1)
+    else:
+        low, high = (np.asarray(t, dtype=np.int64) for t in BATCH_TABLES[kind])
+        lo, hi = low[val & 0xFF], high[(val >> 8) & 0xFF]
+        nss = lo[:, 0] + hi[:, 0]
+        max_mcs = np.maximum(lo[:, 1], hi[:, 1])
+        if kind == "vht":
+            max_mcs = np.where(max_mcs < 0, 0, max_mcs)
+    return np.where(missing, 0, nss), np.where(missing, -1, max_mcs)
+
+def decode_ht_batch(rxbitmask_dicts):
+    '''Decode many HT Rx MCS bitmask dicts; returns (nss, max_mcs) lists with -1 for None.'''
+    nss, max_mcs = [], []
+    for rxbitmask in rxbitmask_dicts:
+        ht_map = decode_ht_rx_mcs_bitmask(rxbitmask or {})
+        nss.append(ht_map["total_nss"])
+        max_mcs.append(-1 if ht_map["max_mcs"] is None else ht_map["max_mcs"])
+    return nss, max_mcs
 
 # --- SAVE TO CSV ---
-def save_capabilities_to_csv(data_rows, filename="wifi_caps.csv"):
+@traced()
+def save_capabilities_to_csv(data_rows, filename="wifi_caps.csv", skip_if_unchanged=False):
     fieldnames = ["Mode", "Bandwidth", "Total NSS", "Max MCS", "short GI support"]
+    buf = io.StringIO(newline="")
+    writer = csv.DictWriter(buf, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in data_rows:
+        writer.writerow(row)
+    content = buf.getvalue()
+    if skip_if_unchanged and os.path.exists(filename):
+        with open(filename, newline="") as f:
+            if f.read() == content:
+                print(f"[INFO] {filename} is already up to date")
+                return
     with open(filename, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data_rows:
-            writer.writerow(row)
+        f.write(content)
     print(f"[INFO] Capability summary saved to {filename}")
 
+# --- CAPABILITY FIELDS ---
+def get_capability_fields(packet):
+    tags, ext_tags = index_tshark_tags(packet)
+    tag_he = ext_tags.get("35")
+    tag_eht = ext_tags.get("108")
+    tag_ht = tags.get("45")
+    tag_vht = tags.get("191")
+    fields = {"ht": None, "vht": None}
+
+    if tag_ht:
+        fields["ht"] = {
+            "rxbitmask": get_nested(tag_ht, "wlan.ht.mcsset", "wlan.ht.mcsset.rxbitmask"),
+            "short20": get_nested(tag_ht, "wlan.ht.capabilities_tree", "wlan.ht.capabilities.short20"),
+            "short40": get_nested(tag_ht, "wlan.ht.capabilities_tree", "wlan.ht.capabilities.short40"),
+        }
+    if tag_vht:
+        fields["vht"] = {
+            "rxmcsmap": get_nested(tag_vht, "wlan.vht.mcsset", "wlan.vht.mcsset.rxmcsmap"),
+            "txmcsmap": get_nested(tag_vht, "wlan.vht.mcsset", "wlan.vht.mcsset.txmcsmap"),
+            "short80": get_nested(tag_vht, "wlan.vht.capabilities_tree", "wlan.vht.capabilities.short80"),
+            "short160": get_nested(tag_vht, "wlan.vht.capabilities_tree", "wlan.vht.capabilities.short160"),
+        }
+    fields["he"] = {
+        "rx_80": get_nested(tag_he, "Supported HE-MCS and NSS Set", "Rx and Tx MCS Maps <= 80 MHz", "wlan.ext_tag.he_mcs_map.rx_he_mcs_map_lte_80"),
+        "rx_160": get_nested(tag_he, "Supported HE-MCS and NSS Set", "Rx and Tx MCS Maps 160 MHz", "wlan.ext_tag.he_mcs_map.rx_he_mcs_map_160"),
+    }
+    fields["eht"] = {
+        "80": get_nested(tag_eht, "Supported EHT-MCS and NSS Set", "wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_le_80_mhz"),
+        "160": get_nested(tag_eht, "Supported EHT-MCS and NSS Set", "wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_eq_160_mhz"),
+        "320": get_nested(tag_eht, "Supported EHT-MCS and NSS Set", "wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_eq_320_mhz"),
+    }
+    return fields
+
+# Bit ranges of the HT Rx MCS bitmask, as tshark splits them.
+HT_RXBITMASK_RANGES = [(0, 7), (8, 15), (16, 23), (24, 31), (32, 32), (33, 38), (39, 52), (53, 76)]
+
+def _ht_rxbitmask_fields(mcs_set):
+    bitmask = int.from_bytes(mcs_set[:10], "little")
+    fields = {}
+    for start, end in HT_RXBITMASK_RANGES:
+        name = str(start) if start == end else f"{start}to{end}"
+        value = (bitmask >> start) & ((1 << (end - start + 1)) - 1)
+        fields[f"wlan.ht.mcsset.rxbitmask.{name}"] = f"0x{value:08x}"
+    return fields
+
+def _bit(body, byte, bit):
+    return "1" if len(body) > byte and body[byte] & (1 << bit) else "0"
+
+def _hex_le(body, offset, size):
+    if len(body) < offset + size:
+        return None
+    return f"0x{int.from_bytes(body[offset:offset + size], 'little'):0{size * 2}x}"
+
+def get_capability_fields_from_record(record):
+    fields = {"ht": None, "vht": None}
+
+    # HT: cap info (2), A-MPDU params (1), MCS set (16)
+    ht = record.element(45)
+    if ht is not None:
+        fields["ht"] = {
+            "rxbitmask": _ht_rxbitmask_fields(ht[3:13]) if len(ht) >= 13 else {},
+            "short20": _bit(ht, 0, 5),
+            "short40": _bit(ht, 0, 6),
+        }
+
+    # VHT: cap info (4), Rx MCS map (2), Rx highest rate (2), Tx MCS map (2), Tx highest rate (2)
+    vht = record.element(191)
+    if vht is not None:
+        fields["vht"] = {
+            "rxmcsmap": _hex_le(vht, 4, 2),
+            "txmcsmap": _hex_le(vht, 8, 2),
+            "short80": _bit(vht, 0, 5),
+            "short160": _bit(vht, 0, 6),
+        }
+
+    # HE: MAC cap (6), PHY cap (11), Rx/Tx <= 80 MHz maps, then Rx/Tx 160 MHz maps
+    # when channel width set B2 (PHY cap byte 0, bit 3) is set.
+    he = record.element(255, ext=35)
+    he_160 = None
+    if he is not None and len(he) >= 17:
+        he_160 = bool(he[6] & 0x08)
+    fields["he"] = {
+        "rx_80": _hex_le(he, 17, 2) if he_160 is not None else None,
+        "rx_160": _hex_le(he, 21, 2) if he_160 else None,
+    }
+
+    # EHT: MAC cap (2), PHY cap (9), then 3-byte maps for <= 80, 160 (if the HE
+    # element advertises 160 MHz) and 320 MHz (EHT PHY cap bit 1).
+    eht = record.element(255, ext=108)
+    fields["eht"] = {"80": None, "160": None, "320": None}
+    if eht is not None and len(eht) >= 11:
+        eht_160 = he_160 if he_160 is not None else len(eht) >= 17
+        offset = 11
+        for bw, present in [("80", True), ("160", eht_160), ("320", bool(eht[2] & 0x02))]:
+            if not present:
+                continue
+            fields["eht"][bw] = _hex_le(eht, offset, 3)
+            offset += 3
+    return fields
+
+def get_capability_fields_from_elements(ies):
+    return get_capability_fields_from_record(BeaconRecord(None, None, None, ies))
+
 # --- ANALYSIS ---
-def analyze_json(packet, mface="mon0"):
-    tag_he = get_ext_tag_by_number(packet, 35)
-    tag_eht = get_ext_tag_by_number(packet, 108)
-    tag_ht = get_tag_by_number(packet, 45)
-    tag_vht = get_tag_by_number(packet, 191)
+@traced()
+def build_capability_rows(fields, verbose=True):
+    log = print if verbose else (lambda *a: None)
     csv_rows = []
 
-    print("\n===== HT Capabilities (802.11n) =====")
-    if tag_ht:
-        rxbitmask = get_nested(tag_ht, "wlan.ht.mcsset", "wlan.ht.mcsset.rxbitmask")
-        short_GI_20 = "20MHz" if get_nested(tag_ht, "wlan.ht.capabilities_tree", "wlan.ht.capabilities.short20") == "1" else ""
-        short_GI_40 = "40MHz" if get_nested(tag_ht, "wlan.ht.capabilities_tree", "wlan.ht.capabilities.short40") == "1" else ""
+    log("\n===== HT Capabilities (802.11n) =====")
+    if fields["ht"]:
+        rxbitmask = fields["ht"]["rxbitmask"]
+        short_GI_20 = "20MHz" if fields["ht"]["short20"] == "1" else ""
+        short_GI_40 = "40MHz" if fields["ht"]["short40"] == "1" else ""
         ht_map = decode_ht_rx_mcs_bitmask(rxbitmask)
-        print(ht_map)
+        log(ht_map)
         csv_rows.append({
             "Mode": "HT", "Bandwidth": "20/40",
             "Total NSS": ht_map["total_nss"],
@@ -161,16 +403,16 @@ def analyze_json(packet, mface="mon0"):
             "short GI support": f"{short_GI_20} {short_GI_40}"
         })
 
-    print("\n===== VHT Capabilities (802.11ac) =====")
-    if tag_vht:
-        rx_vht = get_nested(tag_vht, "wlan.vht.mcsset", "wlan.vht.mcsset.rxmcsmap")
-        tx_vht = get_nested(tag_vht, "wlan.vht.mcsset", "wlan.vht.mcsset.txmcsmap")
-        short_GI_80 = "80MHz" if get_nested(tag_vht, "wlan.vht.capabilities_tree", "wlan.vht.capabilities.short80") == "1" else ""
-        short_GI_160 = "160MHz" if get_nested(tag_vht, "wlan.vht.capabilities_tree", "wlan.vht.capabilities.short160") == "1" else ""
+    log("\n===== VHT Capabilities (802.11ac) =====")
+    if fields["vht"]:
+        rx_vht = fields["vht"]["rxmcsmap"]
+        tx_vht = fields["vht"]["txmcsmap"]
+        short_GI_80 = "80MHz" if fields["vht"]["short80"] == "1" else ""
+        short_GI_160 = "160MHz" if fields["vht"]["short160"] == "1" else ""
         vht_rx = decode_vht_mcs_map(rx_vht)
         vht_tx = decode_vht_mcs_map(tx_vht)
-        print("RX:", vht_rx)
-        print("TX:", vht_tx)
+        log("RX:", vht_rx)
+        log("TX:", vht_tx)
         transmission = ["RX", "TX"]
         for i, map in enumerate([vht_rx, vht_tx]):
             csv_rows.append({
@@ -180,13 +422,11 @@ def analyze_json(packet, mface="mon0"):
                 "short GI support": f"{short_GI_80} {short_GI_160}"
             })
 
-    print("\n===== HE Capabilities (802.11ax) =====")
-    rx_he_80 = get_nested(tag_he, "Supported HE-MCS and NSS Set", "Rx and Tx MCS Maps <= 80 MHz", "wlan.ext_tag.he_mcs_map.rx_he_mcs_map_lte_80")
-    rx_he_160 = get_nested(tag_he, "Supported HE-MCS and NSS Set", "Rx and Tx MCS Maps 160 MHz", "wlan.ext_tag.he_mcs_map.rx_he_mcs_map_160")
-    he_rx_80 = decode_he_mcs_map_verbose(rx_he_80)
-    he_rx_160 = decode_he_mcs_map_verbose(rx_he_160)
-    print("HE <=80MHz  ->", he_rx_80)
-    print("HE 160MHz ->", he_rx_160)
+    log("\n===== HE Capabilities (802.11ax) =====")
+    he_rx_80 = decode_he_mcs_map_verbose(fields["he"]["rx_80"])
+    he_rx_160 = decode_he_mcs_map_verbose(fields["he"]["rx_160"])
+    log("HE <=80MHz  ->", he_rx_80)
+    log("HE 160MHz ->", he_rx_160)
     bwidths = ["<=80", "160"]
     for i, map in enumerate([he_rx_80, he_rx_160]):
         csv_rows.append({
@@ -196,16 +436,13 @@ def analyze_json(packet, mface="mon0"):
         })
 
 
-    print("\n===== EHT Capabilities (802.11be) =====")
-    eht_80 = get_nested(tag_eht, "Supported EHT-MCS and NSS Set", "wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_le_80_mhz")
-    eht_160 = get_nested(tag_eht, "Supported EHT-MCS and NSS Set", "wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_eq_160_mhz")
-    eht_320 = get_nested(tag_eht, "Supported EHT-MCS and NSS Set", "wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_eq_320_mhz")
-    eht80 = decode_eht_mcs_map(eht_80)
-    eht160 = decode_eht_mcs_map(eht_160)
-    eht320 = decode_eht_mcs_map(eht_320)
-    print("EHT <=80MHz  ->", eht80)
-    print("EHT 160MHz ->", eht160)
-    print("EHT 320MHz ->", eht320)
+    log("\n===== EHT Capabilities (802.11be) =====")
+    eht80 = decode_eht_mcs_map(fields["eht"]["80"])
+    eht160 = decode_eht_mcs_map(fields["eht"]["160"])
+    eht320 = decode_eht_mcs_map(fields["eht"]["320"])
+    log("EHT <=80MHz  ->", eht80)
+    log("EHT 160MHz ->", eht160)
+    log("EHT 320MHz ->", eht320)
     bwidths = ["<=80", "160", "320"]
     for i, map in enumerate([eht80, eht160, eht320]):
         csv_rows.append({
@@ -214,41 +451,354 @@ def analyze_json(packet, mface="mon0"):
             "Max MCS": map["max_mcs"]
         })
 
-    save_capabilities_to_csv(csv_rows)
+    return csv_rows
 
+@traced()
+def cleanup_monitor(mface="mon0"):
     try:
         print("\n[INFO] monitor interface cleanup started.")
-        subprocess.run(["iw", "dev", mface, "del"], check=True)
+        run_traced(["iw", "dev", mface, "del"], check=True)
     except subprocess.SubprocessError as e:
         print(f"[ERROR] failed to close monitor interface {e}")
         sys.exit(1)
     finally:
         print("[INFO] monitor interface cleaned successfully.")
 
+def analyze_capabilities(fields, mface="mon0"):
+    rows = build_capability_rows(fields)
+    save_capabilities_to_csv(rows)
+    if mface:
+        cleanup_monitor(mface)
+    return rows
+
+def analyze_json(packet, mface="mon0"):
+    return analyze_capabilities(get_capability_fields(packet), mface)
+
+def analyze_beacon(beacon, mface=None, cache=None):
+    rows = None
+    if cache is not None:
+        fingerprint = capability_fingerprint(beacon)
+        rows = cache.get(beacon.bssid, fingerprint)
+    if rows is not None:
+        print(f"\n[INFO] Capabilities of {beacon.bssid} unchanged, served from cache {cache.path}")
+        for row in rows:
+            print(row)
+        save_capabilities_to_csv(rows, skip_if_unchanged=True)
+    else:
+        rows = build_capability_rows(get_capability_fields_from_record(beacon))
+        save_capabilities_to_csv(rows)
+        if cache is not None:
+            cache.put(beacon.bssid, fingerprint, beacon.ssid, rows)
+    if mface:
+        cleanup_monitor(mface)
+    return rows
+
+# --- RESULTS STORE ---
+def capability_metrics(rows):
+    '''Numeric NSS / max MCS per mode and bandwidth, e.g. he_le80_nss, eht_320_max_mcs.'''
+    metrics = {}
+    for row in rows:
+        name = row["Mode"].lower().replace(" ", "_")
+        if row["Mode"] in ("HE", "EHT"):
+            name += "_" + row["Bandwidth"].replace("<=", "le")
+        for key, suffix in (("Total NSS", "nss"), ("Max MCS", "max_mcs")):
+            if isinstance(row.get(key), (int, float)):
+                metrics[f"{name}_{suffix}"] = row[key]
+    return metrics
+
+@traced()
+def store_capabilities(args, rows, started, bssid=None):
+    record_run(args.results_db, "ap_capabilities", "capabilities", metrics=capability_metrics(rows), payload=rows,
+               device=args.device or bssid or args.ssid, firmware=args.firmware, started=started,
+               params={"ssid": args.ssid, "bssid": bssid, "channel": args.channel, "decoder": args.decoder})
+
+@traced()
+def store_survey(args, entries, started):
+    record_runs(args.results_db, "ap_capabilities", "survey", [
+        {"metrics": capability_metrics(entry["capabilities"]), "payload": entry, "device": entry["bssid"],
+         "firmware": args.firmware, "started": started,
+         "params": {"ssid": entry["ssid"], "channel": entry.get("channel", args.channel), "beacons": entry["beacons"]}}
+        for entry in entries])
+
+# --- SURVEY (ALL BSSIDs) ---
+CAPABILITY_ELEMENTS = [(45, None), (191, None), (255, 35), (255, 108)]
+
+def capability_fingerprint(record):
+    # Only the capability elements are hashed: TIM, BSS load etc. change every beacon.
+    h = hashlib.sha1()
+    for tag, ext in CAPABILITY_ELEMENTS:
+        body = record.element(tag, ext)
+        if body is not None:
+            h.update(bytes([tag, ext or 0, len(body)]))
+            h.update(body)
+    return h.hexdigest()
+
+def _survey_beacons(beacons):
+    decoded = {}
+    bss = {}
+    for beacon in beacons:
+        fp = capability_fingerprint(beacon)
+        entry = bss.get((beacon.bssid, fp))
+        if entry:
+            entry["beacons"] += 1
+            continue
+        if fp not in decoded:
+            decoded[fp] = build_capability_rows(get_capability_fields_from_record(beacon), verbose=False)
+        bss[(beacon.bssid, fp)] = {"bssid": beacon.bssid, "ssid": beacon.ssid, "fingerprint": fp,
+                                   "beacons": 1, "capabilities": decoded[fp]}
+    return bss, len(decoded)
+
+def _survey_shard(shard):
+    pcap_file, layout, start, end = shard
+    bss, _ = _survey_beacons(iter_shard_beacons(pcap_file, layout, start, end))
+    return list(bss.values())
+
+@traced()
+def survey_capture(pcap_file, workers=1):
+    if workers > 1:
+        return survey_capture_sharded(pcap_file, workers)
+    bss, decoded = _survey_beacons(iter_beacons(pcap_file))
+    print(f"[INFO] Survey: {len(bss)} BSS entries, {decoded} unique capability sets decoded")
+    return sorted(bss.values(), key=lambda e: (e["ssid"], e["bssid"]))
+
+def survey_capture_sharded(pcap_file, workers):
+    # Shards are merged in file order, so the result does not depend on which worker finishes first.
+    layout, ranges = index_shards(pcap_file, workers * 4)
+    print(f"[INFO] Survey: {len(ranges)} shards of {pcap_file} across {workers} processes")
+    shards = [(pcap_file, layout, start, end) for start, end in ranges]
+    bss = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for entries in pool.map(_survey_shard, shards):
+            for entry in entries:
+                key = (entry["bssid"], entry["fingerprint"])
+                if key in bss:
+                    bss[key]["beacons"] += entry["beacons"]
+                else:
+                    bss[key] = entry
+    fingerprints = {fp for _, fp in bss}
+    print(f"[INFO] Survey: {len(bss)} BSS entries, {len(fingerprints)} unique capability sets")
+    return sorted(bss.values(), key=lambda e: (e["ssid"], e["bssid"]))
+
+@traced()
+def save_survey(entries, filename="wifi_survey.csv"):
+    if filename.endswith(".json"):
+        with open(filename, "w") as f:
+            json.dump(entries, f, indent=2)
+    else:
+        fieldnames = ["BSSID", "SSID", "Channel", "Beacons", "Mode", "Bandwidth", "Total NSS", "Max MCS", "short GI support"]
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for entry in entries:
+                for row in entry["capabilities"]:
+                    writer.writerow({"BSSID": entry["bssid"], "SSID": entry["ssid"], "Channel": entry.get("channel", ""),
+                                     "Beacons": entry["beacons"], **row})
+    print(f"[INFO] Survey of {len(entries)} BSS entries saved to {filename}")
+
+
+# --- MULTI-CHANNEL SCHEDULER ---
+def monitor_names(mon_iface, count):
+    if count == 1:
+        return [mon_iface]
+    prefix = mon_iface.rstrip("0123456789") or "mon"
+    return [f"{prefix}{i}" for i in range(count)]
+
+def run_channel_sweep(base_ifaces, mon_iface, channels, duration, decode, pcap_prefix="cap"):
+    '''Capture `channels` spread round-robin over one monitor interface per base interface.
+
+    Interfaces capture concurrently; each finished pcap goes straight to `decode(channel, pcap)`
+    on a decoder thread while the other captures continue. Monitor interfaces created here are
+    always removed again. Returns {channel: decode result}.'''
+    mons = monitor_names(mon_iface, len(base_ifaces))
+    plan = {mon: channels[i::len(mons)] for i, mon in enumerate(mons)}
+    created = []
+    decoded = {}
+    lock = threading.Lock()
+    try:
+        for base, mon in zip(base_ifaces, mons):
+            setup_monitor(base, mon)
+            created.append(mon)
+
+        with ThreadPoolExecutor(max_workers=1) as decoder:
+            def capture_worker(mon, mon_channels):
+                for channel in mon_channels:
+                    pcap = f"{pcap_prefix}_{mon}_ch{str(channel).replace('/', '_')}.pcap"
+                    capture_pcap(mon, channel, duration, pcap)
+                    with lock:
+                        decoded[channel] = decoder.submit(decode, channel, pcap)
+
+            with ThreadPoolExecutor(max_workers=len(mons)) as capturers:
+                workers = [capturers.submit(capture_worker, mon, chans) for mon, chans in plan.items() if chans]
+                for worker in workers:
+                    worker.result()
+            results = {channel: decoded[channel].result() for channel in channels}
+    finally:
+        for mon in created:
+            teardown_monitor(mon)
+    return results
+
+def survey_channels(base_ifaces, mon_iface, channels, duration, pcap_prefix="cap"):
+    def decode(channel, pcap):
+        entries = survey_capture(pcap)
+        for entry in entries:
+            entry["channel"] = channel
+        return entries
+
+    results = run_channel_sweep(base_ifaces, mon_iface, channels, duration, decode, pcap_prefix)
+    entries = [entry for channel in channels for entry in results[channel]]
+    return sorted(entries, key=lambda e: (e["ssid"], e["bssid"], str(e["channel"])))
+
+def find_ssid_on_channels(base_ifaces, mon_iface, channels, duration, ssid, pcap_prefix="cap"):
+    results = run_channel_sweep(base_ifaces, mon_iface, channels, duration,
+                                lambda channel, pcap: find_beacon(pcap, ssid), pcap_prefix)
+    for channel in channels:
+        if results[channel] is not None:
+            print(f"[INFO] Beacon for '{ssid}' found on channel {channel}")
+            return channel, results[channel]
+    return None, None
+
+# --- MONITOR DAEMON ---
+def analyze_from_daemon(args, cache=None, started=None):
+    '''Analyze the latest beacon the daemon has seen for --ssid on --channel, waiting up to
+    --duration for one. The monitor interface stays with the daemon.'''
+    client = MonitorClient(args.daemon)
+    try:
+        with span("daemon ensure"):
+            state = client.ensure(args.base_iface, args.mon_iface, args.channel)
+        print(f"[INFO] Monitor daemon: {state['mon']} on channel {state['channel']} ready in {state['ms']:.1f} ms")
+        with span("daemon latest_beacon"):
+            beacon = client.latest_beacon(args.ssid, state["mon"], state["channel"], max_age=args.duration, wait=args.duration)
+    except DaemonError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    if beacon is None:
+        print("[!] No beacon packet found.")
+        return
+    store_capabilities(args, analyze_beacon(beacon, cache=cache), started, beacon.bssid)
 
 # --- CLI ENTRY ---
 def main():
     parser = argparse.ArgumentParser(description="Capture and analyze AP HT/VHT/HE/EHT capabilities.")
-    parser.add_argument("-b", "--base-iface", required=True, help="e.g. wlan0")
+    parser.add_argument("-b", "--base-iface", help="e.g. wlan0, or wlan0,wlan1 to capture on several radios")
     parser.add_argument("-m", "--mon-iface", default="mon0")
-    parser.add_argument("-c", "--channel", required=True, type=int)
-    parser.add_argument("-s", "--ssid", required=True)
+    parser.add_argument("-c", "--channel", help="e.g. 36, a list like 1,6,36,149, 6 GHz as 37/6g")
+    parser.add_argument("-s", "--ssid", help="SSID to analyze (not needed with --survey)")
     parser.add_argument("-t", "--duration", default=5, type=int)
-    parser.add_argument("-p", "--pcap", default="cap.pcap")
-    parser.add_argument("-j", "--json", default="cap.json")
+    parser.add_argument("-p", "--pcap", default=None, help="Capture file (default cap.pcap; optional with --live)")
+    parser.add_argument("-j", "--json", default="cap.json", help="tshark JSON output (only with --decoder tshark)")
+    parser.add_argument("-d", "--decoder", choices=["builtin", "tshark"], default="builtin",
+                        help="builtin: parse the pcap directly; tshark: tshark -T json round-trip")
+    parser.add_argument("-S", "--survey", action="store_true", help="Report capabilities of every BSSID in the capture")
+    parser.add_argument("-o", "--survey-out", default="wifi_survey.csv", help="Survey output (.csv or .json)")
+    parser.add_argument("-l", "--live", action="store_true",
+                        help="Decode while capturing and stop at the first matching beacon (-t is an upper bound)")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE, default=None,
+                        help=f"Reuse decoded capabilities keyed by BSSID + element hash (default file: {DEFAULT_CACHE})")
+    parser.add_argument("--cache-max-age", type=float, default=30, help="Cache entry lifetime in days")
+    parser.add_argument("--cache-max-entries", type=int, default=5000, help="Cache size limit (LRU eviction)")
+    parser.add_argument("-r", "--read", metavar="PCAP", help="Analyze an existing capture (no monitor setup or capture)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Processes for --survey decoding of large captures (0 = one per CPU)")
+    parser.add_argument("--daemon", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Get the beacon from a running monitor_daemon.py instead of capturing (default socket: {DEFAULT_SOCKET})")
+    parser.add_argument("--results-db", default=DEFAULT_STORE,
+                        help=f"Shared results store the capabilities are added to ('' = off, default: {DEFAULT_STORE})")
+    parser.add_argument("--device", help="Device name for the results store (default: the BSSID)")
+    parser.add_argument("--firmware", help="Firmware build of the AP, for the results store")
+    add_trace_argument(parser)
     args = parser.parse_args()
+    started = time.time()
+    if args.trace:
+        enable_tracing("ap_capabilities_full")
+        # atexit also covers the early returns and sys.exit paths below.
+        atexit.register(finish_tracing, args.trace)
+    if not args.read and not (args.base_iface and args.channel):
+        parser.error("--base-iface and --channel are required unless --read is given")
+    if args.read and args.live:
+        parser.error("--live captures; it cannot be combined with --read")
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+    if not args.survey and not args.ssid:
+        parser.error("--ssid is required unless --survey is given")
+    if args.live and (args.survey or args.decoder != "builtin"):
+        parser.error("--live works with the builtin decoder for a single --ssid")
+
+    cache = None
+    if args.cache:
+        if args.survey or args.decoder != "builtin":
+            parser.error("--cache works with the builtin decoder for a single --ssid")
+        cache = CapabilityCache(args.cache, args.cache_max_age, args.cache_max_entries)
+
+    if args.daemon:
+        if args.read or args.survey or args.decoder != "builtin" or "," in args.base_iface + args.channel:
+            parser.error("--daemon works with the builtin decoder for a single --ssid, radio and channel")
+        analyze_from_daemon(args, cache, started)
+        return
+
+    mface = None if args.read else args.mon_iface
+    base_ifaces = [b.strip() for b in (args.base_iface or "").split(",") if b.strip()]
+    channels = [c.strip() for c in (args.channel or "").split(",") if c.strip()]
+    if not args.read and (len(base_ifaces) > 1 or len(channels) > 1):
+        if args.live or args.decoder != "builtin":
+            parser.error("multi-channel/multi-radio runs use the builtin decoder without --live")
+        pcap_prefix = os.path.splitext(args.pcap or "cap.pcap")[0]
+        if args.survey:
+            entries = survey_channels(base_ifaces, args.mon_iface, channels, args.duration, pcap_prefix)
+            save_survey(entries, args.survey_out)
+            store_survey(args, entries, started)
+            return
+        channel, beacon = find_ssid_on_channels(base_ifaces, args.mon_iface, channels, args.duration, args.ssid, pcap_prefix)
+        if beacon is None:
+            print("[!] No beacon packet found.")
+            return
+        store_capabilities(args, analyze_beacon(beacon, cache=cache), started, beacon.bssid)
+        return
+
+    if not args.read:
+        setup_monitor(args.base_iface, args.mon_iface)
+
+    if args.live:
+        beacon = capture_beacon_live(args.mon_iface, args.channel, args.duration, args.ssid, args.pcap)
+        if beacon is None:
+            print("[!] No beacon packet found.")
+            return
+        store_capabilities(args, analyze_beacon(beacon, args.mon_iface, cache), started, beacon.bssid)
+        return
+
+    if args.read:
+        args.pcap = args.read
+    else:
+        args.pcap = args.pcap or "cap.pcap"
+        capture_pcap(args.mon_iface, args.channel, args.duration, args.pcap)
+
+    if args.survey:
+        print(f"[INFO] Surveying all beacons in {args.pcap}")
+        entries = survey_capture(args.pcap, args.workers)
+        save_survey(entries, args.survey_out)
+        store_survey(args, entries, started)
+        if mface:
+            cleanup_monitor(mface)
+        return
+
+    if args.decoder == "builtin":
+        print(f"[INFO] Reading beacon with SSID '{args.ssid}' from {args.pcap}")
+        with span("find_beacon"):
+            beacon = find_beacon(args.pcap, args.ssid)
+        if beacon is None:
+            print("[!] No beacon packet found.")
+            return
+        store_capabilities(args, analyze_beacon(beacon, mface, cache), started, beacon.bssid)
+        return
 
-    setup_monitor(args.base_iface, args.mon_iface)
-    capture_pcap(args.mon_iface, args.channel, args.duration, args.pcap)
     extract_beacon_json(args.pcap, args.ssid, args.json)
 
-    with open(args.json) as f:
+    with open(args.json) as f, span("load tshark json"):
         packets = json.load(f)
     if not packets:
         print("[!] No beacon packet found.")
         return
 
-    analyze_json(packets[0], args.mon_iface)
+    store_capabilities(args, analyze_json(packets[0], mface), started)
 
 if __name__ == "__main__":
     main()
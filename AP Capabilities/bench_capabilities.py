@@ -0,0 +1,277 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+# pcap_reader lives in Common, and ap_capabilities_full and synth_capture need it.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+
+from pcap_reader import find_beacon
+from synth_capture import PROFILES, beacon_record, tshark_packet, write_capture
+import ap_capabilities_full as caps
+
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "eero_bench")
+TARGET_SSID = "bench-target"
+BATCH_MAPS = 10000
+THRESHOLD = 0.2
+
+# name -> (kind, setup). setup(args[, capture]) returns the zero-argument callable that is timed.
+# "micro" benchmarks work on one synthetic beacon and are timed per call; "capture" benchmarks
+# run once per generated capture and are reported as MB/s.
+BENCHMARKS = {}
+
+def benchmark(name, kind="micro"):
+    def register(setup):
+        BENCHMARKS[name] = (kind, setup)
+        return setup
+    return register
+
+def _quiet(fn, *a):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*a)
+
+
+# --- MICRO BENCHMARKS (decode, extraction, end to end) ---
+def _fields(args):
+    return caps.get_capability_fields_from_record(beacon_record(args.profile))
+
+@benchmark("decode_ht")
+def _decode_ht(args):
+    rxbitmask = _fields(args)["ht"]["rxbitmask"]
+    return lambda: caps.decode_ht_rx_mcs_bitmask(rxbitmask)
+
+@benchmark("decode_vht")
+def _decode_vht(args):
+    rxmcsmap = _fields(args)["vht"]["rxmcsmap"] or "0xfffe"
+    return lambda: caps.decode_vht_mcs_map(rxmcsmap)
+
+@benchmark("decode_he")
+def _decode_he(args):
+    rx_80 = _fields(args)["he"]["rx_80"] or "0xfffe"
+    return lambda: caps.decode_he_mcs_map_verbose(rx_80)
+
+@benchmark("decode_eht")
+def _decode_eht(args):
+    eht_80 = _fields(args)["eht"]["80"] or "0x111111"
+    return lambda: caps.decode_eht_mcs_map(eht_80)
+
+@benchmark("decode_batch_he")
+def _decode_batch_he(args):
+    maps = [_fields(args)["he"]["rx_80"] or "0xfffe"] * BATCH_MAPS
+    return lambda: caps.decode_mcs_maps_batch("he", maps)
+
+@benchmark("extract_tshark_json")
+def _extract_json(args):
+    fields = _fields(args)
+    packet = tshark_packet(fields)
+    if caps.get_capability_fields(packet) != fields:
+        raise RuntimeError("tshark JSON and builtin extraction disagree on the synthetic beacon")
+    return lambda: caps.get_capability_fields(packet)
+
+@benchmark("extract_builtin")
+def _extract_builtin(args):
+    record = beacon_record(args.profile)
+    return lambda: caps.get_capability_fields_from_record(record)
+
+@benchmark("analyze_json")
+def _analyze_json(args):
+    packet = tshark_packet(_fields(args))
+    return lambda: _quiet(caps.analyze_json, packet, None)
+
+@benchmark("analyze_beacon")
+def _analyze_beacon(args):
+    record = beacon_record(args.profile)
+    return lambda: _quiet(caps.analyze_beacon, record)
+
+
+# --- CAPTURE BENCHMARKS ---
+@benchmark("find_beacon", "capture")
+def _find_beacon(args, capture):
+    # The target beacon is the last frame, so the whole capture is read.
+    if find_beacon(capture, TARGET_SSID) is None:
+        raise RuntimeError(f"{TARGET_SSID!r} not found in {capture}")
+    return lambda: find_beacon(capture, TARGET_SSID)
+
+@benchmark("survey", "capture")
+def _survey(args, capture):
+    return lambda: _quiet(caps.survey_capture, capture)
+
+@benchmark("survey_sharded", "capture")
+def _survey_sharded(args, capture):
+    if args.workers < 2:
+        return None
+    return lambda: _quiet(caps.survey_capture, capture, args.workers)
+
+@benchmark("tshark_extract", "capture")
+def _tshark_extract(args, capture):
+    if not shutil.which("tshark"):
+        return None
+    out = os.path.join(args.workdir, "beacon.json")
+    return lambda: _quiet(caps.extract_beacon_json, capture, TARGET_SSID, out)
+
+
+# --- RUNNER ---
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; children covers the sharded survey workers and tshark.
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+def run_benchmark(name, args, capture=None):
+    '''Run one benchmark in the current process. Returns its result dict, or None if it does
+    not apply here (e.g. no tshark installed).'''
+    kind, setup = BENCHMARKS[name]
+    os.chdir(args.workdir)
+    fn = setup(args, capture) if kind == "capture" else setup(args)
+    if fn is None:
+        return None
+    tracemalloc.start()
+    fn()
+    alloc_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if kind == "micro":
+        number, _ = timeit.Timer(fn).autorange()
+        seconds = min(timeit.repeat(fn, number=number, repeat=args.repeat)) / number
+    else:
+        seconds = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+    result = {"seconds": seconds, "peak_rss_mb": _peak_rss_mb(), "alloc_peak_kb": alloc_peak / 1024}
+    if capture:
+        result["mb_per_s"] = os.path.getsize(capture) / 1e6 / seconds
+    return result
+
+def run_isolated(name, args, capture=None):
+    '''Run a benchmark in a fresh interpreter, so its peak RSS is its own.'''
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_benchmark, name, args, capture).result()
+
+def prepare_capture(args, size_mb):
+    '''Generate (or reuse) the synthetic capture for `size_mb`.'''
+    profiles = args.profiles.split(",")
+    path = os.path.join(args.workdir, f"synth_{size_mb:g}mb_{args.bss}bss_{'-'.join(profiles)}.{args.format}")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        frames, beacons = write_capture(path + ".tmp", size_mb, args.bss, profiles, fmt=args.format, tail_ssid=TARGET_SSID)
+        os.replace(path + ".tmp", path)
+        print(f"[INFO] Generated {path}: {frames} frames, {beacons} beacons in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+# --- BASELINES ---
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save_baseline(path, results):
+    with open(path, "w") as f:
+        json.dump({"created": time.time(), "python": platform.python_version(), "machine": platform.node(),
+                   "results": results}, f, indent=2)
+    print(f"[INFO] Baseline saved to {path}")
+
+def compare(result, base, threshold):
+    '''Relative changes in time and peak memory; names of the ones worse than `threshold`.'''
+    changes, regressions = {}, []
+    for key in ("seconds", "peak_rss_mb", "alloc_peak_kb"):
+        if base.get(key):
+            changes[key] = result[key] / base[key] - 1
+            if changes[key] > threshold:
+                regressions.append(key)
+    return changes, regressions
+
+
+# --- REPORT ---
+CHANGE_LABELS = {"seconds": "time", "peak_rss_mb": "rss", "alloc_peak_kb": "alloc"}
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+def format_row(name, result, changes=None):
+    rate = f"{result['mb_per_s']:.1f} MB/s" if "mb_per_s" in result else ""
+    line = (f"{name:<28} {_format_time(result['seconds']):>10} {rate:>12} "
+            f"{result['peak_rss_mb']:>9.1f} MB {result['alloc_peak_kb']:>10.1f} KB")
+    if changes:
+        line += "  " + " ".join(f"{CHANGE_LABELS[k]} {v:+.0%}" for k, v in changes.items())
+    return line
+
+
+def selected(names, only):
+    if not only:
+        return names
+    prefixes = [p.strip() for p in only.split(",")]
+    return [n for n in names if any(n.startswith(p) for p in prefixes)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of capability decoding and capture analysis on synthetic beacons.")
+    parser.add_argument("--profile", choices=list(PROFILES), default="wifi7", help="Capability profile of the single-beacon benchmarks")
+    parser.add_argument("--profiles", default="wifi6,wifi7", help="Profiles assigned round-robin to the BSSes of generated captures")
+    parser.add_argument("--capture-mb", default="1,64", help="Comma-separated sizes of generated captures in MB ('' for none)")
+    parser.add_argument("--bss", type=int, default=50, help="Beaconing BSSes per generated capture")
+    parser.add_argument("--format", choices=["pcap", "pcapng"], default="pcap")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for the sharded survey benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repeats (best one is reported)")
+    parser.add_argument("--only", help="Comma-separated benchmark name prefixes")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="Where captures are generated and kept for reuse")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a saved baseline; exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Allowed slowdown / memory growth vs the baseline (0.2 = 20%%)")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (kind, _) in BENCHMARKS.items():
+            print(f"{name:<28} {kind}")
+        return
+    unknown = [p for p in args.profiles.split(",") if p not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(unknown)}")
+    if args.bss < 0:
+        parser.error("--bss must be 0 or more")
+    args.workdir = os.path.abspath(args.workdir)
+    os.makedirs(args.workdir, exist_ok=True)
+    baseline = load_baseline(args.compare) if args.compare else {}
+
+    runs = [(name, None) for name in selected([n for n, (k, _) in BENCHMARKS.items() if k == "micro"], args.only)]
+    capture_names = selected([n for n, (k, _) in BENCHMARKS.items() if k == "capture"], args.only)
+    for size_mb in [float(s) for s in args.capture_mb.split(",") if s.strip()]:
+        if capture_names:
+            capture = prepare_capture(args, size_mb)
+            runs += [(f"{name}[{size_mb:g}MB]", capture) for name in capture_names]
+
+    print(f"[INFO] {len(runs)} benchmarks, profile {args.profile}, Python {platform.python_version()}, "
+          f"NumPy {'yes' if caps.np is not None else 'no'}")
+    print(f"{'benchmark':<28} {'time':>10} {'throughput':>12} {'peak RSS':>12} {'alloc peak':>13}")
+    results, regressions = {}, []
+    for name, capture in runs:
+        result = run_isolated(name.split("[")[0], args, capture)
+        if result is None:
+            print(f"{name:<28} skipped")
+            continue
+        results[name] = result
+        changes = None
+        if name in baseline:
+            changes, worse = compare(result, baseline[name], args.threshold)
+            regressions += [f"{name} {key}" for key in worse]
+        print(format_row(name, result, changes))
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    if args.compare:
+        if regressions:
+            print(f"[ERROR] {len(regressions)} regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"[INFO] No regressions over {args.threshold:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
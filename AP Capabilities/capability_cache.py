@@ -0,0 +1,73 @@
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "eero_ap_caps.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS capabilities (
+    bssid       TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    ssid        TEXT,
+    rows        TEXT NOT NULL,
+    created     REAL NOT NULL,
+    last_used   REAL NOT NULL,
+    PRIMARY KEY (bssid, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS capabilities_last_used ON capabilities (last_used);
+"""
+
+# --- CAPABILITY CACHE ---
+class CapabilityCache:
+    '''Decoded capability rows keyed by BSSID + capability element fingerprint.
+
+    Entries older than `max_age_days` are dropped, and the least recently used
+    entries go once there are more than `max_entries`.'''
+    def __init__(self, path=DEFAULT_CACHE, max_age_days=30, max_entries=5000):
+        self.path = path
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def get(self, bssid, fingerprint):
+        row = self.db.execute(
+            "SELECT rows, created FROM capabilities WHERE bssid = ? AND fingerprint = ?",
+            (bssid, fingerprint)).fetchone()
+        if row is None:
+            return None
+        rows, created = row
+        now = time.time()
+        if self.max_age and now - created > self.max_age:
+            self.db.execute("DELETE FROM capabilities WHERE bssid = ? AND fingerprint = ?", (bssid, fingerprint))
+            self.db.commit()
+            return None
+        self.db.execute("UPDATE capabilities SET last_used = ? WHERE bssid = ? AND fingerprint = ?",
+                        (now, bssid, fingerprint))
+        self.db.commit()
+        return json.loads(rows)
+
+    def put(self, bssid, fingerprint, ssid, rows):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO capabilities (bssid, fingerprint, ssid, rows, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (bssid, fingerprint, ssid, json.dumps(rows), now, now))
+        self.evict(now)
+        self.db.commit()
+
+    def evict(self, now=None):
+        now = now or time.time()
+        if self.max_age:
+            self.db.execute("DELETE FROM capabilities WHERE created < ?", (now - self.max_age,))
+        if self.max_entries:
+            self.db.execute(
+                "DELETE FROM capabilities WHERE rowid NOT IN "
+                "(SELECT rowid FROM capabilities ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,))
+
+    def close(self):
+        self.db.close()
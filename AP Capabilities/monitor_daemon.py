@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+# The capture, interface and client helpers are shared with the other tools in Common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+
+from pcap_reader import iter_records, strip_radiotap, parse_beacon, LINKTYPE_RADIOTAP, LINKTYPE_IEEE802_11
+from monitor_iface import setup_monitor, teardown_monitor, set_channel
+from monitor_client import DEFAULT_SOCKET, encode_frame
+from capture_ready import watch_capture, wait_until_capturing, READY_TIMEOUT
+
+# Frames older than this (capture time) or beyond MAX_FRAMES are dropped from the window.
+WINDOW = 60.0
+MAX_FRAMES = 200000
+MAX_REPLY_FRAMES = 50000
+
+
+# --- FRAME WINDOW ---
+class FrameWindow:
+    '''Rolling window of recent frames from every capture, plus the latest beacon per SSID
+    on each monitor interface and channel.
+
+    Frames are kept as captured (radiotap included) next to their 802.11 addresses, so
+    "frames for MAC since T" is a walk back from the newest frame that stops at T.'''
+
+    def __init__(self, seconds=WINDOW, max_frames=MAX_FRAMES):
+        self.seconds = seconds
+        self.max_frames = max_frames
+        self.frames = deque()
+        # (mon, channel, ssid) -> entry; one SSID is usually on several bands at once.
+        self.beacons = {}
+        # mon -> time.time() of its last channel change; older beacons belong to the old channel.
+        self.tuned = {}
+        # Capture time of the newest frame dropped so far: queries reaching further back are incomplete.
+        self.evicted = None
+        self.lock = threading.Lock()
+
+    def add(self, mon, channel, linktype, ts, data):
+        if linktype == LINKTYPE_RADIOTAP:
+            frame = strip_radiotap(data)
+        elif linktype == LINKTYPE_IEEE802_11:
+            frame = data
+        else:
+            return
+        if not frame or len(frame) < 10:
+            return
+        ts = ts or time.time()
+        # addr1 always, addr2 unless ACK/CTS, addr3 for management and data frames.
+        addrs = (frame[4:10], frame[10:16], frame[16:22])
+        entry = (ts, mon, channel, linktype, data, addrs)
+        beacon = parse_beacon(frame)
+        with self.lock:
+            self.frames.append(entry)
+            if beacon and ts >= self.tuned.get(mon, 0):
+                self.beacons[(mon, channel, beacon[1])] = entry
+            cutoff = ts - self.seconds
+            while self.frames and (self.frames[0][0] < cutoff or len(self.frames) > self.max_frames):
+                self.evicted = self.frames.popleft()[0]
+
+    def retune(self, mon):
+        '''Forget the beacons of `mon` after a channel change.'''
+        with self.lock:
+            self.tuned[mon] = time.time()
+            for key in [key for key in self.beacons if key[0] == mon]:
+                del self.beacons[key]
+
+    def latest_beacon(self, ssid, mon=None, channel=None, max_age=None):
+        '''Newest beacon for `ssid`, only from `mon` and `channel` when they are given.'''
+        with self.lock:
+            entries = [entry for (m, c, s), entry in self.beacons.items()
+                       if s == ssid and mon in (None, m) and channel in (None, c)]
+        entry = max(entries, key=lambda e: e[0], default=None)
+        if entry is None or (max_age is not None and time.time() - entry[0] > max_age):
+            return None
+        return encode_frame(*entry[:5])
+
+    def query(self, mac=None, since=None, limit=MAX_REPLY_FRAMES):
+        '''Frames (oldest first) with `mac` in an address field, captured at or after `since`.'''
+        mac = bytes.fromhex(mac.replace(":", "")) if mac else None
+        since = since if since is not None else float("-inf")
+        hits = []
+        with self.lock:
+            evicted = self.evicted
+            for entry in reversed(self.frames):
+                if entry[0] < since:
+                    break
+                if mac is None or mac in entry[5]:
+                    hits.append(entry)
+                    if len(hits) >= limit:
+                        break
+        complete = len(hits) < limit and (evicted is None or evicted < since)
+        return [encode_frame(*entry[:5]) for entry in reversed(hits)], complete
+
+    def status(self):
+        with self.lock:
+            return {"frames": len(self.frames), "ssids": len({key[2] for key in self.beacons}),
+                    "oldest": self.frames[0][0] if self.frames else None,
+                    "newest": self.frames[-1][0] if self.frames else None}
+
+
+# --- CAPTURE ---
+class MonitorCapture:
+    '''tshark on one monitor interface, streamed into the frame window on a reader thread.'''
+
+    def __init__(self, base, mon, channel, window, created):
+        self.base = base
+        self.mon = mon
+        self.channel = channel
+        self.window = window
+        self.created = created
+        self.proc = None
+        self.thread = None
+        self.stopped = False
+        # Held while tshark starts or stops; the daemon lock is not, so other requests go on.
+        self.lock = threading.Lock()
+
+    def start(self, timeout=READY_TIMEOUT):
+        '''Start tshark unless it is running and wait until it reports capturing, so frames
+        sent after ensure() returns are in the window. Raises OSError if tshark exits first.'''
+        with self.lock:
+            if self.stopped:
+                raise OSError(f"{self.mon} was released while it was being set up")
+            if self.alive():
+                return self.proc.capturing
+            cmd = ["tshark", "-i", self.mon, "-F", "pcap", "-w", "-", "-q"]
+            self.proc = watch_capture(subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+            self.thread = threading.Thread(target=self._read, daemon=True)
+            self.thread.start()
+            if not wait_until_capturing(self.proc, timeout) and self.proc.poll() is not None:
+                raise OSError(f"tshark on {self.mon} exited with code {self.proc.returncode} before capturing")
+            return self.proc.capturing
+
+    def _read(self):
+        try:
+            for linktype, ts, data in iter_records(self.proc.stdout):
+                self.window.add(self.mon, self.channel, linktype, ts, data)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Capture on {self.mon} stopped: {e}")
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.alive():
+                self.proc.terminate()
+                try:
+                    self.proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+            if self.thread:
+                self.thread.join(timeout=5)
+
+
+# --- DAEMON ---
+class MonitorDaemon:
+    '''Owns the monitor interfaces and their channels for as long as it runs, so test runs
+    only ask for an interface on a channel instead of creating and deleting it.'''
+
+    def __init__(self, window=WINDOW, max_frames=MAX_FRAMES):
+        self.window = FrameWindow(window, max_frames)
+        self.captures = {}
+        self.lock = threading.Lock()
+
+    def ensure(self, base, mon, channel):
+        start = time.monotonic()
+        with self.lock:
+            capture = self.captures.get(mon)
+            created = False
+            if capture is None:
+                if os.path.exists(f"/sys/class/net/{mon}"):
+                    # Left behind by an earlier run; adopt it instead of failing on "iw ... add".
+                    subprocess.run(["ip", "link", "set", mon, "up"], check=True)
+                else:
+                    setup_monitor(base, mon)
+                    created = True
+                capture = self.captures[mon] = MonitorCapture(base, mon, None, self.window, created)
+            changed = capture.channel != channel
+            if changed:
+                set_channel(mon, channel)
+                capture.channel = channel
+                self.window.retune(mon)
+        # Waiting for tshark can take seconds; status and requests for other interfaces go on meanwhile.
+        capturing = capture.start()
+        return {"mon": mon, "channel": channel, "created": created, "channel_changed": changed,
+                "capturing": capturing, "ms": (time.monotonic() - start) * 1000}
+
+    def release(self, mon):
+        with self.lock:
+            capture = self.captures.pop(mon, None)
+        if capture is None:
+            raise ValueError(f"{mon} is not owned by the daemon")
+        capture.stop()
+        removed = teardown_monitor(mon) if capture.created else False
+        return {"mon": mon, "removed": removed}
+
+    def status(self):
+        with self.lock:
+            monitors = [{"mon": c.mon, "base": c.base, "channel": c.channel, "capturing": c.alive(),
+                         "created": c.created} for c in self.captures.values()]
+        return {"monitors": monitors, "window": self.window.status()}
+
+    def close(self):
+        for mon in list(self.captures):
+            self.release(mon)
+
+    def handle(self, request):
+        cmd = request.get("cmd")
+        if cmd == "ensure":
+            return self.ensure(request["base"], request["mon"], str(request["channel"]))
+        if cmd == "beacon":
+            channel = request.get("channel")
+            return {"frame": self.window.latest_beacon(request["ssid"], request.get("mon"),
+                                                       None if channel is None else str(channel), request.get("max_age"))}
+        if cmd == "frames":
+            frames, complete = self.window.query(request.get("mac"), request.get("since"),
+                                                 request.get("limit") or MAX_REPLY_FRAMES)
+            return {"frames": frames, "complete": complete}
+        if cmd == "status":
+            return self.status()
+        if cmd == "release":
+            return self.release(request["mon"])
+        raise ValueError(f"unknown command {cmd!r}")
+
+
+# --- SOCKET SERVER ---
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("cmd") == "shutdown":
+                    reply = {}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    reply = self.server.monitor.handle(request)
+                reply["ok"] = True
+            except (KeyError, ValueError, OSError, subprocess.SubprocessError) as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+class MonitorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, monitor):
+        self.monitor = monitor
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+def remove_stale_socket(path):
+    '''Remove `path` if no daemon answers on it; refuse to start a second daemon.'''
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.remove(path)
+            return
+    raise SystemExit(f"[ERROR] A monitor daemon is already listening on {path}")
+
+def serve(path=DEFAULT_SOCKET, window=WINDOW, max_frames=MAX_FRAMES):
+    remove_stale_socket(path)
+    daemon = MonitorDaemon(window, max_frames)
+    server = MonitorServer(path, daemon)
+    # SIGTERM stops the daemon as cleanly as the "shutdown" command.
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"[INFO] Monitor daemon listening on {path} ({window:.0f}s / {max_frames} frame window)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+        daemon.close()
+        print("[INFO] Monitor daemon stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep monitor interfaces and a rolling frame window alive between test runs.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    parser.add_argument("--window", type=float, default=WINDOW, help="Seconds of frames to keep")
+    parser.add_argument("--max-frames", type=int, default=MAX_FRAMES, help="Upper bound on frames kept")
+    args = parser.parse_args()
+    serve(args.socket, args.window, args.max_frames)
+
+if __name__ == "__main__":
+    main()
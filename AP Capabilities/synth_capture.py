@@ -0,0 +1,218 @@
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+if __name__ == "__main__":
+    # Run as a script; bench_capabilities.py sets up the path when it imports this module.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from pcap_reader import BeaconRecord, parse_beacon, LINKTYPE_RADIOTAP
+
+# Capability sets a synthetic BSS can advertise. NSS 0 leaves the element out.
+PROFILES = {
+    "wifi4": {"ht": 2, "vht": 0, "he": 0, "he_160": False, "eht": 0, "eht_320": False},
+    "wifi5": {"ht": 3, "vht": 3, "he": 0, "he_160": False, "eht": 0, "eht_320": False},
+    "wifi6": {"ht": 2, "vht": 2, "he": 2, "he_160": True, "eht": 0, "eht_320": False},
+    "wifi7": {"ht": 2, "vht": 2, "he": 2, "he_160": True, "eht": 2, "eht_320": True},
+    "wifi7-4ss": {"ht": 4, "vht": 4, "he": 4, "he_160": True, "eht": 4, "eht_320": True},
+}
+# 2-bit MCS map codes for the highest MCS of each standard (VHT 0-9, HE 0-11); 0b11 = stream not supported.
+VHT_MCS9 = 0b10
+HE_MCS11 = 0b10
+
+# Radiotap header with only the Flags field, FCS present (as mac80211 monitor interfaces deliver beacons).
+RADIOTAP_FCS = b"\x00\x00\x0a\x00" + struct.pack("<I", 0x2) + b"\x10\x00"
+FCS = b"\x00\x00\x00\x00"
+PCAP_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_RADIOTAP)
+BASE_TS = 1700000000.0
+# Capture time between two frames; 10k frames/s is a busy channel.
+FRAME_GAP = 1e-4
+
+
+# --- ELEMENTS ---
+def element(tag, body):
+    return bytes([tag, len(body)]) + body
+
+def _mcs_map(nss, code, streams=8):
+    value = 0
+    for i in range(streams):
+        value |= (code if i < nss else 0b11) << (2 * i)
+    return struct.pack("<H", value)
+
+def ht_element(nss):
+    # Cap info (short GI 20/40), A-MPDU params, MCS set (Rx bitmask: 8 MCS per stream), ext cap, TxBF, ASEL.
+    rx_bitmask = b"\xff" * nss + b"\x00" * (10 - nss)
+    return element(45, struct.pack("<H", 0x0060) + b"\x17" + rx_bitmask + b"\x00" * 6 + b"\x00" * 7)
+
+def vht_element(nss):
+    mcs = _mcs_map(nss, VHT_MCS9)
+    return element(191, struct.pack("<I", 0x00000060) + mcs + b"\x00\x00" + mcs + b"\x00\x00")
+
+def he_element(nss, he_160=True):
+    # Ext id, MAC cap (6), PHY cap (11; byte 0 bit 3 = 160 MHz), Rx/Tx <= 80 maps, Rx/Tx 160 maps.
+    phy = bytes([0x0c if he_160 else 0x04]) + b"\x00" * 10
+    mcs = _mcs_map(nss, HE_MCS11)
+    maps = mcs * 4 if he_160 else mcs * 2
+    return element(255, b"\x23" + b"\x00" * 6 + phy + maps)
+
+def eht_element(nss, eht_160=True, eht_320=True):
+    # Ext id, MAC cap (2), PHY cap (9; byte 0 bit 1 = 320 MHz), then one 3-byte map per bandwidth:
+    # Rx/Tx NSS nibbles for MCS 0-9, 10-11 and 12-13.
+    phy = bytes([0x02 if eht_320 else 0x00]) + b"\x00" * 8
+    nss_map = bytes([(nss << 4) | nss]) * 3
+    maps = nss_map * (1 + eht_160 + eht_320)
+    return element(255, b"\x6c" + b"\x00" * 2 + phy + maps)
+
+def capability_elements(profile):
+    ies = b""
+    if profile["ht"]:
+        ies += ht_element(profile["ht"])
+    if profile["vht"]:
+        ies += vht_element(profile["vht"])
+    if profile["he"]:
+        ies += he_element(profile["he"], profile["he_160"])
+    if profile["eht"]:
+        ies += eht_element(profile["eht"], profile["he_160"] or not profile["he"], profile["eht_320"])
+    return ies
+
+
+# --- FRAMES ---
+def mac_address(n):
+    return bytes([0x02, 0x00]) + n.to_bytes(4, "big")
+
+def beacon_frame(bssid, ssid, profile, seq=0):
+    '''An 802.11 beacon with SSID, rates, DS, TIM, the profile's capability elements and a vendor element.'''
+    header = b"\x80\x00\x00\x00" + b"\xff" * 6 + bssid + bssid + struct.pack("<H", (seq & 0xFFF) << 4)
+    fixed = struct.pack("<QHH", seq * 102400, 100, 0x0431)
+    ies = (element(0, ssid.encode()) + element(1, b"\x8c\x12\x98\x24\xb0\x48\x60\x6c") + element(3, b"\x24")
+           + element(5, b"\x00\x01\x00\x00") + capability_elements(profile) + element(221, b"\x00\x50\xf2\x02" + b"\x00" * 20))
+    return header + fixed + ies
+
+def data_frame(payload_len, rng):
+    return b"\x08\x02\x00\x00" + b"\x02\x00\x00\x00\x00\x01" * 3 + b"\x00\x00" + rng.randbytes(payload_len)
+
+def beacon_record(profile="wifi7", ssid="bench", bssid=1):
+    '''A single synthetic beacon as a BeaconRecord, for decoder benchmarks.'''
+    frame = beacon_frame(mac_address(bssid), ssid, PROFILES[profile])
+    return BeaconRecord(BASE_TS, *parse_beacon(frame))
+
+
+# --- TSHARK JSON ---
+def tshark_packet(fields, filler_tags=15):
+    '''The parts of a `tshark -T json` beacon that get_capability_fields reads, built from
+    get_capability_fields_from_record output, plus `filler_tags` unrelated tags as in a real beacon.'''
+    tags = [{"wlan.tag.number": "0", "wlan.ssid": "bench"}]
+    tags += [{"wlan.tag.number": "221", "wlan.tag.vendor.data": "00:50:f2:02"} for _ in range(filler_tags)]
+    ext_tags = []
+    if fields["ht"]:
+        tags.append({"wlan.tag.number": "45",
+                     "wlan.ht.capabilities_tree": {"wlan.ht.capabilities.short20": fields["ht"]["short20"],
+                                                   "wlan.ht.capabilities.short40": fields["ht"]["short40"]},
+                     "wlan.ht.mcsset": {"wlan.ht.mcsset.rxbitmask": fields["ht"]["rxbitmask"]}})
+    if fields["vht"]:
+        tags.append({"wlan.tag.number": "191",
+                     "wlan.vht.capabilities_tree": {"wlan.vht.capabilities.short80": fields["vht"]["short80"],
+                                                    "wlan.vht.capabilities.short160": fields["vht"]["short160"]},
+                     "wlan.vht.mcsset": {"wlan.vht.mcsset.rxmcsmap": fields["vht"]["rxmcsmap"],
+                                         "wlan.vht.mcsset.txmcsmap": fields["vht"]["txmcsmap"]}})
+    if fields["he"]["rx_80"]:
+        he = {"Rx and Tx MCS Maps <= 80 MHz": {"wlan.ext_tag.he_mcs_map.rx_he_mcs_map_lte_80": fields["he"]["rx_80"]}}
+        if fields["he"]["rx_160"]:
+            he["Rx and Tx MCS Maps 160 MHz"] = {"wlan.ext_tag.he_mcs_map.rx_he_mcs_map_160": fields["he"]["rx_160"]}
+        ext_tags.append({"wlan.ext_tag.number": "35", "Supported HE-MCS and NSS Set": he})
+    if fields["eht"]["80"]:
+        eht = {"wlan.eht.supported_eht_mcs_bss_set.eht_mcs_map_bw_le_80_mhz": fields["eht"]["80"]}
+        for bw, key in (("160", "eht_mcs_map_bw_eq_160_mhz"), ("320", "eht_mcs_map_bw_eq_320_mhz")):
+            if fields["eht"][bw]:
+                eht[f"wlan.eht.supported_eht_mcs_bss_set.{key}"] = fields["eht"][bw]
+        ext_tags.append({"wlan.ext_tag.number": "108", "Supported EHT-MCS and NSS Set": eht})
+    return {"_source": {"layers": {"wlan.mgt": {"wlan.tagged.all": {"wlan.tag": tags, "wlan.ext_tag": ext_tags}}}}}
+
+
+# --- CAPTURES ---
+def _pcapng_block(btype, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", btype, length) + body + struct.pack("<I", length)
+
+def write_capture(path, size_mb=1.0, bss_count=50, profiles=("wifi6", "wifi7"), beacon_share=0.1,
+                  fmt="pcap", tail_ssid=None, seed=1):
+    '''Write a synthetic monitor-mode capture of about `size_mb` MB: beacons from `bss_count`
+    BSSes (profiles assigned round-robin, SSID "bss<N>") make up `beacon_share` of the frames,
+    the rest are data frames of random length. With `tail_ssid`, one beacon for that SSID is
+    the very last frame (a worst case for find_beacon). With no BSSes, only data frames (and the
+    tail beacon) are written. Returns (frames, beacons).'''
+    rng = random.Random(seed)
+    beacons = [RADIOTAP_FCS + beacon_frame(mac_address(i), f"bss{i}", PROFILES[profiles[i % len(profiles)]]) + FCS
+               for i in range(bss_count)]
+    # A pool of data frames is reused; building every frame from scratch would dominate multi-GB runs.
+    data = [RADIOTAP_FCS + data_frame(rng.randint(40, 1500), rng) + FCS for _ in range(256)]
+    limit = int(size_mb * 1e6)
+    pcapng = fmt == "pcapng"
+    written = frames = n_beacons = 0
+    every = max(1, round(1 / beacon_share)) if beacon_share > 0 and beacons else 0
+    with open(path, "wb", buffering=1 << 20) as f:
+        if pcapng:
+            header = (_pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+                      + _pcapng_block(1, struct.pack("<HHI", LINKTYPE_RADIOTAP, 0, 0)))
+        else:
+            header = PCAP_HEADER
+        f.write(header)
+        written = len(header)
+        chunk = []
+        while written < limit:
+            if every and frames % every == 0:
+                frame = beacons[n_beacons % bss_count]
+                n_beacons += 1
+            else:
+                frame = data[frames % len(data)]
+            ts_us = int((BASE_TS + frames * FRAME_GAP) * 1e6)
+            if pcapng:
+                record = _pcapng_block(6, struct.pack("<IIIII", 0, ts_us >> 32, ts_us & 0xFFFFFFFF, len(frame), len(frame)) + frame)
+            else:
+                record = struct.pack("<IIII", ts_us // 1000000, ts_us % 1000000, len(frame), len(frame)) + frame
+            chunk.append(record)
+            written += len(record)
+            frames += 1
+            if len(chunk) >= 4096:
+                f.writelines(chunk)
+                chunk = []
+        if tail_ssid:
+            frame = RADIOTAP_FCS + beacon_frame(mac_address(bss_count), tail_ssid, PROFILES[profiles[0]]) + FCS
+            ts_us = int((BASE_TS + frames * FRAME_GAP) * 1e6)
+            if pcapng:
+                chunk.append(_pcapng_block(6, struct.pack("<IIIII", 0, ts_us >> 32, ts_us & 0xFFFFFFFF, len(frame), len(frame)) + frame))
+            else:
+                chunk.append(struct.pack("<IIII", ts_us // 1000000, ts_us % 1000000, len(frame), len(frame)) + frame)
+            frames += 1
+            n_beacons += 1
+        f.writelines(chunk)
+    return frames, n_beacons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic beacon/data capture for offline testing and benchmarks.")
+    parser.add_argument("output", help="Capture file to write")
+    parser.add_argument("--size-mb", type=float, default=10, help="Approximate capture size in MB")
+    parser.add_argument("--bss", type=int, default=50, help="Number of beaconing BSSes (0 = data frames only)")
+    parser.add_argument("--profiles", default="wifi6,wifi7", help=f"Comma-separated capability profiles: {', '.join(PROFILES)}")
+    parser.add_argument("--beacon-share", type=float, default=0.1, help="Fraction of frames that are beacons")
+    parser.add_argument("--format", choices=["pcap", "pcapng"], default="pcap")
+    parser.add_argument("--tail-ssid", help="Add one beacon for this SSID as the last frame")
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    unknown = [p for p in profiles if p not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(unknown)}")
+    if args.bss < 0:
+        parser.error("--bss must be 0 or more")
+    start = time.perf_counter()
+    frames, beacons = write_capture(args.output, args.size_mb, args.bss, profiles, args.beacon_share, args.format, args.tail_ssid)
+    print(f"[INFO] {frames} frames ({beacons} beacons from {args.bss} BSSes) written to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import threading
+import time
+
+# dumpcap prints this on stderr once the interface is open and packets are being written.
+READY_MARKER = "Capturing on"
+READY_TIMEOUT = 10.0
+
+
+# --- CAPTURE READINESS ---
+def _watch_stderr(proc):
+    '''Echo tshark's stderr and flag the process as capturing when it says so.'''
+    for line in proc.stderr:
+        if isinstance(line, bytes):
+            line = line.decode(errors="replace")
+        print(f"[tshark] {line.rstrip()}")
+        if READY_MARKER in line:
+            proc.capturing = True
+            proc.ready.set()
+    # stderr closed: tshark is gone, don't keep anyone waiting.
+    proc.ready.set()
+
+def watch_capture(proc):
+    '''Watch the stderr (text or bytes pipe) of a tshark Popen: `proc.ready` is set once it is
+    capturing (or has exited), `proc.capturing` tells which.'''
+    proc.ready = threading.Event()
+    proc.capturing = False
+    threading.Thread(target=_watch_stderr, args=(proc,), daemon=True).start()
+    return proc
+
+def wait_until_capturing(proc, timeout=READY_TIMEOUT):
+    '''Block until tshark reports that it is capturing. Returns True when it is, False
+    if it exited or did not get there within `timeout` seconds.'''
+    start = time.monotonic()
+    proc.ready.wait(timeout)
+    if not proc.capturing:
+        if proc.ready.is_set():
+            print(f"[ERROR] tshark exited with code {proc.wait()} before capturing")
+        else:
+            print(f"[WARN] tshark did not report capturing within {timeout:.0f}s")
+        return False
+    print(f"[INFO] Capture running after {time.monotonic() - start:.2f}s")
+    return True
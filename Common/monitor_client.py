@@ -0,0 +1,154 @@
+import argparse
+import base64
+import json
+import socket
+import struct
+import time
+
+from pcap_reader import BeaconRecord, parse_beacon, strip_radiotap, LINKTYPE_RADIOTAP, LINKTYPE_IEEE802_11
+
+DEFAULT_SOCKET = "/tmp/eero_monitor.sock"
+BEACON_POLL = 0.1
+# ensure() may create the interface and waits for tshark to start capturing.
+ENSURE_TIMEOUT = 30.0
+
+
+class DaemonError(Exception):
+    '''The monitor daemon is not reachable or refused a request.'''
+
+
+# --- WIRE FORMAT ---
+# One JSON object per line in each direction; frames travel as
+# {"ts", "mon", "channel", "linktype", "data": base64 of the captured bytes}.
+def encode_frame(ts, mon, channel, linktype, data):
+    return {"ts": ts, "mon": mon, "channel": channel, "linktype": linktype,
+            "data": base64.b64encode(data).decode("ascii")}
+
+def decode_frame(frame):
+    '''Return (linktype, ts, data), the record shape pcap_reader.iter_records yields.'''
+    return frame["linktype"], frame["ts"], base64.b64decode(frame["data"])
+
+def frame_to_beacon(frame):
+    linktype, ts, data = decode_frame(frame)
+    if linktype == LINKTYPE_RADIOTAP:
+        data = strip_radiotap(data)
+    elif linktype != LINKTYPE_IEEE802_11:
+        return None
+    beacon = parse_beacon(data) if data else None
+    return BeaconRecord(ts, *beacon) if beacon else None
+
+def write_pcap(path, records):
+    '''Write (linktype, ts, data) records to a classic pcap file (linktype of the first record).'''
+    records = list(records)
+    linktype = records[0][0] if records else LINKTYPE_RADIOTAP
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, linktype))
+        for _, ts, data in records:
+            sec = int(ts)
+            f.write(struct.pack("<IIII", sec, int(round((ts - sec) * 1e6)), len(data), len(data)))
+            f.write(data)
+    return len(records)
+
+
+# --- CLIENT ---
+class MonitorClient:
+    '''Talks to monitor_daemon.py over its Unix socket, one connection per request.'''
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, cmd, timeout=None, **params):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(timeout or self.timeout)
+                sock.connect(self.path)
+                sock.sendall(json.dumps({"cmd": cmd, **params}).encode() + b"\n")
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+        except OSError as e:
+            raise DaemonError(f"monitor daemon at {self.path} not reachable: {e}") from e
+        if not line:
+            raise DaemonError(f"monitor daemon at {self.path} closed the connection")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise DaemonError(reply.get("error", "request failed"))
+        return reply
+
+    def ensure(self, base_iface, mon_iface, channel):
+        '''Have the daemon own `mon_iface` on `channel` and capture on it; cheap when it already does.'''
+        return self.request("ensure", timeout=max(self.timeout, ENSURE_TIMEOUT), base=base_iface, mon=mon_iface, channel=str(channel))
+
+    def latest_beacon(self, ssid, mon_iface=None, channel=None, max_age=None, wait=0):
+        '''Latest beacon for `ssid` seen within `max_age` seconds (on `mon_iface` and `channel`
+        if given) as a BeaconRecord, polling for up to `wait` seconds if there is none yet;
+        None if none arrives.'''
+        deadline = time.monotonic() + wait
+        channel = None if channel is None else str(channel)
+        while True:
+            frame = self.request("beacon", ssid=ssid, mon=mon_iface, channel=channel, max_age=max_age)["frame"]
+            if frame or time.monotonic() >= deadline:
+                return frame_to_beacon(frame) if frame else None
+            time.sleep(BEACON_POLL)
+
+    def frames(self, mac=None, since=None, limit=None):
+        '''Frames to/from `mac` (any address field; all frames without it) captured since `since`
+        (time.time()). Returns (records, complete): `complete` is False when the window no
+        longer reaches back to `since` or `limit` cut the result.'''
+        reply = self.request("frames", mac=mac, since=since, limit=limit)
+        return [decode_frame(f) for f in reply["frames"]], reply["complete"]
+
+    def status(self):
+        return self.request("status")
+
+    def release(self, mon_iface):
+        return self.request("release", mon=mon_iface)
+
+    def shutdown(self):
+        return self.request("shutdown")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the monitor daemon (monitor_daemon.py)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="Monitor interfaces, channels and window size")
+    beacon = sub.add_parser("beacon", help="Latest beacon for an SSID")
+    beacon.add_argument("ssid")
+    beacon.add_argument("--mon", help="Only beacons captured on this monitor interface")
+    beacon.add_argument("--channel", help="Only beacons captured on this channel")
+    beacon.add_argument("--max-age", type=float)
+    frames = sub.add_parser("frames", help="Frames for a MAC since a time, optionally saved as pcap")
+    frames.add_argument("--mac")
+    frames.add_argument("--since", type=float, help="Seconds ago (default: the whole window)")
+    frames.add_argument("-w", "--write", metavar="PCAP")
+    release = sub.add_parser("release", help="Stop capturing on a monitor interface and remove it")
+    release.add_argument("mon")
+    sub.add_parser("shutdown", help="Stop the daemon and remove the interfaces it created")
+    args = parser.parse_args()
+
+    client = MonitorClient(args.socket)
+    try:
+        if args.cmd == "beacon":
+            beacon = client.latest_beacon(args.ssid, args.mon, args.channel, args.max_age)
+            print(f"[INFO] {beacon!r} seen at {beacon.ts:.3f}" if beacon else "[!] No beacon for that SSID in the window.")
+        elif args.cmd == "frames":
+            since = time.time() - args.since if args.since is not None else None
+            records, complete = client.frames(args.mac, since)
+            print(f"[INFO] {len(records)} frames{'' if complete else ' (window does not cover the whole range)'}")
+            if args.write:
+                write_pcap(args.write, records)
+                print(f"[INFO] Written to {args.write}")
+        elif args.cmd == "release":
+            print(json.dumps(client.release(args.mon), indent=2))
+        elif args.cmd == "shutdown":
+            client.shutdown()
+            print("[INFO] Monitor daemon stopping.")
+        else:
+            print(json.dumps(client.status(), indent=2))
+    except DaemonError as e:
+        print(f"[ERROR] {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import subprocess
+
+from tracing import traced, run_traced
+
+# --- MONITOR INTERFACE ---
+@traced()
+def setup_monitor(base_iface="wlan0", mon_iface="mon0"):
+    print(f"[INFO] Creating monitor interface '{mon_iface}' from '{base_iface}'...")
+    run_traced(["iw", "dev", base_iface, "interface", "add", mon_iface, "type", "monitor"], check=True)
+    run_traced(["ip", "link", "set", mon_iface, "up"], check=True)
+    print(f"[INFO] Monitor interface '{mon_iface}' is up.")
+
+@traced()
+def teardown_monitor(mon_iface="mon0"):
+    try:
+        run_traced(["iw", "dev", mon_iface, "del"], check=True)
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"[ERROR] failed to close monitor interface {mon_iface}: {e}")
+        return False
+    print(f"[INFO] Monitor interface '{mon_iface}' removed.")
+    return True
+
+@traced()
+def set_channel(interface, channel):
+    # "37/6g" selects a 6 GHz channel; iw needs the frequency to tell it apart from 5 GHz.
+    print(f"[INFO] Setting channel {channel} on {interface}")
+    channel = str(channel)
+    if channel.lower().endswith("/6g"):
+        freq = 5950 + 5 * int(channel[:-3])
+        run_traced(["iw", "dev", interface, "set", "freq", str(freq)], check=True)
+    else:
+        run_traced(["iw", interface, "set", "channel", channel], check=True)
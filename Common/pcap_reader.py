@@ -0,0 +1,357 @@
+import mmap
+import struct
+
+# --- CONSTANTS ---
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_RADIOTAP = 127
+
+RADIOTAP_FLAGS_FCS = 0x10
+WLAN_FC_BEACON = 0x80
+WLAN_HDR_LEN = 24
+BEACON_FIXED_LEN = 12
+
+TAG_SSID = 0
+TAG_EXT = 255
+
+
+# --- PCAP / PCAPNG RECORDS ---
+def _iter_pcap(f, header):
+    endian, ts_unit = PCAP_MAGIC[header[:4]]
+    rest = f.read(16)
+    if len(rest) < 16:
+        return
+    linktype = struct.unpack(endian + "I", rest[12:16])[0] & 0x0FFFFFFF
+    yield from _iter_pcap_records(f, endian, ts_unit, linktype)
+
+def _iter_pcap_records(f, endian, ts_unit, linktype, end=None):
+    rec_hdr = struct.Struct(endian + "IIII")
+    while end is None or f.tell() < end:
+        hdr = f.read(16)
+        if len(hdr) < 16:
+            return
+        ts_sec, ts_frac, caplen, _ = rec_hdr.unpack(hdr)
+        data = f.read(caplen)
+        if len(data) < caplen:
+            return
+        yield linktype, ts_sec + ts_frac * ts_unit, data
+
+def _tsresol(options, endian):
+    '''Return the if_tsresol of an IDB as seconds per tick (default microseconds).'''
+    pos = 0
+    while pos + 4 <= len(options):
+        code, length = struct.unpack_from(endian + "HH", options, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            resol = options[pos + 4]
+            if resol & 0x80:
+                return 2.0 ** -(resol & 0x7F)
+            return 10.0 ** -resol
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+def _iter_pcapng(f, header, endian="<", interfaces=None, end=None):
+    interfaces = list(interfaces or [])
+    block = header
+    while True:
+        if len(block) < 8:
+            return
+        btype = struct.unpack(endian + "I", block[:4])[0]
+        if btype == PCAPNG_SHB:
+            bom = f.read(4)
+            if len(bom) < 4:
+                return
+            endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            interfaces = []
+            blen = struct.unpack(endian + "I", block[4:8])[0]
+            body = bom + f.read(blen - 12)
+        else:
+            blen = struct.unpack(endian + "I", block[4:8])[0]
+            body = f.read(blen - 8)
+        if blen < 12 or len(body) < blen - 8:
+            return
+        body = body[:-4]
+
+        if btype == PCAPNG_IDB:
+            linktype, _, snaplen = struct.unpack_from(endian + "HHI", body, 0)
+            interfaces.append((linktype, snaplen, _tsresol(body[8:], endian)))
+        elif btype == PCAPNG_EPB and len(body) >= 20:
+            if_id, ts_hi, ts_lo, caplen, _ = struct.unpack_from(endian + "IIIII", body, 0)
+            if if_id < len(interfaces):
+                linktype, _, resol = interfaces[if_id]
+                yield linktype, ((ts_hi << 32) | ts_lo) * resol, body[20:20 + caplen]
+        elif btype == PCAPNG_PB and len(body) >= 20:
+            if_id, _, ts_hi, ts_lo, caplen, _ = struct.unpack_from(endian + "HHIIII", body, 0)
+            if if_id < len(interfaces):
+                linktype, _, resol = interfaces[if_id]
+                yield linktype, ((ts_hi << 32) | ts_lo) * resol, body[20:20 + caplen]
+        elif btype == PCAPNG_SPB and len(body) >= 4 and interfaces:
+            origlen = struct.unpack_from(endian + "I", body, 0)[0]
+            linktype, snaplen, _ = interfaces[0]
+            caplen = min(origlen, snaplen) if snaplen else origlen
+            yield linktype, None, body[4:4 + caplen]
+
+        if end is not None and f.tell() >= end:
+            return
+        block = f.read(8)
+
+def _iter_stream(f, name):
+    header = f.read(8)
+    if header[:4] in PCAP_MAGIC:
+        yield from _iter_pcap(f, header)
+    elif len(header) == 8 and struct.unpack("<I", header[:4])[0] == PCAPNG_SHB:
+        yield from _iter_pcapng(f, header)
+    elif header:
+        raise ValueError(f"{name}: not a pcap/pcapng file")
+
+def iter_records(source):
+    '''Yield (linktype, timestamp, frame bytes) for every record of a pcap or pcapng file.
+
+    `source` is a path or a binary file object (e.g. a tshark `-w -` pipe).'''
+    if hasattr(source, "read"):
+        yield from _iter_stream(source, getattr(source, "name", "stream"))
+        return
+    with open(source, "rb") as f:
+        yield from _iter_stream(f, source)
+
+# --- RADIOTAP / 802.11 ---
+def strip_radiotap(data):
+    '''Return the 802.11 frame behind a radiotap header, without the FCS if radiotap says one is present.'''
+    if len(data) < 8:
+        return None
+    rt_len = struct.unpack_from("<H", data, 2)[0]
+    if rt_len > len(data):
+        return None
+    # Walk the chained "present" words; Flags (bit 1) follows an 8-byte aligned TSFT (bit 0).
+    pos = 4
+    present = struct.unpack_from("<I", data, pos)[0]
+    first = present
+    while present & 0x80000000 and pos + 8 <= rt_len:
+        pos += 4
+        present = struct.unpack_from("<I", data, pos)[0]
+    pos += 4
+    frame = data[rt_len:]
+    if first & 0x2:
+        if first & 0x1:
+            pos = (pos + 7) & ~7
+            pos += 8
+        if pos < rt_len and data[pos] & RADIOTAP_FLAGS_FCS:
+            frame = frame[:-4]
+    return frame
+
+def iter_elements(ies):
+    '''Yield (element id, extension id or None, element body) from a tagged-parameter blob.'''
+    pos, end = 0, len(ies)
+    while pos + 2 <= end:
+        tag, length = ies[pos], ies[pos + 1]
+        body = ies[pos + 2:pos + 2 + length]
+        if len(body) < length:
+            return
+        if tag == TAG_EXT and length >= 1:
+            yield tag, body[0], body[1:]
+        else:
+            yield tag, None, body
+        pos += 2 + length
+
+# --- BEACON RECORD ---
+class BeaconRecord:
+    '''A beacon kept as its raw tagged parameters plus a tag -> offset index.
+
+    The index is built in one pass over the elements; it maps the element id (or
+    256 + extension id for element 255) to `(body offset << 8) | body length`.
+    Only the first occurrence of an element is indexed, as with the tshark lookups.'''
+    __slots__ = ("ts", "bssid", "ssid", "ies", "index")
+
+    def __init__(self, ts, bssid, ssid, ies):
+        self.ts = ts
+        self.bssid = bssid
+        self.ssid = ssid
+        self.ies = bytes(ies)
+        self.index = {}
+        ies, pos, end = self.ies, 0, len(self.ies)
+        while pos + 2 <= end:
+            tag, length = ies[pos], ies[pos + 1]
+            if pos + 2 + length > end:
+                break
+            if tag == TAG_EXT and length >= 1:
+                self.index.setdefault(256 + ies[pos + 2], ((pos + 3) << 8) | (length - 1))
+            else:
+                self.index.setdefault(tag, ((pos + 2) << 8) | length)
+            pos += 2 + length
+
+    def element(self, tag, ext=None):
+        '''Return the body of element `tag` (or extension element `ext`), or None.'''
+        entry = self.index.get(256 + ext if ext is not None else tag)
+        if entry is None:
+            return None
+        start = entry >> 8
+        return self.ies[start:start + (entry & 0xFF)]
+
+    def __repr__(self):
+        return f"BeaconRecord(bssid={self.bssid!r}, ssid={self.ssid!r}, elements={len(self.index)})"
+
+def parse_beacon(frame):
+    '''Return (bssid, ssid, ies) for an 802.11 beacon frame, or None for anything else.'''
+    if len(frame) < WLAN_HDR_LEN + BEACON_FIXED_LEN or frame[0] != WLAN_FC_BEACON:
+        return None
+    bssid = frame[16:22].hex(":")
+    ies = frame[WLAN_HDR_LEN + BEACON_FIXED_LEN:]
+    ssid = ""
+    if len(ies) >= 2 and ies[0] == TAG_SSID:
+        ssid = ies[2:2 + ies[1]].decode("utf-8", errors="replace")
+    return bssid, ssid, ies
+
+# --- BEACON ITERATOR ---
+def iter_beacons(source, ssid=None):
+    '''Stream beacons (optionally only those for `ssid`) out of a capture file or pipe.'''
+    return _iter_beacons(iter_records(source), ssid)
+
+def _iter_beacons(records, ssid=None):
+    for linktype, ts, data in records:
+        if linktype == LINKTYPE_RADIOTAP:
+            frame = strip_radiotap(data)
+        elif linktype == LINKTYPE_IEEE802_11:
+            frame = data
+        else:
+            continue
+        if not frame:
+            continue
+        beacon = parse_beacon(frame)
+        if beacon is None:
+            continue
+        if ssid is not None and beacon[1] != ssid:
+            continue
+        yield BeaconRecord(ts, *beacon)
+
+def find_beacon(source, ssid):
+    '''Return the first beacon for `ssid`, or None.'''
+    return next(iter_beacons(source, ssid), None)
+
+# --- SHARDS ---
+# Large captures are split into byte ranges that start on a record boundary, so each
+# range can be decoded by its own process. Split points are found by jumping to the
+# approximate offset and resynchronising on a chain of plausible record headers.
+SYNC_CHAIN = 8
+SYNC_WINDOW = 1 << 20
+PCAPNG_BLOCK_TYPES = {PCAPNG_SHB, PCAPNG_IDB, PCAPNG_PB, PCAPNG_SPB, 4, 5, PCAPNG_EPB, 9, 10, 0x0BAD, 0x40000BAD}
+
+def capture_layout(buf):
+    '''Return the reader state at the first record of a mapped capture.
+
+    ("pcap", offset, endian, ts_unit, linktype, snaplen, first_ts) or
+    ("pcapng", offset, endian, interfaces). Only the first pcapng section is read,
+    which is all dumpcap/tshark write.'''
+    if buf[:4] in PCAP_MAGIC:
+        endian, ts_unit = PCAP_MAGIC[buf[:4]]
+        snaplen, linktype = struct.unpack_from(endian + "II", buf, 16)
+        first_ts = struct.unpack_from(endian + "I", buf, 24)[0] if len(buf) >= 28 else 0
+        return ("pcap", 24, endian, ts_unit, linktype & 0x0FFFFFFF, snaplen, first_ts)
+    if len(buf) < 12 or struct.unpack_from("<I", buf, 0)[0] != PCAPNG_SHB:
+        raise ValueError("not a pcap/pcapng file")
+    endian = "<" if buf[8:12] == b"\x4d\x3c\x2b\x1a" else ">"
+    interfaces = []
+    pos = 0
+    while pos + 12 <= len(buf):
+        btype, blen = struct.unpack_from(endian + "II", buf, pos)
+        if btype in (PCAPNG_EPB, PCAPNG_PB, PCAPNG_SPB) or blen < 12:
+            break
+        if btype == PCAPNG_IDB:
+            linktype, _, snaplen = struct.unpack_from(endian + "HHI", buf, pos + 8)
+            interfaces.append((linktype, snaplen, _tsresol(buf[pos + 16:pos + blen - 4], endian)))
+        pos += blen
+    return ("pcapng", pos, endian, interfaces)
+
+def _pcap_record_ok(buf, pos, layout):
+    _, _, endian, ts_unit, _, snaplen, first_ts = layout
+    if pos + 16 > len(buf):
+        return False
+    ts_sec, ts_frac, caplen, origlen = struct.unpack_from(endian + "IIII", buf, pos)
+    return (ts_frac < round(1 / ts_unit) and caplen <= origlen and caplen <= max(snaplen, 0x40000)
+            and abs(ts_sec - first_ts) < 30 * 86400 and pos + 16 + caplen <= len(buf))
+
+def _pcapng_block_ok(buf, pos, layout):
+    endian = layout[2]
+    if pos + 12 > len(buf):
+        return False
+    btype, blen = struct.unpack_from(endian + "II", buf, pos)
+    return (btype in PCAPNG_BLOCK_TYPES and blen >= 12 and blen % 4 == 0 and pos + blen <= len(buf)
+            and struct.unpack_from(endian + "I", buf, pos + blen - 4)[0] == blen)
+
+def _next_record(buf, pos, layout):
+    if layout[0] == "pcap":
+        return pos + 16 + struct.unpack_from(layout[2] + "I", buf, pos + 8)[0]
+    return pos + struct.unpack_from(layout[2] + "I", buf, pos + 4)[0]
+
+def _sync(buf, pos, layout):
+    '''Return the first offset >= pos where SYNC_CHAIN records chain cleanly, or None.'''
+    ok = _pcap_record_ok if layout[0] == "pcap" else _pcapng_block_ok
+    step = 1 if layout[0] == "pcap" else 4
+    if layout[0] != "pcap":
+        pos += -pos % 4
+    for candidate in range(pos, min(pos + SYNC_WINDOW, len(buf)), step):
+        cur = candidate
+        for _ in range(SYNC_CHAIN):
+            if cur == len(buf):
+                break
+            if not ok(buf, cur, layout):
+                break
+            cur = _next_record(buf, cur, layout)
+        else:
+            return candidate
+        if cur == len(buf):
+            return candidate
+    return None
+
+def index_shards(pcap_file, count):
+    '''Split a capture into up to `count` record-aligned (start, end) byte ranges.
+
+    Returns (layout, ranges); pass both to iter_shard_beacons.'''
+    with open(pcap_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        layout = capture_layout(buf)
+        first, size = layout[1], len(buf)
+        starts = [first]
+        for i in range(1, count):
+            target = first + (size - first) * i // count
+            if target <= starts[-1]:
+                continue
+            start = _sync(buf, target, layout)
+            if start is not None and start > starts[-1] and start < size:
+                starts.append(start)
+    ranges = [(start, end) for start, end in zip(starts, starts[1:] + [size])]
+    return layout, ranges
+
+def iter_shard_beacons(pcap_file, layout, start, end, ssid=None):
+    '''Stream the beacons of one byte range produced by index_shards.'''
+    with open(pcap_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        buf.seek(start)
+        if layout[0] == "pcap":
+            records = _iter_pcap_records(buf, layout[2], layout[3], layout[4], end)
+        else:
+            records = _iter_pcapng(buf, buf.read(8), layout[2], layout[3], end)
+        yield from _iter_beacons(records, ssid)
+
+# --- TEE ---
+class TeeReader:
+    '''File-like wrapper that copies everything read from `src` into `sink`.'''
+    def __init__(self, src, sink):
+        self.src = src
+        self.sink = sink
+        self.name = getattr(src, "name", "stream")
+
+    def read(self, n=-1):
+        data = self.src.read(n)
+        if data:
+            self.sink.write(data)
+        return data
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_STORE = os.path.join(os.path.expanduser("~"), ".local", "share", "eero_tests", "results.sqlite")
+
+# Runs are only ever inserted (one transaction per run with its metrics and payload);
+# nothing updates or deletes them, so several tools can append to the same file.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id        INTEGER PRIMARY KEY,
+    tool      TEXT NOT NULL,
+    test_type TEXT NOT NULL,
+    device    TEXT,
+    firmware  TEXT,
+    started   REAL NOT NULL,
+    finished  REAL,
+    status    TEXT NOT NULL,
+    params    TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_device_type_started ON runs (device, test_type, started);
+CREATE INDEX IF NOT EXISTS runs_type_started ON runs (test_type, started);
+CREATE INDEX IF NOT EXISTS runs_firmware ON runs (firmware);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name   TEXT NOT NULL,
+    value  REAL NOT NULL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+-- No index on metrics.name on purpose: trends walk the runs newest first (by one of the
+-- indexes above) and look each metric up by (run_id, name), stopping at the limit.
+
+CREATE TABLE IF NOT EXISTS payloads (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id),
+    data   TEXT NOT NULL
+);
+"""
+
+
+# --- RESULTS STORE ---
+class ResultsStore:
+    '''Append-only SQLite store of test runs shared by the AP Capabilities, SQM and Securities tools.
+
+    A run has the common columns (tool, test type, device, firmware, start/finish time,
+    status, JSON params), any number of numeric metrics (name -> value) for trend queries,
+    and optionally the full JSON result.'''
+    def __init__(self, path=DEFAULT_STORE, timeout=30.0):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=timeout)
+        # WAL lets a query run while another tool is appending.
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def add_run(self, tool, test_type, metrics=None, payload=None, device=None, firmware=None,
+                started=None, finished=None, status="ok", params=None):
+        '''Insert one run with its metrics and payload; returns the run id.
+        Values JSON has no type for (bytes, paths, ...) are stored as their str().'''
+        finished = finished or time.time()
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (tool, test_type, device, firmware, started, finished, status, params) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tool, test_type, device, firmware, started or finished, finished, status,
+                 json.dumps(params, default=str) if params is not None else None)).lastrowid
+            self.db.executemany(
+                "INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                [(run_id, name, float(value)) for name, value in (metrics or {}).items() if value is not None])
+            if payload is not None:
+                self.db.execute("INSERT INTO payloads (run_id, data) VALUES (?, ?)", (run_id, json.dumps(payload, default=str)))
+        return run_id
+
+    def _where(self, tool=None, test_type=None, device=None, firmware=None, since=None, params=None):
+        clauses, values = [], []
+        for column, value in (("r.tool", tool), ("r.test_type", test_type), ("r.device", device), ("r.firmware", firmware)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        if since is not None:
+            clauses.append("r.started >= ?")
+            values.append(since)
+        # Params are compared as text, so dl=100 matches "100" and 100 alike.
+        for key, value in (params or {}).items():
+            clauses.append("CAST(json_extract(r.params, ?) AS TEXT) = ?")
+            values += [f"$.{key}", str(value)]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", values
+
+    def runs(self, limit=50, **filters):
+        '''Latest runs matching the filters (tool, test_type, device, firmware, since, params), newest first.'''
+        where, values = self._where(**filters)
+        rows = self.db.execute(
+            "SELECT r.id, r.tool, r.test_type, r.device, r.firmware, r.started, r.finished, r.status, r.params "
+            f"FROM runs r{where} ORDER BY r.started DESC LIMIT ?", values + [limit]).fetchall()
+        keys = ("id", "tool", "test_type", "device", "firmware", "started", "finished", "status", "params")
+        runs = [dict(zip(keys, row)) for row in rows]
+        for run in runs:
+            run["params"] = json.loads(run["params"]) if run["params"] else {}
+        return runs
+
+    def trend(self, metric, limit=50, **filters):
+        '''(started, firmware, device, value) of `metric` over the latest matching runs, oldest first.'''
+        where, values = self._where(**filters)
+        where = (where + " AND" if where else " WHERE") + " m.name = ? AND r.status = 'ok'"
+        rows = self.db.execute(
+            "SELECT r.started, r.firmware, r.device, m.value FROM runs r JOIN metrics m ON m.run_id = r.id"
+            f"{where} ORDER BY r.started DESC LIMIT ?", values + [metric, limit]).fetchall()
+        return rows[::-1]
+
+    def firmware_trend(self, metric, limit=50, **filters):
+        '''(first run, firmware, runs, mean, min, max) of `metric` per firmware build, for the latest
+        `limit` builds, oldest first.'''
+        where, values = self._where(**filters)
+        where = (where + " AND" if where else " WHERE") + " m.name = ? AND r.status = 'ok' AND r.firmware IS NOT NULL"
+        rows = self.db.execute(
+            "SELECT MIN(r.started), r.firmware, COUNT(*), AVG(m.value), MIN(m.value), MAX(m.value) "
+            f"FROM runs r JOIN metrics m ON m.run_id = r.id{where} "
+            "GROUP BY r.firmware ORDER BY MAX(r.started) DESC LIMIT ?", values + [metric, limit]).fetchall()
+        return rows[::-1]
+
+    def metrics(self, run_id):
+        return dict(self.db.execute("SELECT name, value FROM metrics WHERE run_id = ?", (run_id,)).fetchall())
+
+    def payload(self, run_id):
+        row = self.db.execute("SELECT data FROM payloads WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        self.db.execute("PRAGMA optimize")
+        self.db.close()
+
+def record_runs(path, tool, test_type, runs):
+    '''Open the store at `path`, add the runs (dicts of add_run arguments) and close it again.
+    Errors are reported, not raised: a test must not fail because its results could not be stored.'''
+    if not path or not runs:
+        return []
+    try:
+        store = ResultsStore(path)
+        try:
+            run_ids = [store.add_run(tool, test_type, **run) for run in runs]
+        finally:
+            store.close()
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        # TypeError/ValueError: a metric that is not a number, or a circular payload.
+        print(f"[WARN] Could not store {test_type} results in {path}: {e}")
+        return []
+    if len(run_ids) == 1:
+        print(f"[INFO] {test_type} results stored in {path} (run {run_ids[0]})")
+    else:
+        print(f"[INFO] {len(run_ids)} {test_type} runs stored in {path}")
+    return run_ids
+
+def record_run(path, tool, test_type, **run):
+    run_ids = record_runs(path, tool, test_type, [run])
+    return run_ids[0] if run_ids else None
+
+
+# --- CLI ---
+def _parse_params(items):
+    params = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        params[key] = value
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the shared test results store.")
+    parser.add_argument("--db", default=DEFAULT_STORE, help="Results store file")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name, help in (("runs", "List the latest runs"), ("trend", "One metric over the latest runs")):
+        p = sub.add_parser(name, help=help)
+        if name == "trend":
+            p.add_argument("metric", help="e.g. download_mbps")
+            p.add_argument("--by-firmware", action="store_true", help="One row per firmware build (mean/min/max)")
+        p.add_argument("--tool")
+        p.add_argument("--test-type")
+        p.add_argument("--device")
+        p.add_argument("--firmware")
+        p.add_argument("--param", action="append", metavar="KEY=VALUE", help="Match a run parameter, e.g. dl=100")
+        p.add_argument("--last", type=int, default=50, help="Number of runs")
+    show = sub.add_parser("show", help="Metrics and stored result of one run")
+    show.add_argument("run_id", type=int)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    start = time.perf_counter()
+    if args.cmd == "show":
+        print(json.dumps({"metrics": store.metrics(args.run_id), "result": store.payload(args.run_id)}, indent=2))
+        return
+    filters = {"tool": args.tool, "test_type": args.test_type, "device": args.device, "firmware": args.firmware,
+               "params": _parse_params(args.param)}
+    if args.cmd == "runs":
+        rows = store.runs(args.last, **filters)
+        elapsed = time.perf_counter() - start
+        print(f"{'id':>6}  {'started':<19}  {'tool':<16} {'test type':<16} {'device':<18} {'firmware':<14} status")
+        for r in rows:
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["started"]))
+            print(f"{r['id']:>6}  {started:<19}  {r['tool']:<16} {r['test_type']:<16} {r['device'] or '-':<18} "
+                  f"{r['firmware'] or '-':<14} {r['status']}")
+    elif args.by_firmware:
+        rows = store.firmware_trend(args.metric, args.last, **filters)
+        elapsed = time.perf_counter() - start
+        print(f"{'first run':<19}  {'firmware':<14} {'runs':>5} {'mean':>10} {'min':>10} {'max':>10}  ({args.metric})")
+        for started, firmware, count, mean, low, high in rows:
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)):<19}  {firmware:<14} {count:>5} "
+                  f"{mean:>10.4g} {low:>10.4g} {high:>10.4g}")
+    else:
+        rows = store.trend(args.metric, args.last, **filters)
+        elapsed = time.perf_counter() - start
+        print(f"{'started':<19}  {'firmware':<14} {'device':<18} {args.metric}")
+        for started, firmware, device, value in rows:
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)):<19}  {firmware or '-':<14} "
+                  f"{device or '-':<18} {value:g}")
+    print(f"[INFO] {len(rows)} rows in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
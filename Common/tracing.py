@@ -0,0 +1,227 @@
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# The active tracer, or None. Every helper below checks it first, so with tracing off a
+# span costs one global lookup and a shared no-op context manager.
+_tracer = None
+
+
+# --- TRACER ---
+class Tracer:
+    '''Collects timed spans (name, category, start, duration, thread or track, args) of one process.'''
+
+    def __init__(self, process_name=None):
+        self.process_name = process_name or os.path.basename(sys.argv[0]) or "python"
+        self.pid = os.getpid()
+        self.t0 = time.perf_counter()
+        self.wall_t0 = time.time()
+        self.events = []
+        self.threads = {}
+        self.tracks = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, cat, start, end, args=None, track=None):
+        '''Record a span from perf_counter() `start` to `end`. Spans that overlap without
+        nesting (concurrent flows in one event loop) go on their own `track`.'''
+        with self.lock:
+            if track is None:
+                thread = threading.current_thread()
+                tid = thread.native_id
+                self.threads.setdefault(tid, thread.name)
+            else:
+                tid = self.tracks.setdefault(track, -(len(self.tracks) + 1))
+            self.events.append((name, cat, start, end, tid, args))
+
+    def chrome_trace(self):
+        '''The spans as a Chrome trace-event dict (chrome://tracing, ui.perfetto.dev).'''
+        events = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.process_name}}]
+        for tid, name in list(self.threads.items()) + [(tid, track) for track, tid in self.tracks.items()]:
+            events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}})
+        for name, cat, start, end, tid, args in self.events:
+            event = {"name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": tid,
+                     "ts": round((start - self.t0) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"process": self.process_name, "started": self.wall_t0}}
+
+    def export_chrome(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        '''Per (category, name): count, total, mean and max seconds, largest total first.'''
+        stats = {}
+        for name, cat, start, end, _, _ in self.events:
+            entry = stats.setdefault((cat, name), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += end - start
+            entry[2] = max(entry[2], end - start)
+        rows = [{"cat": cat, "name": name, "count": n, "total": total, "mean": total / n, "max": peak}
+                for (cat, name), (n, total, peak) in stats.items()]
+        return sorted(rows, key=lambda r: -r["total"])
+
+    def format_summary(self):
+        wall = time.perf_counter() - self.t0
+        lines = [f"{'category':<11} {'span':<36} {'count':>6} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'% wall':>7}"]
+        for r in self.summary():
+            lines.append(f"{r['cat']:<11} {r['name'][:36]:<36} {r['count']:>6} {r['total']:>9.3f} "
+                         f"{r['mean'] * 1000:>9.1f} {r['max'] * 1000:>9.1f} {r['total'] / wall * 100:>6.1f}%")
+        lines.append(f"{'':<11} {'wall clock':<36} {'':>6} {wall:>9.3f}")
+        return "\n".join(lines)
+
+
+# --- SPANS ---
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "track", "start")
+
+    def __init__(self, tracer, name, cat, args, track=None):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.track = track
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.set(error=exc_type.__name__)
+        self.tracer.add(self.name, self.cat, self.start, end, self.args, self.track)
+        return False
+
+    def set(self, **args):
+        '''Attach args known only once the span is running (exit code, bytes, ...).'''
+        self.args = {**(self.args or {}), **args}
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+def span(name, cat="phase", track=None, **args):
+    '''Context manager timing the enclosed block as one span.'''
+    if _tracer is None:
+        return NULL_SPAN
+    return _Span(_tracer, name, cat, args or None, track)
+
+def traced(name=None, cat="phase"):
+    '''Decorator timing every call of the function as a span (named after the function by default).'''
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if _tracer is None:
+                return fn(*a, **kw)
+            with _Span(_tracer, label, cat, None):
+                return fn(*a, **kw)
+        return wrapper
+    return decorate
+
+
+# --- SUBPROCESSES ---
+def _command_name(cmd):
+    if isinstance(cmd, str):
+        return cmd.split()[0] if cmd.split() else cmd
+    return os.path.basename(str(cmd[0]))
+
+def run_traced(cmd, name=None, **kwargs):
+    '''subprocess.run recorded as a "subprocess" span from spawn to exit.'''
+    if _tracer is None:
+        return subprocess.run(cmd, **kwargs)
+    with _Span(_tracer, name or _command_name(cmd), "subprocess",
+               {"cmd": cmd if isinstance(cmd, str) else " ".join(map(str, cmd))}) as s:
+        result = subprocess.run(cmd, **kwargs)
+        s.set(returncode=result.returncode)
+    return result
+
+def watch_process(proc, name=None, cmd=None):
+    '''Record a Popen from now (call right after spawning it) until it exits, as a "subprocess"
+    span. The exit is picked up by a waiter thread, so the caller's own wait/terminate is unaffected.'''
+    tracer = _tracer
+    if tracer is None:
+        return proc
+    start = time.perf_counter()
+    cmd = cmd if cmd is not None else getattr(proc, "args", "")
+    args = {"cmd": cmd if isinstance(cmd, str) else " ".join(map(str, cmd)), "pid": proc.pid}
+    label = name or _command_name(cmd or ["?"])
+
+    def waiter():
+        returncode = proc.wait()
+        tracer.add(label, "subprocess", start, time.perf_counter(), {**args, "returncode": returncode})
+    threading.Thread(target=waiter, name=f"wait-{proc.pid}", daemon=True).start()
+    return proc
+
+
+# --- ENABLE / EXPORT ---
+def enable_tracing(process_name=None):
+    '''Start collecting spans for this process; returns the tracer.'''
+    global _tracer
+    _tracer = Tracer(process_name)
+    return _tracer
+
+def finish_tracing(path=None):
+    '''Stop collecting, print the summary table and write the Chrome trace to `path`.'''
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    # Give process waiter threads a moment to record processes that exited just now.
+    for thread in threading.enumerate():
+        if thread.name.startswith("wait-"):
+            thread.join(timeout=0.5)
+    print("\n===== PHASE TIMING =====")
+    print(tracer.format_summary())
+    if path:
+        try:
+            tracer.export_chrome(path)
+            print(f"[INFO] Trace with {len(tracer.events)} spans written to {path} (open in chrome://tracing or ui.perfetto.dev)")
+        except OSError as e:
+            print(f"[WARN] Could not write trace {path}: {e}")
+    return tracer
+
+def add_trace_argument(parser):
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Time each phase, serial command and subprocess; print a summary and write a Chrome trace JSON")
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Print the phase summary of a saved Chrome trace.")
+    parser.add_argument("trace", help="Trace JSON written with --trace")
+    args = parser.parse_args()
+    with open(args.trace) as f:
+        trace = json.load(f)
+    tracer = Tracer(trace.get("otherData", {}).get("process"))
+    end = 0.0
+    for e in trace["traceEvents"]:
+        if e.get("ph") == "X":
+            start = e["ts"] / 1e6
+            tracer.events.append((e["name"], e.get("cat", ""), start, start + e["dur"] / 1e6, e.get("tid"), e.get("args")))
+            end = max(end, start + e["dur"] / 1e6)
+    # Summary percentages are relative to the traced wall time, not to now.
+    tracer.t0 = time.perf_counter() - end
+    print(tracer.format_summary())
+
+if __name__ == "__main__":
+    main()
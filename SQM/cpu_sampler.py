@@ -0,0 +1,134 @@
+import threading
+import time
+
+# Keep the console transfer small: only the cpu lines and the network softirq rows.
+SAMPLE_CMD = "grep '^cpu' /proc/stat; grep -E 'CPU|NET_RX|NET_TX' /proc/softirqs"
+
+
+# ------------------------- /proc Parsers -------------------------
+def parse_proc_stat(text):
+    '''Return {"cpu": (busy, softirq, total), "cpu0": ...} jiffy counters from /proc/stat lines.'''
+    counters = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts or not parts[0].startswith("cpu"):
+            continue
+        try:
+            values = [int(v) for v in parts[1:]]
+        except ValueError:
+            continue
+        values += [0] * (8 - len(values))
+        # user nice system idle iowait irq softirq steal [guest guest_nice]; guest time is already in user.
+        total = sum(values[:8])
+        idle = values[3] + values[4]
+        counters[parts[0]] = (total - idle, values[6], total)
+    return counters
+
+def parse_softirqs(text):
+    '''Return {"NET_RX": {"cpu0": count, ...}, ...} from /proc/softirqs lines.'''
+    cpus, counts = [], {}
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0].startswith("CPU"):
+            cpus = [p.lower() for p in parts]
+        elif parts[0].endswith(":") and cpus:
+            try:
+                counts[parts[0][:-1]] = dict(zip(cpus, (int(v) for v in parts[1:])))
+            except ValueError:
+                continue
+    return counts
+
+def cpu_deltas(prev, cur, prev_irqs, cur_irqs, elapsed):
+    '''Turn two counter snapshots into utilization / softirq percentages and softirq rates.'''
+    util, softirq = {}, {}
+    for cpu, (busy, sirq, total) in cur.items():
+        if cpu not in prev:
+            continue
+        p_busy, p_sirq, p_total = prev[cpu]
+        d_total = total - p_total
+        if d_total <= 0:
+            continue
+        util[cpu] = 100.0 * (busy - p_busy) / d_total
+        softirq[cpu] = 100.0 * (sirq - p_sirq) / d_total
+    rates = {}
+    for name, per_cpu in cur_irqs.items():
+        before = prev_irqs.get(name, {})
+        rates[name] = {cpu: (count - before.get(cpu, count)) / elapsed for cpu, count in per_cpu.items()} if elapsed > 0 else {}
+    return util, softirq, rates
+
+
+# ------------------------- Background Sampler -------------------------
+class CpuSampler:
+    '''Samples AP CPU load over a SerialSession on a background thread.
+
+    Each sample is {"t": seconds since start(), "util": {cpu: %}, "softirq": {cpu: %},
+    "rates": {"NET_RX": {cpu: per second}, ...}} and covers the time since the previous one.'''
+
+    def __init__(self, session, interval=1.0):
+        self.session = session
+        self.interval = interval
+        self.samples = []
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.t0 = None
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+    def _read(self):
+        text = self.session.run(SAMPLE_CMD)
+        return time.monotonic() - self.t0, parse_proc_stat(text), parse_softirqs(text)
+
+    def _loop(self):
+        try:
+            prev_t, prev, prev_irqs = self._read()
+            next_tick = self.t0 + self.interval
+            while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+                next_tick += self.interval
+                t, cur, irqs = self._read()
+                util, softirq, rates = cpu_deltas(prev, cur, prev_irqs, irqs, t - prev_t)
+                self.samples.append({"t": round(t, 3), "util": util, "softirq": softirq, "rates": rates})
+                prev_t, prev, prev_irqs = t, cur, irqs
+        except Exception as e:
+            self.error = e
+
+    def window(self, start, end):
+        '''Samples whose interval ends inside (start, end] seconds since start().'''
+        return [s for s in self.samples if start < s["t"] <= end]
+
+    def align(self, intervals, offset=0.0):
+        '''Per-interval CPU summaries for throughput intervals given as (start, end) seconds.
+
+        `offset` is when the traffic started, in seconds since start().'''
+        return [self.summary(self.window(offset + start, offset + end)) for start, end in intervals]
+
+    def summary(self, samples=None):
+        '''Return {cpu: {"util_mean", "util_peak", "softirq_mean", "softirq_peak"}}.'''
+        samples = self.samples if samples is None else samples
+        result = {}
+        for cpu in sorted({c for s in samples for c in s["util"]}):
+            util = [s["util"][cpu] for s in samples if cpu in s["util"]]
+            sirq = [s["softirq"][cpu] for s in samples if cpu in s["softirq"]]
+            result[cpu] = {
+                "util_mean": sum(util) / len(util), "util_peak": max(util),
+                "softirq_mean": sum(sirq) / len(sirq) if sirq else 0.0, "softirq_peak": max(sirq, default=0.0),
+            }
+        return result
+
+def format_cpu_summary(summary):
+    lines = [f"{'CPU':<6} {'util mean':>10} {'util peak':>10} {'sirq mean':>10} {'sirq peak':>10}"]
+    for cpu, s in summary.items():
+        lines.append(f"{cpu:<6} {s['util_mean']:>9.1f}% {s['util_peak']:>9.1f}% {s['softirq_mean']:>9.1f}% {s['softirq_peak']:>9.1f}%")
+    return "\n".join(lines)
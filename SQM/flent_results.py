@@ -0,0 +1,156 @@
+import gzip
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Waveform-style bufferbloat grades on the median latency increase under load (ms).
+BUFFERBLOAT_GRADES = [(5, "A+"), (30, "A"), (60, "B"), (200, "C"), (400, "D")]
+
+
+# ------------------------- Loading -------------------------
+def load_flent(flent_file):
+    '''Load a flent result file, gzip-compressed (.flent.gz) or plain JSON.'''
+    with open(flent_file, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    opener = gzip.open if gzipped else open
+    with opener(flent_file, "rt") as f:
+        return json.load(f)
+
+def _series(results, names):
+    return [results[name] for name in names if name in results]
+
+def _sum_series(series_list, length):
+    '''Element-wise sum of series; a point is None only if it is None in every series.'''
+    total = []
+    for i in range(length):
+        values = [s[i] for s in series_list if i < len(s) and s[i] is not None]
+        total.append(sum(values) if values else None)
+    return total
+
+
+# ------------------------- Statistics -------------------------
+def percentile(values, q):
+    '''Linear-interpolated percentile, the same as numpy's default.'''
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100.0
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+def _stats(values):
+    if not len(values):
+        return None
+    if np is not None:
+        arr = np.asarray(values, dtype=float)
+        p50, p90, p99 = np.percentile(arr, [50, 90, 99])
+        return {"p50": float(p50), "p90": float(p90), "p99": float(p99), "mean": float(arr.mean()), "samples": int(arr.size)}
+    return {"p50": percentile(values, 50), "p90": percentile(values, 90), "p99": percentile(values, 99),
+            "mean": sum(values) / len(values), "samples": len(values)}
+
+def _goodput(values):
+    if not len(values):
+        return {"mean_mbps": None, "p50_mbps": None, "peak_mbps": None}
+    if np is not None:
+        arr = np.asarray(values, dtype=float)
+        return {"mean_mbps": float(arr.mean()), "p50_mbps": float(np.median(arr)), "peak_mbps": float(arr.max())}
+    return {"mean_mbps": sum(values) / len(values), "p50_mbps": percentile(values, 50), "peak_mbps": max(values)}
+
+def bufferbloat_grade(delta_ms):
+    if delta_ms is None:
+        return None
+    for limit, grade in BUFFERBLOAT_GRADES:
+        if delta_ms <= limit:
+            return grade
+    return "F"
+
+
+# ------------------------- RRUL Summary -------------------------
+def _rrul_series(data):
+    '''Pick the ping series and per-direction throughput totals out of a flent result.'''
+    results = data.get("results", {})
+    length = len(data.get("x_values", []))
+    ping_names = [name for name in results if name.startswith("Ping (ms)") and not name.endswith("avg")]
+    if not ping_names and "Ping (ms) avg" in results:
+        ping_names = ["Ping (ms) avg"]
+    totals = {}
+    for direction in ("download", "upload"):
+        prefix = f"TCP {direction}"
+        totals[direction] = results.get(f"{prefix} sum") or _sum_series(
+            [results[n] for n in results if n.startswith(prefix) and not n.endswith(("avg", "sum"))], length)
+    return ping_names, _series(results, ping_names), totals, length
+
+def _split_numpy(pings, totals, length):
+    def array(series):
+        arr = np.full(length, np.nan)
+        values = np.array(series[:length], dtype=float)
+        arr[:len(values)] = values
+        return arr
+
+    throughput = {d: array(s) for d, s in totals.items()}
+    loaded = np.zeros(length, dtype=bool)
+    for arr in throughput.values():
+        loaded |= np.nan_to_num(arr) > 0
+    ping = np.vstack([array(s) for s in pings]) if pings else np.full((0, length), np.nan)
+    valid = ~np.isnan(ping)
+    idle_ms = ping[valid & ~loaded]
+    loaded_ms = ping[valid & loaded]
+    goodput = {d: arr[loaded & ~np.isnan(arr)] for d, arr in throughput.items()}
+    return idle_ms, loaded_ms, goodput
+
+def _split_python(pings, totals, length):
+    loaded = [any(i < len(s) and s[i] for s in totals.values()) for i in range(length)]
+    idle_ms, loaded_ms = [], []
+    for series in pings:
+        for i, value in enumerate(series[:length]):
+            if value is not None:
+                (loaded_ms if loaded[i] else idle_ms).append(value)
+    goodput = {d: [v for i, v in enumerate(s[:length]) if v is not None and loaded[i]] for d, s in totals.items()}
+    return idle_ms, loaded_ms, goodput
+
+def parse_flent_latency_throughput(flent_file):
+    '''Latency-under-load and goodput summary of an RRUL flent result.
+
+    Points where either TCP direction carries traffic count as "loaded", the ping
+    samples outside that window (flent's idle lead-in/tail) as "idle".'''
+    data = load_flent(flent_file)
+    ping_names, pings, totals, length = _rrul_series(data)
+    split = _split_numpy if np is not None else _split_python
+    idle_ms, loaded_ms, goodput_mbps = split(pings, totals, length)
+
+    idle_stats, loaded_stats = _stats(idle_ms), _stats(loaded_ms)
+    delta = loaded_stats["p50"] - idle_stats["p50"] if idle_stats and loaded_stats else None
+    goodput = {direction: _goodput(values) for direction, values in goodput_mbps.items()}
+
+    return {
+        "title": data.get("metadata", {}).get("TITLE"),
+        "ping_series": ping_names,
+        "idle_latency": idle_stats,
+        "loaded_latency": loaded_stats,
+        "latency_delta_ms": delta,
+        "goodput": goodput,
+        "grade": bufferbloat_grade(delta),
+    }
+
+def format_flent_summary(summary):
+    def fmt(value, unit=""):
+        return "n/a" if value is None else f"{value:.2f}{unit}"
+
+    lines = [f"Flent RRUL summary ({summary.get('title') or 'untitled'})"]
+    for label, key in (("Idle latency", "idle_latency"), ("Loaded latency", "loaded_latency")):
+        stats = summary[key]
+        if stats:
+            lines.append(f"  {label:<15} p50 {fmt(stats['p50'])} ms  p90 {fmt(stats['p90'])} ms  "
+                         f"p99 {fmt(stats['p99'])} ms  ({stats['samples']} samples)")
+        else:
+            lines.append(f"  {label:<15} n/a")
+    lines.append(f"  Latency delta   {fmt(summary['latency_delta_ms'], ' ms')} (median, loaded - idle)")
+    for direction, stats in summary["goodput"].items():
+        lines.append(f"  {direction.capitalize():<15} mean {fmt(stats['mean_mbps'])} Mbit/s  "
+                     f"p50 {fmt(stats['p50_mbps'])} Mbit/s  peak {fmt(stats['peak_mbps'])} Mbit/s")
+    lines.append(f"  Bufferbloat grade: {summary['grade'] or 'n/a'}")
+    return "\n".join(lines)
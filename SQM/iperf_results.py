@@ -0,0 +1,122 @@
+import json
+import time
+
+
+# ------------------------- iperf3 JSON Parsing -------------------------
+class IperfStream:
+    '''Incremental parser for the output of one iperf3 run.
+
+    Feed it the lines of `iperf3 --json-stream` as they arrive: every interval
+    is parsed on the spot. Plain `-J` output (one JSON document at the end) is
+    collected from its opening brace and parsed by finish(). Any other line
+    (a vrf_exec.bash banner, an iperf3 warning) is skipped.'''
+
+    def __init__(self, label="", echo=True):
+        self.label = label
+        self.echo = echo
+        self.intervals = []
+        self.summary = None
+        self.error = None
+        self.started_at = None
+        self._doc = []
+        self.skipped = 0
+        self.last_skipped = None
+
+    def feed(self, line):
+        text = line.strip()
+        if not text:
+            return
+        if self._doc:
+            self._doc.append(line)
+            return
+        if text.startswith('{"event"'):
+            try:
+                event = json.loads(text)
+            except ValueError:
+                self._skip(text)
+                return
+            self._handle(event.get("event"), event.get("data") or {})
+        elif text.startswith("{"):
+            # The first line of a -J document; everything after it belongs to the document.
+            self._doc.append(line)
+        else:
+            self._skip(text)
+
+    def _skip(self, text):
+        self.skipped += 1
+        self.last_skipped = text
+        if self.echo:
+            print(f"[iperf3 {self.label}] skipped: {text[:200]}")
+
+    def _handle(self, name, data):
+        if name == "start":
+            self.started_at = time.monotonic()
+        elif name == "interval":
+            self._add_interval(data)
+        elif name == "end":
+            self._set_summary(data)
+        elif name == "error":
+            self.error = data
+
+    def _add_interval(self, interval):
+        total = interval.get("sum") or {}
+        if not total or total.get("omitted"):
+            return
+        record = {
+            "start": total.get("start", 0.0),
+            "end": total.get("end", 0.0),
+            "bytes": total.get("bytes", 0),
+            "mbps": total.get("bits_per_second", 0.0) / 1e6,
+            "retransmits": total.get("retransmits"),
+        }
+        self.intervals.append(record)
+        if self.echo:
+            retr = "" if record["retransmits"] is None else f"  retr {record['retransmits']}"
+            print(f"[iperf3 {self.label}] {record['start']:6.2f}-{record['end']:6.2f} s  {record['mbps']:9.2f} Mbits/sec{retr}")
+
+    def _set_summary(self, end):
+        sent = end.get("sum_sent") or end.get("sum") or {}
+        received = end.get("sum_received") or end.get("sum") or {}
+        self.summary = {
+            "seconds": received.get("seconds", sent.get("seconds")),
+            "sent_mbps": sent.get("bits_per_second", 0.0) / 1e6,
+            "received_mbps": received.get("bits_per_second", 0.0) / 1e6,
+            "retransmits": sent.get("retransmits"),
+        }
+        # UDP tests report loss and jitter instead of retransmits.
+        for key in ("jitter_ms", "lost_percent"):
+            if key in received:
+                self.summary[key] = received[key]
+
+    def finish(self):
+        '''Parse any buffered `-J` document and return the result dict.'''
+        if self._doc:
+            try:
+                doc = json.loads("".join(self._doc))
+            except ValueError as e:
+                doc = {}
+                self.error = self.error or f"could not decode the iperf3 -J output: {e}"
+            for interval in doc.get("intervals", []):
+                self._add_interval(interval)
+            if doc.get("end"):
+                self._set_summary(doc["end"])
+            if doc.get("error"):
+                self.error = doc["error"]
+            self._doc = []
+        if not self.intervals and self.summary is None and self.error is None:
+            last = f", last line: {self.last_skipped[:200]}" if self.last_skipped else ""
+            self.error = f"no iperf3 JSON output ({self.skipped} other lines{last})"
+        return self.result()
+
+    def result(self):
+        return {"label": self.label, "intervals": self.intervals, "summary": self.summary, "error": self.error}
+
+def format_iperf_result(result, direction):
+    summary = result.get("summary")
+    if not summary:
+        reason = f" ({result['error']})" if result.get("error") else ""
+        return f"{direction.capitalize()} throughput: Not found{reason}"
+    text = f"{direction.capitalize()} throughput: {summary['received_mbps']:.2f} Mbits/sec"
+    if summary.get("retransmits") is not None:
+        text += f" (sender {summary['sent_mbps']:.2f} Mbits/sec, {summary['retransmits']} retransmits)"
+    return text
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import math
+import socket
+import struct
+import threading
+import time
+from array import array
+
+from flent_results import percentile
+
+DEFAULT_PORT = 7777
+# Probe payload: sequence number + send time (time.monotonic_ns()).
+PROBE = struct.Struct("!IQ")
+
+
+# ------------------------- Echo Responder -------------------------
+class EchoResponder(asyncio.DatagramProtocol):
+    '''Sends every datagram straight back to where it came from.'''
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+async def serve_echo(host="0.0.0.0", port=DEFAULT_PORT, ready=None, stop=None):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(EchoResponder, local_addr=(host, port))
+    if ready:
+        ready(transport.get_extra_info("sockname")[1])
+    try:
+        await (stop.wait() if stop else asyncio.Future())
+    finally:
+        transport.close()
+
+class LocalResponder:
+    '''Echo responder on its own thread, for probing over loopback without a server.'''
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        await serve_echo(self.host, self.port, ready=self._bound, stop=self._stop)
+
+    def _bound(self, port):
+        self.port = port
+        self._ready.set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+
+# ------------------------- Prober -------------------------
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, prober):
+        self.prober = prober
+
+    def datagram_received(self, data, addr):
+        self.prober._received(data)
+
+class LatencyProber:
+    '''Sends timestamped UDP probes at `rate` per second on a background asyncio loop.
+
+    RTTs (ms) go into a preallocated array indexed by sequence number, so nothing
+    is allocated per probe; probes never answered stay NaN and count as lost.
+    `device` binds the socket to an interface (SO_BINDTODEVICE, needs root) so the
+    probes take the same VRF as the traffic.'''
+
+    def __init__(self, host, port=DEFAULT_PORT, rate=100, max_seconds=120, timeout=1.0, device=None):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.timeout = timeout
+        self.device = device
+        self.count = int(rate * max_seconds)
+        self.rtt_ms = array("d", [math.nan]) * self.count
+        # Send time of each probe in seconds since t0 (time.monotonic()).
+        self.sent_at = array("d", [math.nan]) * self.count
+        self.sent = 0
+        self.error = None
+        self.t0 = None
+        self._t0_ns = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self._t0_ns = int(self.t0 * 1e9)
+        self._thread = threading.Thread(target=self._main, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self
+
+    def _main(self):
+        try:
+            asyncio.run(self._run())
+        except Exception as e:
+            self.error = e
+
+    def _socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.device:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.device.encode())
+        sock.connect((self.host, self.port))
+        sock.setblocking(False)
+        return sock
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _ProbeProtocol(self), sock=self._socket())
+        step = 1.0 / self.rate
+        try:
+            for seq in range(self.count):
+                if self._stop.is_set():
+                    break
+                delay = self.t0 + seq * step - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                now_ns = time.monotonic_ns()
+                self.sent_at[seq] = (now_ns - self._t0_ns) / 1e9
+                transport.sendto(PROBE.pack(seq, now_ns))
+                self.sent = seq + 1
+            # Give the last probes their chance to come back.
+            await asyncio.sleep(self.timeout)
+        finally:
+            transport.close()
+
+    def _received(self, data):
+        if len(data) < PROBE.size:
+            return
+        seq, sent_ns = PROBE.unpack_from(data)
+        if seq < self.sent and math.isnan(self.rtt_ms[seq]):
+            self.rtt_ms[seq] = (time.monotonic_ns() - sent_ns) / 1e6
+
+    def summary(self, start=None, end=None):
+        '''RTT percentiles and loss for probes sent in [start, end) seconds since t0.'''
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        rtts, probes = [], 0
+        for seq in range(self.sent):
+            if start <= self.sent_at[seq] < end:
+                probes += 1
+                if not math.isnan(self.rtt_ms[seq]):
+                    rtts.append(self.rtt_ms[seq])
+        if not probes:
+            return None
+        return {
+            "probes": probes,
+            "loss_percent": 100.0 * (probes - len(rtts)) / probes,
+            "p50_ms": percentile(rtts, 50), "p90_ms": percentile(rtts, 90), "p99_ms": percentile(rtts, 99),
+            "max_ms": max(rtts, default=None),
+        }
+
+def format_latency_summary(label, summary):
+    if not summary:
+        return f"{label}: no probes"
+    if summary["p50_ms"] is None:
+        return f"{label}: {summary['probes']} probes, all lost"
+    return (f"{label}: p50 {summary['p50_ms']:.2f} ms  p90 {summary['p90_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms  "
+            f"max {summary['max_ms']:.2f} ms  loss {summary['loss_percent']:.1f}% ({summary['probes']} probes)")
+
+
+# ------------------------- CLI -------------------------
+def main():
+    parser = argparse.ArgumentParser(description="UDP echo responder / latency prober used by sqm_wired_full.py.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    serve = sub.add_parser("serve", help="Run the echo responder (on the iperf3/flent server)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    probe = sub.add_parser("probe", help="Probe a responder; without a host, a local one on loopback is used")
+    probe.add_argument("host", nargs="?", help="Responder address")
+    probe.add_argument("--port", type=int, default=DEFAULT_PORT)
+    probe.add_argument("--rate", type=int, default=100, help="Probes per second")
+    probe.add_argument("--time", type=float, default=5, help="Seconds to probe")
+    probe.add_argument("--device", help="Interface to bind the probe socket to")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        print(f"[INFO] Echo responder listening on UDP port {args.port}")
+        asyncio.run(serve_echo(port=args.port))
+        return
+
+    responder = LocalResponder().start() if not args.host else None
+    host, port = (args.host, args.port) if args.host else (responder.host, responder.port)
+    prober = LatencyProber(host, port, args.rate, max_seconds=args.time, device=args.device).start()
+    try:
+        time.sleep(args.time)
+    finally:
+        prober.stop()
+        if responder:
+            responder.stop()
+    if prober.error:
+        print(f"[ERROR] Probing stopped early: {prober.error}")
+    print(format_latency_summary(f"{host}:{port}", prober.summary()))
+
+if __name__ == "__main__":
+    main()
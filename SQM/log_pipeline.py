@@ -0,0 +1,136 @@
+import codecs
+import queue
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+# t is time.monotonic() when the line was read, so it lines up with the CPU sampler clock.
+LogLine = namedtuple("LogLine", "t test text")
+
+_STOP = object()
+
+
+# ------------------------- Log Pipeline -------------------------
+class LogPipeline:
+    '''Moves command output to the log file and console off the reading thread.
+
+    Pipes are drained on their own threads in chunks of whatever is available,
+    split into lines and queued as one batch per chunk on a bounded queue. A writer thread
+    appends the lines to the log in batches as `<monotonic t> [<test>] <line>` and
+    tees them to the console at most every `console_interval` seconds. If more
+    than `console_burst` lines arrived since the last tee, the rest are only
+    counted on screen; the log file gets every drained line.
+
+    `submit()` is for callers on an event loop and never blocks: it appends to an
+    unbounded buffer that the writer thread empties on every pass, so no line is lost.'''
+
+    def __init__(self, logfile, maxsize=1000, batch_lines=500, flush_interval=0.5,
+                 console_interval=0.25, console_burst=40, quiet=False):
+        self.logfile = logfile
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+        self.console_interval = console_interval
+        self.console_burst = console_burst
+        self.quiet = quiet
+        # A full queue blocks the readers, which in turn lets the pipe apply backpressure to the child.
+        self.queue = queue.Queue(maxsize)
+        # Lines from submit(); deque appends and pops are thread-safe and never wait.
+        self.submitted = deque()
+        self._readers = []
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, test, text):
+        self.submitted.append(LogLine(time.monotonic(), test, text))
+
+    def drain(self, pipe, test, on_line=None, chunk_size=65536):
+        '''Read `pipe` on a new thread until EOF. `on_line(text)` is called on that
+        thread for each complete line, so parsers see the test's own stream.'''
+        def read():
+            raw = getattr(pipe, "buffer", pipe)
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            partial = ""
+            while True:
+                chunk = raw.read1(chunk_size) if hasattr(raw, "read1") else raw.read(chunk_size)
+                parts = (partial + decoder.decode(chunk or b"", final=not chunk)).split("\n")
+                partial = parts.pop()
+                lines = [part + "\n" for part in parts]
+                if not chunk and partial:
+                    lines.append(partial)
+                if lines:
+                    now = time.monotonic()
+                    if on_line:
+                        for line in lines:
+                            on_line(line)
+                    self.queue.put([LogLine(now, test, line) for line in lines])
+                if not chunk:
+                    break
+        thread = threading.Thread(target=read, daemon=True)
+        thread.start()
+        self._readers.append(thread)
+        return thread
+
+    def close(self):
+        '''Wait for every drained pipe to hit EOF, then flush what is left.'''
+        for thread in self._readers:
+            thread.join()
+        self.queue.put(_STOP)
+        self._writer.join()
+
+    def _write_loop(self):
+        batch, console, skipped = [], [], 0
+        next_flush = next_tee = time.monotonic()
+        done = False
+        with open(self.logfile, 'a') as f:
+            while not done:
+                if batch or console:
+                    timeout = max(0.0, min(next_flush + self.flush_interval, next_tee + self.console_interval) - time.monotonic())
+                else:
+                    # Nothing to write yet; still wake up to collect submitted lines.
+                    timeout = self.flush_interval
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                # Take whatever else is already waiting in one go.
+                items = [] if item is None else [item]
+                while item is not None and len(items) < self.batch_lines:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                submitted = [self.submitted.popleft() for _ in range(len(self.submitted))]
+                if submitted:
+                    items.append(submitted)
+                for lines in items:
+                    if lines is _STOP:
+                        done = True
+                        continue
+                    for line in lines:
+                        text = line.text if line.text.endswith("\n") else line.text + "\n"
+                        batch.append(f"{line.t:.3f} [{line.test}] {text}")
+                    if not self.quiet:
+                        room = self.console_burst - len(console)
+                        console.extend(line.text.rstrip("\n") for line in lines[:room])
+                        skipped += max(0, len(lines) - max(room, 0))
+
+                now = time.monotonic()
+                if batch and (done or len(batch) >= self.batch_lines or now >= next_flush + self.flush_interval):
+                    f.write("".join(batch))
+                    f.flush()
+                    batch = []
+                    next_flush = now
+                if console and (done or now >= next_tee + self.console_interval):
+                    if skipped:
+                        console.append(f"... {skipped} more lines in the log")
+                    sys.stdout.write("\n".join(console) + "\n")
+                    sys.stdout.flush()
+                    console, skipped = [], 0
+                    next_tee = now
@@ -0,0 +1,249 @@
+import re
+import threading
+import time
+
+SQM_KINDS = ("cake", "fq_codel")
+# What an interface shows while SQM is off in the admin app.
+SQM_DISABLED_KINDS = ("noqueue", "pfifo_fast")
+
+QDISC_RE = re.compile(r"^qdisc (\S+) (\S+) (root|parent \S+)")
+SENT_RE = re.compile(r"Sent (\d+) bytes (\d+) pkt \(dropped (\d+), overlimits (\d+) requeues (\d+)\)")
+BACKLOG_RE = re.compile(r"^backlog (\S+) (\d+)p")
+FQ_CODEL_RE = re.compile(r"\b(maxpacket|drop_overlimit|new_flow_count|ecn_mark|new_flows_len|old_flows_len) (\d+)")
+SIZE_RE = re.compile(r"^([\d.]+)([KMG]?)b?$")
+TIME_RE = re.compile(r"^([\d.]+)(us|ms|s)$")
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+TIME_UNITS = {"us": 1, "ms": 1000, "s": 1000000}
+CAKE_SIZE_ROWS = ("backlog",)
+CAKE_TIME_ROWS = ("pk_delay", "av_delay", "sp_delay")
+CAKE_COUNT_ROWS = ("pkts", "bytes", "drops", "marks", "ack_drop", "sp_flows", "bk_flows", "un_flows", "max_len")
+
+
+# ------------------------- tc Output Parsing -------------------------
+def parse_size(text):
+    '''"1514b" / "12Kb" / "1.5Mb" -> bytes.'''
+    match = SIZE_RE.match(text)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)]) if match else None
+
+def parse_time_us(text):
+    '''"5.0ms" / "120us" -> microseconds.'''
+    match = TIME_RE.match(text)
+    return float(match.group(1)) * TIME_UNITS[match.group(2)] if match else None
+
+def sqm_enabled(output):
+    '''Same rule the manual check used: SQM is off while a device shows nothing, noqueue or pfifo_fast.'''
+    text = output.lower()
+    return bool(text.strip()) and not any(kind in text for kind in SQM_DISABLED_KINDS)
+
+def parse_tc_stats(text):
+    '''Parse `tc -s qdisc show dev X` into a list of qdisc dicts with their counters.
+
+    cake qdiscs get a "tins" dict ({"Best Effort": {"drops": .., "pk_delay": us, ..}}),
+    fq_codel ones their maxpacket/ecn_mark/... counters.'''
+    qdiscs = []
+    current = None
+    tins = None
+    prev = ""
+    for raw in text.splitlines():
+        line = raw.strip()
+        match = QDISC_RE.match(line)
+        if match:
+            current = {"kind": match.group(1), "handle": match.group(2), "parent": match.group(3),
+                       "sent_bytes": 0, "sent_packets": 0, "dropped": 0, "overlimits": 0, "requeues": 0,
+                       "backlog_bytes": 0, "backlog_packets": 0}
+            qdiscs.append(current)
+            tins = None
+        elif current is None or not line:
+            pass
+        elif line.startswith("Sent "):
+            match = SENT_RE.search(line)
+            if match:
+                for key, value in zip(("sent_bytes", "sent_packets", "dropped", "overlimits", "requeues"), match.groups()):
+                    current[key] = int(value)
+        elif line.startswith("backlog ") and tins is None:
+            match = BACKLOG_RE.match(line)
+            if match:
+                current["backlog_bytes"] = parse_size(match.group(1)) or 0
+                current["backlog_packets"] = int(match.group(2))
+        elif current["kind"] == "fq_codel" and FQ_CODEL_RE.search(line):
+            for key, value in FQ_CODEL_RE.findall(line):
+                current[key] = int(value)
+        elif current["kind"] == "cake":
+            parts = line.split()
+            if parts[0] == "thresh":
+                # The tin names are on the line above the first tin row, e.g. "Bulk  Best Effort  Voice".
+                names = re.split(r"\s{2,}", prev)
+                if len(names) != len(parts) - 1:
+                    names = [f"tin{i}" for i in range(len(parts) - 1)]
+                tins = {name: {} for name in names}
+                current["tins"] = tins
+            elif tins is not None and len(parts) == len(tins) + 1:
+                key = parts[0]
+                for name, value in zip(tins, parts[1:]):
+                    if key in CAKE_COUNT_ROWS:
+                        tins[name][key] = int(value) if value.isdigit() else None
+                    elif key in CAKE_TIME_ROWS:
+                        tins[name][key] = parse_time_us(value)
+                    elif key in CAKE_SIZE_ROWS:
+                        tins[name][key] = parse_size(value)
+        prev = line
+    return qdiscs
+
+def device_totals(qdiscs):
+    '''Collapse a device's qdiscs to one set of counters, preferring the SQM (cake/fq_codel) ones.'''
+    chosen = [q for q in qdiscs if q["kind"] in SQM_KINDS] or [q for q in qdiscs if q["parent"] == "root"]
+    totals = {"kind": ",".join(sorted({q["kind"] for q in chosen})), "sent_bytes": 0, "dropped": 0,
+              "marks": 0, "backlog_bytes": 0, "backlog_packets": 0, "tins": {}}
+    for q in chosen:
+        for key in ("sent_bytes", "dropped", "backlog_bytes", "backlog_packets"):
+            totals[key] += q[key]
+        totals["marks"] += q.get("ecn_mark", 0) + sum(t.get("marks") or 0 for t in q.get("tins", {}).values())
+        for name, tin in q.get("tins", {}).items():
+            merged = totals["tins"].setdefault(name, {"drops": 0, "marks": 0, "backlog": 0, "pk_delay": 0.0, "av_delay": 0.0})
+            for key in ("drops", "marks", "backlog"):
+                merged[key] += tin.get(key) or 0
+            for key in ("pk_delay", "av_delay"):
+                merged[key] = max(merged[key], tin.get(key) or 0.0)
+    return totals
+
+def stats_cmd(devices):
+    '''One console round trip for all devices; each block starts with "== <dev>".'''
+    return "; ".join(f'echo "== {dev}"; tc -s qdisc show dev {dev}' for dev in devices)
+
+def split_devices(text):
+    blocks, dev = {}, None
+    for line in text.splitlines():
+        if line.startswith("== "):
+            dev = line[3:].strip()
+            blocks[dev] = []
+        elif dev:
+            blocks[dev].append(line)
+    return {dev: "\n".join(lines) for dev, lines in blocks.items()}
+
+
+# ------------------------- SQM Detection -------------------------
+def wait_for_sqm(session, devices, deadline=300, poll=2.0):
+    '''Poll `tc qdisc show` until every device has SQM on or `deadline` seconds pass.
+
+    Returns ({dev: output}, enabled).'''
+    end = time.monotonic() + deadline
+    while True:
+        outputs = {dev: session.run(f"tc qdisc show dev {dev}") for dev in devices}
+        if all(sqm_enabled(out) for out in outputs.values()):
+            return outputs, True
+        if time.monotonic() + poll > end:
+            return outputs, False
+        time.sleep(poll)
+
+
+# ------------------------- Background Collector -------------------------
+def _counter_delta(cur, prev):
+    # A qdisc replaced mid-test starts again from zero.
+    return cur - prev if cur >= prev else cur
+
+class QdiscCollector:
+    '''Polls `tc -s qdisc show` for a set of devices over a SerialSession on a background thread.
+
+    Each sample is {"t": seconds since start(), dev: {"kind", "sent_mbps", "drops", "marks",
+    "backlog_bytes", "backlog_packets", "tins": {name: {"drops", "marks", "backlog", "pk_delay", "av_delay"}}}}.
+    Drops, marks and throughput cover the time since the previous sample; backlog and delays are as read.'''
+
+    def __init__(self, session, devices, interval=1.0):
+        self.session = session
+        self.devices = devices
+        self.interval = interval
+        self.samples = []
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.t0 = None
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+    def _read(self):
+        text = self.session.run(stats_cmd(self.devices))
+        return time.monotonic() - self.t0, {dev: device_totals(parse_tc_stats(block)) for dev, block in split_devices(text).items()}
+
+    def _loop(self):
+        try:
+            prev_t, prev = self._read()
+            next_tick = self.t0 + self.interval
+            while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+                next_tick += self.interval
+                t, cur = self._read()
+                elapsed = t - prev_t
+                sample = {"t": round(t, 3)}
+                for dev, totals in cur.items():
+                    before = prev.get(dev, totals)
+                    tins = {}
+                    for name, tin in totals["tins"].items():
+                        old = before["tins"].get(name, tin)
+                        tins[name] = {"drops": _counter_delta(tin["drops"], old["drops"]),
+                                      "marks": _counter_delta(tin["marks"], old["marks"]),
+                                      "backlog": tin["backlog"], "pk_delay": tin["pk_delay"], "av_delay": tin["av_delay"]}
+                    sample[dev] = {
+                        "kind": totals["kind"],
+                        "sent_mbps": _counter_delta(totals["sent_bytes"], before["sent_bytes"]) * 8 / elapsed / 1e6 if elapsed > 0 else 0.0,
+                        "drops": _counter_delta(totals["dropped"], before["dropped"]),
+                        "marks": _counter_delta(totals["marks"], before["marks"]),
+                        "backlog_bytes": totals["backlog_bytes"], "backlog_packets": totals["backlog_packets"],
+                        "tins": tins,
+                    }
+                self.samples.append(sample)
+                prev_t, prev = t, cur
+        except Exception as e:
+            self.error = e
+
+    def window(self, start, end):
+        '''Samples whose interval ends inside (start, end] seconds since start().'''
+        return [s for s in self.samples if start < s["t"] <= end]
+
+    def align(self, intervals, offset=0.0):
+        '''Per-interval summaries for (start, end) intervals; `offset` is when they start, in seconds since start().'''
+        return [self.summary(self.window(offset + start, offset + end)) for start, end in intervals]
+
+    def summary(self, samples=None):
+        '''Return {dev: {"kind", "sent_mbps_mean", "drops", "marks", "backlog_peak", "tins": {name: {...}}}}.'''
+        samples = self.samples if samples is None else samples
+        result = {}
+        for dev in self.devices:
+            rows = [s[dev] for s in samples if dev in s]
+            if not rows:
+                continue
+            tins = {}
+            for row in rows:
+                for name, tin in row["tins"].items():
+                    merged = tins.setdefault(name, {"drops": 0, "marks": 0, "pk_delay_peak": 0.0, "av_delay_peak": 0.0})
+                    merged["drops"] += tin["drops"]
+                    merged["marks"] += tin["marks"]
+                    merged["pk_delay_peak"] = max(merged["pk_delay_peak"], tin["pk_delay"])
+                    merged["av_delay_peak"] = max(merged["av_delay_peak"], tin["av_delay"])
+            result[dev] = {
+                "kind": rows[-1]["kind"],
+                "sent_mbps_mean": sum(r["sent_mbps"] for r in rows) / len(rows),
+                "drops": sum(r["drops"] for r in rows),
+                "marks": sum(r["marks"] for r in rows),
+                "backlog_peak": max(r["backlog_bytes"] for r in rows),
+                "tins": tins,
+            }
+        return result
+
+def format_qdisc_summary(summary):
+    lines = [f"{'dev':<8} {'qdisc':<9} {'Mbit/s':>8} {'drops':>7} {'marks':>7} {'backlog peak':>13}"]
+    for dev, s in summary.items():
+        lines.append(f"{dev:<8} {s['kind']:<9} {s['sent_mbps_mean']:>8.2f} {s['drops']:>7} {s['marks']:>7} {s['backlog_peak']:>12}b")
+        for name, tin in s["tins"].items():
+            lines.append(f"  {name:<15} drops {tin['drops']:>6}  marks {tin['marks']:>6}  "
+                         f"pk_delay peak {tin['pk_delay_peak'] / 1000:.1f} ms  av_delay peak {tin['av_delay_peak'] / 1000:.1f} ms")
+    return "\n".join(lines)
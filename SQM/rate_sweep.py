@@ -0,0 +1,50 @@
+import itertools
+import json
+import os
+
+
+# ------------------------- Sweep Grid -------------------------
+def parse_list(text, cast=str):
+    '''"50,75, 100" -> ["50", "75", "100"] (or cast values).'''
+    return [cast(v.strip()) for v in text.split(",") if v.strip()]
+
+def sweep_cells(ul_rates, dl_rates, durations):
+    '''Every (ul, dl, duration) combination, ordered so that cells sharing a crane
+    rate are adjacent and the rate.sh rewrite is skipped between them.'''
+    return [{"ul": ul, "dl": dl, "time": t} for ul, dl, t in itertools.product(ul_rates, dl_rates, durations)]
+
+def cell_key(cell):
+    return f"ul={cell['ul']},dl={cell['dl']},time={cell['time']}"
+
+
+# ------------------------- Results File -------------------------
+def load_finished_cells(path):
+    '''Keys of the cells already recorded as finished in a JSON-lines results file.
+
+    A truncated last line (the run was killed while writing it) is ignored, so
+    that cell simply runs again.'''
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                finished.add(record["cell"])
+    return finished
+
+def append_result(path, record):
+    '''Append one cell's record and make sure it is on disk before the next cell starts.'''
+    prefix = ""
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            # Start on a fresh line after a record cut short by an interruption.
+            prefix = "" if f.read(1) == b"\n" else "\n"
+    with open(path, 'a') as f:
+        f.write(prefix + json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
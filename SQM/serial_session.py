@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import itertools
+import re
+import threading
+import time
+
+import serial
+
+from tracing import span
+
+
+# ------------------------- Serial Session -------------------------
+class SerialSession:
+    '''Long-lived serial console that returns as soon as a command has finished.
+
+    Every command is sent as `<cmd>; echo "__SQM_""<n>__:$?"`. The shell prints
+    `__SQM_<n>__:<status>` when the command is done, while the echoed command line
+    still contains the quotes, so the marker only matches the real completion.'''
+
+    def __init__(self, port, baudrate=115200, timeout=5, name=None, poll=0.05):
+        self.port = port
+        self.timeout = timeout
+        self.name = name or port
+        self.last_status = None
+        self._pending = ""
+        self._ids = itertools.count(1)
+        # Held for a whole command, so a background sampler can share the console.
+        self.lock = threading.RLock()
+        with span(f"serial connect {self.name}", "serial", port=port):
+            self.ser = serial.Serial(port=port, baudrate=baudrate, timeout=poll, write_timeout=timeout)
+            self.sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.ser.is_open:
+            self.ser.close()
+
+    def write_line(self, line):
+        self.ser.write(line.encode() + b"\n")
+
+    def read_until(self, pattern, timeout=None):
+        '''Read until regex `pattern` matches; return (text up to the match end, match).'''
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        buf = self._pending
+        while True:
+            match = pattern.search(buf)
+            if match:
+                self._pending = buf[match.end():]
+                return buf[:match.end()], match
+            if time.monotonic() > deadline:
+                self._pending = ""
+                raise TimeoutError(f"{self.name}: no {pattern.pattern!r} within {timeout or self.timeout}s; got {buf[-200:]!r}")
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+            if chunk:
+                buf += chunk.decode(errors="ignore")
+
+    def run(self, cmd, timeout=None):
+        '''Run `cmd` on the console and return its output once the end marker shows up.'''
+        with self.lock, span(f"serial {self.name}", "serial", cmd=cmd) as s:
+            n = next(self._ids)
+            self.write_line(f'{cmd}; echo "__SQM_""{n}__:$?"')
+            text, match = self.read_until(rf"__SQM_{n}__:(\d+)", timeout)
+            self.last_status = int(match.group(1))
+            s.set(status=self.last_status)
+        lines = text[:match.start()].replace("\r", "").split("\n")
+        # Drop everything up to and including the echoed command line.
+        for i, line in enumerate(lines):
+            if f'__SQM_""{n}__' in line:
+                lines = lines[i + 1:]
+                break
+        return "\n".join(lines).strip("\n")
+
+    def sync(self, attempts=3, timeout=2):
+        '''Wake the console and wait for a responsive shell, discarding any backlog.'''
+        self.ser.reset_input_buffer()
+        for attempt in range(attempts):
+            self.write_line("")
+            try:
+                self.run(":", timeout=timeout)
+                return
+            except TimeoutError:
+                if attempt == attempts - 1:
+                    raise
+
+    def put_file(self, path, content, chunk_size=256, retries=2):
+        '''Write `content` to `path` on the device as base64 chunks and verify its md5sum.
+
+        The file is decoded to `<path>.tmp` and only moved into place once the checksum
+        matches, so a dropped character never leaves a half-written file behind.'''
+        data = content.encode() if isinstance(content, str) else content
+        expected = hashlib.md5(data).hexdigest()
+        encoded = base64.b64encode(data).decode()
+        tmp = f"{path}.tmp"
+        with self.lock, span(f"put_file {self.name}", "serial", path=path, bytes=len(data)):
+            for attempt in range(retries + 1):
+                self.run(f"rm -f {tmp} {tmp}.b64")
+                for i in range(0, len(encoded), chunk_size):
+                    self.run(f"echo '{encoded[i:i + chunk_size]}' >> {tmp}.b64")
+                actual = self.run(f"base64 -d {tmp}.b64 > {tmp} && md5sum {tmp}").split()
+                if self.last_status == 0 and actual and actual[0] == expected:
+                    self.run(f"mv {tmp} {path} && rm -f {tmp}.b64")
+                    return
+                print(f"[{self.name}] Checksum mismatch writing {path} (attempt {attempt + 1}), retrying...")
+            self.run(f"rm -f {tmp} {tmp}.b64")
+        raise IOError(f"{self.name}: could not write {path}, md5sum never matched {expected}")
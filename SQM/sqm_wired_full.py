@@ -1,15 +1,28 @@
 import subprocess
 import argparse
+import atexit
 import os
-import re
-import json
-import gzip
 import sys
-import serial
 import time
 
+# serial_session and traffic_orchestrator import tracing from Common as well.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from serial_session import SerialSession
+from log_pipeline import LogPipeline
+from qdisc_stats import QdiscCollector, format_qdisc_summary, wait_for_sqm
+from cpu_sampler import CpuSampler, format_cpu_summary
+from iperf_results import IperfStream, format_iperf_result
+from latency_probe import LatencyProber, format_latency_summary
+from flent_results import parse_flent_latency_throughput, format_flent_summary
+from rate_sweep import sweep_cells, cell_key, parse_list, load_finished_cells, append_result
+from traffic_orchestrator import TrafficOrchestrator, build_flows, parse_flow_spec, aggregate_flows, format_flow_report, DEFAULT_PORT
+from results_store import record_run, DEFAULT_STORE
+from tracing import span, traced, watch_process, enable_tracing, finish_tracing, add_trace_argument
+
+PROBE_IDLE = 1.0
+
 # ------------------------- Utility Functions -------------------------
-def run_cmd(cmd, logfile):
+def run_cmd(cmd, logfile, on_line=None, quiet=False, test=None):
     print(f"\n[CMD] Running: {' '.join(cmd)}")
     process = subprocess.Popen(
         cmd,
@@ -18,57 +31,101 @@ def run_cmd(cmd, logfile):
         text=True,
         bufsize=1
     )
+    watch_process(process, test or os.path.basename(cmd[0]))
 
-    with open(logfile, 'a') as f:
-        for line in iter(process.stdout.readline, ''):
-            print(line.strip())
-            f.write(line)
-            sys.stdout.flush()
+    with LogPipeline(logfile, quiet=quiet) as pipeline:
+        pipeline.drain(process.stdout, test or os.path.basename(cmd[0]), on_line)
 
     process.stdout.close()
     process.wait()
     return process.returncode
 
-def parse_iperf_output(logfile, direction):
-    with open(logfile, 'r') as f:
-        lines = f.readlines()
-
-    for line in reversed(lines):
-        if 'receiver' in line.lower() or 'sender' in line.lower():
-            match = re.search(r'\d+\.?\d*\s+[KMG]bits/sec', line)
-            if match:
-                return f"{direction.capitalize()} throughput: {match.group(0)}"
-    return f"{direction.capitalize()} throughput: Not found"
+def iperf_cmd(args, reverse=False):
+    json_flag = "--json-stream" if args.iperf_json == "stream" else "-J"
+    cmd = ["./vrf_exec.bash", args.iface, "iperf3", "-c", args.target_ip, "-t", str(args.time), json_flag]
+    return cmd + ["-R"] if reverse else cmd
+
+def start_latency_prober(args):
+    '''Start probing the echo responder on the target through --iface, or return None if --probe-port is 0.'''
+    if not args.probe_port:
+        return None
+    prober = LatencyProber(args.target_ip, args.probe_port, args.probe_rate, max_seconds=args.time + PROBE_IDLE + 30,
+                           device=args.iface).start()
+    # A short idle lead-in gives the baseline the loaded RTTs are compared with.
+    time.sleep(PROBE_IDLE)
+    return prober
+
+def report_latency(prober, stream, result, log_file, label):
+    prober.stop()
+    if prober.error:
+        print(f"[ERROR] Latency probing during {label} failed: {prober.error}")
+        return None
+    loaded_from = stream.started_at - prober.t0 if stream.started_at else PROBE_IDLE
+    loaded_to = loaded_from + result["intervals"][-1]["end"] if result["intervals"] else None
+    latency = {"idle": prober.summary(end=loaded_from), "loaded": prober.summary(start=loaded_from, end=loaded_to)}
+    report = "\n".join([format_latency_summary("Idle RTT  ", latency["idle"]),
+                        format_latency_summary("Loaded RTT", latency["loaded"])])
+    with open(log_file, 'a') as f:
+        f.write(f"\n===== LATENCY UNDER LOAD ({label}) =====\n")
+        f.write(report + "\n")
+    print(report)
+    return latency
+
+@traced()
+def run_iperf_test(args, log_file, session, direction):
+    stream = IperfStream(direction)
+    qdisc = qdisc_collector(args, session)
+    prober = start_latency_prober(args)
+    try:
+        _, sampler = run_cmd_with_cpu_sampling(iperf_cmd(args, reverse=(direction == "download")), log_file,
+                                               f"iperf3 {direction}", session, args.cpu_interval,
+                                               on_line=stream.feed, quiet=True, qdisc=qdisc)
+    finally:
+        # Stop probing even if iperf3 fails; report_latency() stopping it again is harmless.
+        if prober:
+            prober.stop()
+    result = stream.finish()
+    print(format_iperf_result(result, direction))
+    if prober:
+        result["latency"] = report_latency(prober, stream, result, log_file, f"iperf3 {direction}")
+    if qdisc and qdisc.samples:
+        result["qdisc"] = qdisc.summary()
+    if result["intervals"] and ((sampler and sampler.samples) or (qdisc and qdisc.samples)):
+        bounds = [(i["start"], i["end"]) for i in result["intervals"]]
+        cpu = sampler.align(bounds, stream.started_at - sampler.t0 if stream.started_at else 0.0) if sampler else []
+        queues = qdisc.align(bounds, stream.started_at - qdisc.t0 if stream.started_at else 0.0) if qdisc else []
+        print(f"{'interval':>13} {'Mbits/sec':>10} {'retr':>6} {'cpu mean':>9} {'cpu peak':>9} {'drops':>6} {'marks':>6}")
+        for i, interval in enumerate(result["intervals"]):
+            overall = cpu[i].get("cpu", {}) if i < len(cpu) else {}
+            devs = queues[i] if i < len(queues) else {}
+            retr = "-" if interval["retransmits"] is None else interval["retransmits"]
+            mean = f"{overall['util_mean']:.1f}%" if overall else "-"
+            peak = f"{overall['util_peak']:.1f}%" if overall else "-"
+            drops = sum(d["drops"] for d in devs.values()) if devs else "-"
+            marks = sum(d["marks"] for d in devs.values()) if devs else "-"
+            print(f"{interval['start']:6.1f}-{interval['end']:5.1f}s {interval['mbps']:10.2f} {retr:>6} {mean:>9} {peak:>9} {drops:>6} {marks:>6}")
+    return result
 
 # ------------------------- Serial Console Helpers -------------------------
-def serial_send(ser, cmd, delay=1):
-    ser.write(cmd.encode() + b'\n')
-    time.sleep(delay)
-    return ser.read(ser.in_waiting).decode(errors='ignore')
-
-def collect_cpu_stats_serial(serial_port, log_file, label, timeout=5):
+@traced()
+def collect_cpu_stats_serial(serial_port, log_file, label, timeout=5, session=None):
     print(f"\n[CPU] Collecting CPU stats from {serial_port} ({label})...")
+    own_session = session is None
     try:
-        ser = serial.Serial(port=serial_port, baudrate=115200, timeout=timeout, write_timeout=timeout)
-        if not ser.is_open:
-            ser.open()
-
-        ser.write(b'\n')
-        time.sleep(1)
-        ser.flushInput()
-
-        ser.write(b'mpstat -P ALL\n')
-        time.sleep(2)
-
-        output = ""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if ser.in_waiting:
-                output += ser.read(ser.in_waiting).decode(errors="ignore")
-            time.sleep(0.1)
-
-        ser.write(b'\n')
-        ser.close()
+        if own_session:
+            session = SerialSession(serial_port, timeout=timeout, name="AP")
+        try:
+            # Under the lock, so a CPU sampler sharing the console cannot overwrite last_status.
+            with session.lock:
+                output = session.run("mpstat -P ALL", timeout=timeout)
+                status = session.last_status
+        finally:
+            if own_session:
+                session.close()
+
+        if status != 0:
+            print(f"[ERROR] mpstat on {serial_port} ({label}) exited with status {status}: {output.strip()[-200:]}")
+            return
 
         with open(log_file, 'a') as f:
             f.write(f"\n===== CPU STATS ({label}) =====\n")
@@ -80,8 +137,76 @@ def collect_cpu_stats_serial(serial_port, log_file, label, timeout=5):
     except Exception as e:
         print(f"[ERROR] Failed to collect CPU stats from {serial_port}: {e}")
 
+def qdisc_collector(args, session):
+    '''A QdiscCollector for br-lan and the AP WAN interface, or None if --qdisc-interval is 0.'''
+    if not session or args.qdisc_interval <= 0:
+        return None
+    return QdiscCollector(session, ["br-lan", args.ethx], args.qdisc_interval)
+
+def run_with_cpu_sampling(run, logfile, label, session, interval=1.0, qdisc=None):
+    '''Call `run()` while sampling AP CPU load, and qdisc counters if `qdisc` (an unstarted
+    QdiscCollector) is given; return (its result, CPU sampler or None).'''
+    sampler = CpuSampler(session, interval).start() if session and interval > 0 else None
+    if qdisc:
+        qdisc.start()
+    try:
+        result = run()
+    finally:
+        if sampler:
+            sampler.stop()
+        if qdisc:
+            qdisc.stop()
+    if sampler and sampler.error:
+        print(f"[ERROR] CPU sampling during {label} stopped early: {sampler.error}")
+    if sampler and sampler.samples:
+        table = format_cpu_summary(sampler.summary())
+        with open(logfile, 'a') as f:
+            f.write(f"\n===== CPU DURING ({label}), {len(sampler.samples)} samples every {interval}s =====\n")
+            f.write(table + "\n")
+        print(f"\n[CPU] AP CPU during {label}:")
+        print(table)
+    if qdisc and qdisc.error:
+        print(f"[ERROR] qdisc polling during {label} stopped early: {qdisc.error}")
+    if qdisc and qdisc.samples:
+        table = format_qdisc_summary(qdisc.summary())
+        with open(logfile, 'a') as f:
+            f.write(f"\n===== QDISC DURING ({label}), {len(qdisc.samples)} samples every {qdisc.interval}s =====\n")
+            f.write(table + "\n")
+        print(f"\n[SQM] AP qdiscs during {label}:")
+        print(table)
+    return result, sampler
+
+def run_cmd_with_cpu_sampling(cmd, logfile, label, session, interval=1.0, on_line=None, quiet=False, qdisc=None):
+    return run_with_cpu_sampling(lambda: run_cmd(cmd, logfile, on_line, quiet, label), logfile, label, session, interval, qdisc)
+
+@traced()
+def run_concurrent_test(args, log_file, session):
+    '''Run download and upload flows for every client on every --concurrent interface at once.'''
+    flows = build_flows(parse_flow_spec(args.concurrent), base_port=args.base_port)
+    json_flag = "--json-stream" if args.iperf_json == "stream" else "-J"
+    orchestrator = TrafficOrchestrator(args.target_ip, flows, args.time, log_file, json_flag)
+    print(f"[INFO] Starting {len(flows)} flows on ports {args.base_port}-{args.base_port + len(flows) - 1}")
+    results, sampler = run_with_cpu_sampling(orchestrator.run, log_file, "concurrent iperf3", session, args.cpu_interval,
+                                             qdisc_collector(args, session))
+    aggregate = aggregate_flows(results)
+    report = format_flow_report(results, aggregate)
+    with open(log_file, 'a') as f:
+        f.write("\n===== CONCURRENT FLOWS =====\n")
+        f.write(report + "\n")
+    print("\n" + report)
+    if aggregate["timeline"]:
+        offset = orchestrator.t0 - sampler.t0 if sampler else 0.0
+        cpu = sampler.align([(t - 1, t) for t, _ in aggregate["timeline"]], offset) if sampler else []
+        print(f"{'t':>5} {'download':>10} {'upload':>10} {'cpu mean':>9}")
+        for i, (t, totals) in enumerate(aggregate["timeline"]):
+            overall = cpu[i].get("cpu", {}) if i < len(cpu) else {}
+            mean = f"{overall['util_mean']:.1f}%" if overall else "-"
+            print(f"{t:>4}s {totals.get('download', 0.0):10.2f} {totals.get('upload', 0.0):10.2f} {mean:>9}")
+    return results
+
 # ------------------------- Crane Rate Configuration -------------------------
-def apply_rate_limit_on_crane(upload_rate="100", download_rate="100", wface="eth9", serial_port="/dev/ttyUSB0", timeout=5):
+@traced()
+def apply_rate_limit_on_crane(upload_rate="100", download_rate="100", wface="eth9", serial_port="/dev/ttyUSB0", timeout=5, session=None):
 
 
     def extract_rates(content):
@@ -118,75 +243,210 @@ tc class add dev $IFB parent 1: classid 1:1 htb rate {download_rate}mbit"""
     
     
 
-    print(f"\n[Crane] Connecting to {serial_port}...")
-    ser = serial.Serial(port=serial_port, baudrate=115200, timeout=timeout)
-    time.sleep(1)
-    ser.write(b'\n')
-    time.sleep(1)
+    own_session = session is None
+    if own_session:
+        print(f"\n[Crane] Connecting to {serial_port}...")
+        session = SerialSession(serial_port, timeout=timeout, name="Crane")
 
     # Read current rate.sh content
     print("[Crane] Checking existing rate.sh...")
-    ser.write(b"cd /var\n")
-    time.sleep(0.5)
-    ser.write(b"cat rate.sh\n")
-    time.sleep(1)
-    existing = ser.read(ser.in_waiting).decode(errors='ignore')
+    session.run("cd /var")
+    existing = session.run("cat rate.sh")
 
     current_ul, current_dl = extract_rates(existing)
     print(f"[Crane] Existing rates: upload={current_ul} mbit, download={current_dl} mbit")
 
     if current_ul == str(upload_rate) and current_dl == str(download_rate):
         print("[Crane] Rates already match. Skipping rate.sh rewrite.")
-        ser.close()
+        if own_session:
+            session.close()
         return
 
     print(f"[Crane] Writing rate.sh with upload={upload_rate}, download={download_rate}...")
-    serial_send(ser, "cd /var")
-    serial_send(ser, "rm -f rate.sh")
-    serial_send(ser, "cat > rate.sh <<'EOF'")
-    for line in rate_script.strip().splitlines():
-        serial_send(ser, line)
-    serial_send(ser, "EOF", delay=1)
+    session.put_file("/var/rate.sh", rate_script.strip() + "\n")
 
     print("[Crane] Applying rate.sh...")
-    output = serial_send(ser, "sh rate.sh", delay=2)
+    output = session.run("sh rate.sh", timeout=timeout)
     print(output)
-    ser.close()
+    if own_session:
+        session.close()
     print("[Crane] Rate limits applied successfully.\n")
 
 
 # ------------------------- AP SQM Status Verification -------------------------
-def verify_and_wait_for_sqm_enable(serial_port="/dev/ttyUSB1", timeout=5, ethx="eth0"):
-    print(f"\n[AP] Connecting to AP on {serial_port} to verify SQM status...")
-    ser = serial.Serial(port=serial_port, baudrate=115200, timeout=timeout)
-    time.sleep(1)
-    ser.write(b'\n')
-    time.sleep(1)
-
-    eth_cmd = f"tc qdisc show dev {ethx}"
-    output_brlan = serial_send(ser, "tc qdisc show dev br-lan")
-    output_ethx = serial_send(ser, eth_cmd)
-
-    print("[AP] br-lan qdisc status:\n", output_brlan)
-    print("[AP] ethX qdisc status:\n", output_ethx)
-
-    sqm_disabled = any([
-        "noqueue" in output_brlan.lower() or "pfifo_fast" in output_brlan.lower() or output_brlan.strip() == "",
-        "noqueue" in output_ethx.lower() or "pfifo_fast" in output_ethx.lower() or output_ethx.strip() == ""
-    ])
-
-    if sqm_disabled:
-        input("\n[SQM] SQM appears to be disabled. Please enable it using the admin app and press ENTER to continue...")
-        print("[AP] Re-checking qdisc status...")
-        output_brlan = serial_send(ser, "tc qdisc show dev br-lan")
-        output_ethx = serial_send(ser, eth_cmd)
-        print("[AP] Updated br-lan qdisc:\n", output_brlan)
-        print("[AP] Updated ethX qdisc:\n", output_ethx)
-
-    ser.close()
-    print("[AP] SQM verification completed.\n")
+@traced()
+def verify_and_wait_for_sqm_enable(serial_port="/dev/ttyUSB1", timeout=5, ethx="eth0", session=None, wait=300, poll=2.0):
+    '''Check the br-lan and ethX qdiscs and, if SQM is off, poll until it is turned on or `wait` seconds pass.
+
+    Returns True once SQM is on.'''
+    own_session = session is None
+    if own_session:
+        print(f"\n[AP] Connecting to AP on {serial_port} to verify SQM status...")
+        session = SerialSession(serial_port, timeout=timeout, name="AP")
+
+    devices = ["br-lan", ethx]
+    outputs, enabled = wait_for_sqm(session, devices, deadline=0)
+    print("[AP] br-lan qdisc status:\n", outputs["br-lan"])
+    print("[AP] ethX qdisc status:\n", outputs[ethx])
+
+    if not enabled and wait > 0:
+        print(f"\n[SQM] SQM appears to be disabled. Enable it using the admin app; polling every {poll:g}s for up to {wait}s...")
+        outputs, enabled = wait_for_sqm(session, devices, deadline=wait, poll=poll)
+        print("[AP] Updated br-lan qdisc:\n", outputs["br-lan"])
+        print("[AP] Updated ethX qdisc:\n", outputs[ethx])
+
+    if own_session:
+        session.close()
+    if enabled:
+        print("[AP] SQM verification completed.\n")
+    else:
+        print(f"[ERROR] SQM is still disabled on the AP after {wait}s.\n")
+    return enabled
 
 # ------------------------- Main Test Runner -------------------------
+@traced()
+def run_flent_test(args, log_file, session, flent_file="flent_rrul_result.flent.gz"):
+    collect_cpu_stats_serial(args.ap, log_file, "Before flent rrul", session=session)
+    run_cmd_with_cpu_sampling(["./vrf_exec.bash", args.iface, "flent", "-H", args.target_ip, "rrul", "-l", str(args.time), "-t", "SQM-eden", "-o", flent_file],
+                              log_file, "flent rrul", session, args.cpu_interval, qdisc=qdisc_collector(args, session))
+    try:
+        summary = parse_flent_latency_throughput(flent_file)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"[ERROR] Could not parse flent result {flent_file}: {e}")
+        return None
+    report = format_flent_summary(summary)
+    with open(log_file, 'a') as f:
+        f.write("\n===== FLENT RRUL SUMMARY =====\n")
+        f.write(report + "\n")
+    print("\n" + report)
+    return summary
+
+def run_traffic(args, log_file, ap, flent_file="flent_rrul_result.flent.gz"):
+    '''Run the iperf3 and flent tests at the current crane rate and return their results.'''
+    results = {}
+    if args.concurrent:
+        print("\nRunning concurrent iperf3 flows...")
+        collect_cpu_stats_serial(args.ap, log_file, "Before concurrent iperf3", session=ap)
+        results["concurrent"] = run_concurrent_test(args, log_file, ap)
+    else:
+        print("\nRunning iperf3 download test...")
+        collect_cpu_stats_serial(args.ap, log_file, "Before iperf3 download", session=ap)
+        results["download"] = run_iperf_test(args, log_file, ap, "download")
+
+        print("\nRunning iperf3 upload test...")
+        collect_cpu_stats_serial(args.ap, log_file, "Before iperf3 upload", session=ap)
+        results["upload"] = run_iperf_test(args, log_file, ap, "upload")
+
+    print("\nRunning flent rrul test...")
+    results["flent"] = run_flent_test(args, log_file, ap, flent_file)
+    return results
+
+def run_tests(args, log_file, crane, ap):
+    '''Rate-limit the crane and run the traffic tests. Returns None if SQM never comes up on the AP.'''
+    apply_rate_limit_on_crane(upload_rate=args.ul, download_rate=args.dl, wface=args.wface, serial_port=args.cp, session=crane)
+    if not verify_and_wait_for_sqm_enable(serial_port=args.ap, ethx=args.ethx, session=ap, wait=args.sqm_wait):
+        return None
+    return run_traffic(args, log_file, ap)
+
+def traffic_failure(results):
+    '''Why run_traffic() results are incomplete (an iperf3 run without a summary or with an
+    error, or no flent summary), or None if they are complete.'''
+    if not results:
+        return "no results"
+    iperf = [results[d] for d in ("download", "upload") if d in results] + list(results.get("concurrent") or [])
+    for result in iperf:
+        if result.get("error"):
+            return f"iperf3 {result['label']}: {result['error']}"
+        if not result.get("summary"):
+            return f"iperf3 {result['label']}: no summary"
+    if not results.get("flent"):
+        return "flent: no summary"
+    return None
+
+# ------------------------- Results Store -------------------------
+def sqm_metrics(results):
+    '''Flatten run_traffic() results into numeric metrics for the results store.'''
+    metrics = {}
+    for direction in ("download", "upload"):
+        result = results.get(direction)
+        if not result or not result["summary"]:
+            continue
+        metrics[f"{direction}_mbps"] = result["summary"]["received_mbps"]
+        metrics[f"{direction}_retransmits"] = result["summary"]["retransmits"]
+        for window, stats in (result.get("latency") or {}).items():
+            if stats:
+                metrics[f"{direction}_{window}_rtt_p50_ms"] = stats["p50_ms"]
+                metrics[f"{direction}_{window}_rtt_p99_ms"] = stats["p99_ms"]
+        for dev, queue in (result.get("qdisc") or {}).items():
+            metrics[f"{direction}_{dev}_drops"] = queue["drops"]
+    if results.get("concurrent"):
+        for direction, entry in aggregate_flows(results["concurrent"])["directions"].items():
+            metrics[f"concurrent_{direction}_mbps"] = entry["total_mbps"]
+            metrics[f"concurrent_{direction}_fairness"] = entry["fairness"]
+    flent = results.get("flent")
+    if flent:
+        metrics["flent_idle_p50_ms"] = (flent["idle_latency"] or {}).get("p50")
+        metrics["flent_loaded_p50_ms"] = (flent["loaded_latency"] or {}).get("p50")
+        metrics["flent_latency_delta_ms"] = flent["latency_delta_ms"]
+        for direction, goodput in flent["goodput"].items():
+            metrics[f"flent_{direction}_mbps"] = (goodput or {}).get("mean_mbps")
+    return metrics
+
+@traced()
+def store_sqm_run(args, results, started, status=None):
+    '''Add one crane-rate run (a plain run or a sweep cell) to the shared results store.
+    Without `status`, it is "failed" when traffic_failure() finds the results incomplete.'''
+    if status is None:
+        status = "failed" if traffic_failure(results) else "ok"
+    record_run(args.results_db, "sqm", "sqm_wired", metrics=sqm_metrics(results or {}), payload=results,
+               device=args.device, firmware=args.firmware, started=started, status=status,
+               params={"ul": str(args.ul).replace("mbit", ""), "dl": str(args.dl).replace("mbit", ""), "time": args.time, "iface": args.iface,
+                       "target_ip": args.target_ip, "concurrent": args.concurrent})
+
+# ------------------------- Rate Sweep -------------------------
+def run_sweep(args, log_file, crane, ap):
+    '''Run the tests for every UL/DL/duration cell, appending each result to --sweep-results.
+
+    Cells already recorded as finished are skipped, so an interrupted sweep picks up where it stopped.
+    Returns False if SQM never comes up on the AP.'''
+    cells = sweep_cells(parse_list(args.sweep_ul or args.ul), parse_list(args.sweep_dl or args.dl),
+                        parse_list(args.sweep_time or str(args.time), int))
+    finished = load_finished_cells(args.sweep_results)
+    pending = [cell for cell in cells if cell_key(cell) not in finished]
+    print(f"\n[Sweep] {len(cells)} cells, {len(cells) - len(pending)} already finished in {args.sweep_results}")
+    if not pending:
+        return True
+
+    if not verify_and_wait_for_sqm_enable(serial_port=args.ap, ethx=args.ethx, session=ap, wait=args.sqm_wait):
+        return False
+    for n, cell in enumerate(pending, 1):
+        key = cell_key(cell)
+        print(f"\n[Sweep] Cell {n}/{len(pending)}: {key}")
+        with open(log_file, 'a') as f:
+            f.write(f"\n===== SWEEP CELL {key} =====\n")
+        cell_args = argparse.Namespace(**{**vars(args), **cell})
+        record = {"cell": key, **cell, "started": time.time()}
+        try:
+            with span(f"sweep cell {key}"):
+                apply_rate_limit_on_crane(upload_rate=cell["ul"], download_rate=cell["dl"], wface=args.wface, serial_port=args.cp, session=crane)
+                flent_file = f"flent_rrul_ul{cell['ul']}_dl{cell['dl']}_t{cell['time']}.flent.gz"
+                record["results"] = run_traffic(cell_args, log_file, ap, flent_file)
+            failure = traffic_failure(record["results"])
+            if failure:
+                print(f"[ERROR] Sweep cell {key} failed: {failure}")
+                record["status"] = "failed"
+                record["error"] = failure
+            else:
+                record["status"] = "ok"
+        except Exception as e:
+            print(f"[ERROR] Sweep cell {key} failed: {e}")
+            record["status"] = "failed"
+            record["error"] = str(e)
+        record["finished"] = time.time()
+        append_result(args.sweep_results, record)
+        store_sqm_run(cell_args, record.get("results"), record["started"], record["status"])
+    return True
+
 def main():
     parser = argparse.ArgumentParser(description="Run iperf3 and flent rrul tests with SQM + rate control setup.")
     parser.add_argument("target_ip", help="Target host IP address")
@@ -199,36 +459,56 @@ def main():
     parser.add_argument("--wface", required=True, help="WAN interface of crane")
     parser.add_argument("--cp", required=True, help="Enter crane usb port name like /dev/ttyUSB0")
     parser.add_argument("--ap", required=True, help="Enter AP usb port name like /dev/ttyUSB0")
+    parser.add_argument("--iperf-json", choices=["stream", "full"], default="stream",
+                        help="stream: iperf3 --json-stream (3.17+), parsed per interval; full: iperf3 -J")
+    parser.add_argument("--concurrent", metavar="IFACE[:CLIENTS],...",
+                        help="Run download and upload flows for all clients at once instead of one after another, e.g. eth1:2,eth2")
+    parser.add_argument("--base-port", type=int, default=DEFAULT_PORT, help="First iperf3 server port for --concurrent; each flow uses the next one")
+    parser.add_argument("--sweep-ul", help="Comma-separated upload rates to sweep, e.g. 25,50,100")
+    parser.add_argument("--sweep-dl", help="Comma-separated download rates to sweep")
+    parser.add_argument("--sweep-time", help="Comma-separated test durations in seconds to sweep")
+    parser.add_argument("--sweep-results", default="sqm_sweep_results.jsonl", help="Sweep results file; finished cells in it are skipped")
+    parser.add_argument("--sqm-wait", type=int, default=300, help="Seconds to wait for SQM to be enabled on the AP before giving up")
+    parser.add_argument("--qdisc-interval", type=float, default=1.0, help="AP tc -s qdisc polling interval during tests in seconds (0 = off)")
+    parser.add_argument("--probe-port", type=int, default=0,
+                        help="UDP port of a latency_probe.py echo responder on the target; probes RTT during iperf3 runs (0 = off)")
+    parser.add_argument("--probe-rate", type=int, default=100, help="Latency probes per second")
+    parser.add_argument("--cpu-interval", type=float, default=1.0, help="AP CPU sampling interval during tests in seconds (0 = off)")
+    parser.add_argument("--results-db", default=DEFAULT_STORE,
+                        help=f"Shared results store every run is added to ('' = off, default: {DEFAULT_STORE})")
+    parser.add_argument("--device", help="Device (AP) name for the results store")
+    parser.add_argument("--firmware", help="AP firmware build for the results store")
+    add_trace_argument(parser)
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing("sqm_wired_full")
+        atexit.register(finish_tracing, args.trace)
 
+    sweep = bool(args.sweep_ul or args.sweep_dl or args.sweep_time)
     log_file = args.output
-    open(log_file, 'w').close()
-
-    apply_rate_limit_on_crane(upload_rate=args.ul, download_rate=args.dl, wface=args.wface, serial_port=args.cp)
-    verify_and_wait_for_sqm_enable(serial_port=args.ap, ethx=args.ethx)
-
-    print("\nRunning iperf3 download test...")
-    collect_cpu_stats_serial(args.ap, log_file, "Before iperf3 download")
-    run_cmd(["./vrf_exec.bash", args.iface, "iperf3", "-c", args.target_ip, "-t", str(args.time), "-R"], log_file)
-    print(parse_iperf_output(log_file, "download"))
-
-    print("\nRunning iperf3 upload test...")
-    collect_cpu_stats_serial(args.ap, log_file, "Before iperf3 upload")
-    run_cmd(["./vrf_exec.bash", args.iface, "iperf3", "-c", args.target_ip, "-t", str(args.time)], log_file)
-    print(parse_iperf_output(log_file, "upload"))
-
-    print("\nRunning flent rrul test...")
-    flent_file = "flent_rrul_result.flent.gz"
-    collect_cpu_stats_serial(args.ap, log_file, "Before flent rrul")
-    run_cmd(["./vrf_exec.bash", args.iface, "flent", "-H", args.target_ip, "rrul", "-l", str(args.time), "-t", "SQM-eden", "-o", flent_file], log_file)
-    # print(parse_flent_latency_throughput(flent_file))
-    print("\nPrinting raw flent result from file...")
+    if not sweep:
+        open(log_file, 'w').close()
+
+    print(f"\n[Crane] Connecting to {args.cp}...")
+    crane = SerialSession(args.cp, name="Crane")
+    print(f"\n[AP] Connecting to AP on {args.ap}...")
+    ap = SerialSession(args.ap, name="AP")
+    started = time.time()
     try:
-        with open(flent_file, 'r') as f:
-            for line in f:
-                print(line.strip())
-    except gzip.BadGzipFile:
-        print("ERROR: Flent file is not actually gzipped. Try checking --gzip-output placement.")
+        if sweep:
+            sqm_enabled = run_sweep(args, log_file, crane, ap)
+        else:
+            results = run_tests(args, log_file, crane, ap)
+            sqm_enabled = results is not None
+            if sqm_enabled:
+                store_sqm_run(args, results, started)
+        if not sqm_enabled:
+            store_sqm_run(args, {"error": f"SQM not enabled on the AP within {args.sqm_wait}s"}, started, status="failed")
+    finally:
+        crane.close()
+        ap.close()
+    if not sqm_enabled:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+from iperf_results import IperfStream
+from log_pipeline import LogPipeline
+from tracing import span
+
+DEFAULT_PORT = 5201
+# Longest output line a flow may print; asyncio's default of 64 KiB fails on long iperf3 -J lines.
+LINE_LIMIT = 1 << 20
+
+
+# ------------------------- Flow Specs -------------------------
+class Flow:
+    '''One iperf3 client process on a VRF interface, in one direction, against one server port.'''
+
+    def __init__(self, iface, direction, port, label=None):
+        self.iface = iface
+        self.direction = direction
+        self.port = port
+        self.label = label or f"{iface}:{port} {direction}"
+
+    def command(self, target_ip, duration, json_flag="--json-stream"):
+        cmd = ["./vrf_exec.bash", self.iface, "iperf3", "-c", target_ip, "-p", str(self.port), "-t", str(duration), json_flag]
+        return cmd + ["-R"] if self.direction == "download" else cmd
+
+def parse_flow_spec(spec):
+    '''Turn "eth1:2,eth2" into [("eth1", 2), ("eth2", 1)]: VRF interfaces and client counts.'''
+    ifaces = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        iface, _, clients = item.partition(":")
+        ifaces.append((iface, int(clients) if clients else 1))
+    return ifaces
+
+def build_flows(ifaces, directions=("download", "upload"), base_port=DEFAULT_PORT):
+    '''One flow per client and direction. Every flow gets its own port, since an
+    iperf3 server only runs one test at a time.'''
+    flows = []
+    port = base_port
+    for iface, clients in ifaces:
+        for client in range(1, clients + 1):
+            for direction in directions:
+                flows.append(Flow(iface, direction, port, f"{iface}#{client} {direction}"))
+                port += 1
+    return flows
+
+
+# ------------------------- Orchestrator -------------------------
+class TrafficOrchestrator:
+    '''Runs a set of flows at the same time on asyncio subprocesses.
+
+    All flows wait for a shared start time `t0` (time.monotonic()), so their
+    iperf3 intervals line up on one test clock. Output is read line by line as it
+    arrives, fed to an IperfStream per flow and handed to a LogPipeline tagged with the flow label.'''
+
+    def __init__(self, target_ip, flows, duration, logfile, json_flag="--json-stream", start_delay=1.0, grace=15.0, echo=True):
+        self.target_ip = target_ip
+        self.flows = flows
+        self.duration = duration
+        self.logfile = logfile
+        self.json_flag = json_flag
+        self.start_delay = start_delay
+        self.grace = grace
+        self.echo = echo
+        self.t0 = None
+
+    def run(self):
+        return asyncio.run(self._run_all())
+
+    async def _run_all(self):
+        self.t0 = time.monotonic() + self.start_delay
+        with LogPipeline(self.logfile, quiet=True) as log:
+            return await asyncio.gather(*(self._run_flow(flow, log) for flow in self.flows))
+
+    async def _run_flow(self, flow, log):
+        stream = IperfStream(flow.label, echo=self.echo)
+        cmd = flow.command(self.target_ip, self.duration, self.json_flag)
+        await asyncio.sleep(max(0.0, self.t0 - time.monotonic()))
+        print(f"[CMD] Running: {' '.join(cmd)}")
+        returncode = None
+        # Flows overlap in one event loop, so each gets its own track in the trace.
+        with span(flow.label, "subprocess", track=flow.label, cmd=" ".join(cmd)) as s:
+            try:
+                proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                                                            limit=LINE_LIMIT)
+            except OSError as e:
+                stream.error = str(e)
+            else:
+                try:
+                    await asyncio.wait_for(self._pump(proc, flow, stream, log), self.duration + self.grace)
+                except asyncio.TimeoutError:
+                    stream.error = f"still running {self.grace:.0f}s after the test should have ended, killed"
+                except ValueError as e:
+                    stream.error = f"output could not be read, killed: {e}"
+                finally:
+                    # Also on cancellation, so no iperf3 outlives the test.
+                    if proc.returncode is None:
+                        proc.kill()
+                    returncode = await proc.wait()
+            s.set(returncode=returncode)
+        result = stream.finish()
+        result.update({
+            "iface": flow.iface, "direction": flow.direction, "port": flow.port, "returncode": returncode,
+            # Where this flow's iperf3 clock starts on the shared test clock.
+            "offset": stream.started_at - self.t0 if stream.started_at else 0.0,
+        })
+        return result
+
+    async def _pump(self, proc, flow, stream, log):
+        async for raw in proc.stdout:
+            line = raw.decode(errors="ignore")
+            log.submit(flow.label, line)
+            stream.feed(line)
+
+
+# ------------------------- Aggregation -------------------------
+def jain_fairness(values):
+    '''Jain's fairness index: 1.0 when all flows get the same throughput, 1/n when one takes everything.'''
+    values = [v for v in values if v is not None]
+    if not values or not any(values):
+        return None
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+def aggregate_flows(results):
+    '''Per-direction totals and fairness, plus the summed throughput per second of the shared clock.'''
+    directions = {}
+    timeline = {}
+    for result in results:
+        summary = result.get("summary") or {}
+        entry = directions.setdefault(result["direction"], {"flows": 0, "failed": 0, "total_mbps": 0.0, "per_flow": []})
+        entry["flows"] += 1
+        if not summary:
+            entry["failed"] += 1
+            continue
+        entry["total_mbps"] += summary["received_mbps"]
+        entry["per_flow"].append(summary["received_mbps"])
+        for interval in result["intervals"]:
+            second = int(result["offset"] + interval["end"] + 0.5)
+            bucket = timeline.setdefault(second, {})
+            bucket[result["direction"]] = bucket.get(result["direction"], 0.0) + interval["mbps"]
+    for entry in directions.values():
+        entry["fairness"] = jain_fairness(entry.pop("per_flow"))
+    return {"directions": directions, "timeline": [(t, timeline[t]) for t in sorted(timeline)]}
+
+def format_flow_report(results, aggregate):
+    lines = [f"{'flow':<22} {'port':>5} {'Mbits/sec':>10} {'retr':>6}  status"]
+    for r in results:
+        summary = r.get("summary")
+        mbps = f"{summary['received_mbps']:.2f}" if summary else "-"
+        retr = "-" if not summary or summary.get("retransmits") is None else summary["retransmits"]
+        status = "ok" if summary and not r.get("error") else f"FAILED {r.get('error') or 'no summary'}"
+        lines.append(f"{r['label']:<22} {r['port']:>5} {mbps:>10} {retr:>6}  {status}")
+    for direction, entry in aggregate["directions"].items():
+        fairness = "n/a" if entry["fairness"] is None else f"{entry['fairness']:.3f}"
+        lines.append(f"{direction.capitalize()} total: {entry['total_mbps']:.2f} Mbits/sec over "
+                     f"{entry['flows'] - entry['failed']}/{entry['flows']} flows (fairness {fairness})")
+    return "\n".join(lines)
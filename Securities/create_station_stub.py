@@ -0,0 +1,33 @@
+import argparse
+import os
+import time
+
+# Offline stand-in for lanforge-scripts/py-scripts/create_station.py, used with --station-script
+# to measure the orchestration overhead of a scale run without LANforge.
+# STATION_STUB_DELAY: fixed seconds per call (the LANforge round trip), STATION_STUB_PER_STA: seconds per station.
+
+
+def stub_mac(n):
+    '''A locally administered MAC for station number `n`.'''
+    return f"02:5f:00:00:{(n >> 8) & 0xff:02x}:{n & 0xff:02x}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub of LANforge create_station.py")
+    parser.add_argument("--mgr")
+    parser.add_argument("--radio")
+    parser.add_argument("--ssid")
+    parser.add_argument("--bssid")
+    parser.add_argument("--passwd")
+    parser.add_argument("--security")
+    parser.add_argument("--num_stations", type=int, default=1)
+    parser.add_argument("--start_id", type=int, default=0)
+    args, _ = parser.parse_known_args()
+
+    time.sleep(float(os.environ.get("STATION_STUB_DELAY", "0.5")))
+    for n in range(args.start_id, args.start_id + args.num_stations):
+        time.sleep(float(os.environ.get("STATION_STUB_PER_STA", "0.01")))
+        print(f"Created station sta{n:04d} {stub_mac(n)} on {args.radio} ({args.security}, ssid {args.ssid})", flush=True)
+
+
+if __name__ == "__main__":
+    main()
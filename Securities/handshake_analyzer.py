@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import struct
+import sys
+
+if __name__ == "__main__":
+    # Run as a script; securities_full.py sets up the path when it imports this module.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from pcap_reader import iter_records, strip_radiotap, LINKTYPE_RADIOTAP, LINKTYPE_IEEE802_11
+
+# 802.11 frame control
+TYPE_MGMT = 0
+TYPE_DATA = 2
+SUBTYPE_ASSOC_REQ = 0
+SUBTYPE_ASSOC_RESP = 1
+SUBTYPE_REASSOC_REQ = 2
+SUBTYPE_REASSOC_RESP = 3
+SUBTYPE_DISASSOC = 10
+SUBTYPE_AUTH = 11
+SUBTYPE_DEAUTH = 12
+FLAG_TO_DS = 0x01
+FLAG_FROM_DS = 0x02
+FLAG_RETRY = 0x08
+FLAG_ORDER = 0x80
+
+AUTH_OPEN = 0
+AUTH_SAE = 3
+LLC_EAPOL = b"\xaa\xaa\x03\x00\x00\x00\x88\x8e"
+EAPOL_KEY = 3
+
+# EAPOL-Key key information bits
+KEY_INFO_PAIRWISE = 0x0008
+KEY_INFO_ACK = 0x0080
+KEY_INFO_MIC = 0x0100
+KEY_INFO_SECURE = 0x0200
+
+# Only the station opens a connection attempt; anything else without one (a late 4/4
+# retransmission, a PTK rekey) is ignored.
+START_EVENTS = ("auth_req", "sae_commit_sta", "assoc_req")
+EXPECTED = {
+    "WPA3-SAE": ["sae_commit_sta", "sae_commit_ap", "sae_confirm_sta", "sae_confirm_ap",
+                 "assoc_req", "assoc_resp", "eapol_1", "eapol_2", "eapol_3", "eapol_4"],
+    "WPA2-PSK": ["auth_req", "auth_resp", "assoc_req", "assoc_resp", "eapol_1", "eapol_2", "eapol_3", "eapol_4"],
+    "open": ["auth_req", "auth_resp", "assoc_req", "assoc_resp"],
+}
+PHASES = [
+    ("auth", ("auth_req", "sae_commit_sta"), ("auth_resp", "sae_confirm_ap")),
+    ("assoc", ("assoc_req",), ("assoc_resp",)),
+    ("4way", ("eapol_1",), ("eapol_4",)),
+]
+# A station with no handshake frames for this long (capture time) is reported and dropped.
+IDLE_TIMEOUT = 10.0
+
+
+# --- FRAME CLASSIFICATION ---
+def mac(raw):
+    return raw.hex(":")
+
+def classify(frame):
+    '''Return (event, sta, bssid, retry) for a handshake frame, or None. Addresses are raw bytes.'''
+    if len(frame) < 24:
+        return None
+    fc, flags = frame[0], frame[1]
+    ftype, subtype = (fc >> 2) & 0x3, (fc >> 4) & 0xF
+    addr1, addr2, addr3 = frame[4:10], frame[10:16], frame[16:22]
+    retry = bool(flags & FLAG_RETRY)
+
+    if ftype == TYPE_MGMT:
+        # Frames sent by the AP carry its address as both transmitter and BSSID.
+        from_ap = addr2 == addr3
+        sta = addr1 if from_ap else addr2
+        body = frame[24:]
+        if subtype == SUBTYPE_AUTH and len(body) >= 6:
+            algorithm, seq, _status = struct.unpack_from("<HHH", body)
+            if algorithm == AUTH_SAE:
+                step = "commit" if seq == 1 else "confirm"
+                event = f"sae_{step}_{'ap' if from_ap else 'sta'}"
+            elif algorithm == AUTH_OPEN:
+                event = "auth_resp" if seq == 2 else "auth_req"
+            else:
+                return None
+        elif subtype in (SUBTYPE_ASSOC_REQ, SUBTYPE_REASSOC_REQ):
+            event = "assoc_req"
+        elif subtype in (SUBTYPE_ASSOC_RESP, SUBTYPE_REASSOC_RESP):
+            event = "assoc_resp"
+        elif subtype in (SUBTYPE_DEAUTH, SUBTYPE_DISASSOC):
+            event = "deauth"
+        else:
+            return None
+        return event, sta, addr3, retry
+
+    if ftype == TYPE_DATA:
+        to_ds, from_ds = flags & FLAG_TO_DS, flags & FLAG_FROM_DS
+        if to_ds and from_ds:
+            return None
+        hdr = 24
+        if subtype & 0x8:
+            hdr += 2
+            if flags & FLAG_ORDER:
+                hdr += 4
+        if frame[hdr:hdr + 8] != LLC_EAPOL:
+            return None
+        eapol = frame[hdr + 8:]
+        if len(eapol) < 7 or eapol[1] != EAPOL_KEY:
+            return None
+        info = struct.unpack_from(">H", eapol, 5)[0]
+        if not info & KEY_INFO_PAIRWISE:
+            return None  # group key handshake
+        if info & KEY_INFO_ACK:
+            n = 3 if info & KEY_INFO_MIC else 1
+        else:
+            n = 4 if info & KEY_INFO_SECURE else 2
+        sta, bssid = (addr2, addr1) if to_ds else (addr1, addr2)
+        return f"eapol_{n}", sta, bssid, retry
+    return None
+
+
+# --- HANDSHAKE TRACKING ---
+def new_attempt(sta, bssid, ts):
+    return {"sta": sta, "bssid": bssid, "start": ts, "last": ts, "first": {}, "count": {}, "retries": 0, "deauth": False}
+
+def finish_attempt(attempt):
+    '''Turn a tracked attempt into its report: mode, per-phase/total times, missing and repeated messages.'''
+    first = attempt["first"]
+    if any(e.startswith("sae_") for e in first):
+        mode = "WPA3-SAE"
+    elif any(e.startswith("eapol_") for e in first):
+        mode = "WPA2-PSK"
+    else:
+        mode = "open"
+    phases = {}
+    for name, starts, ends in PHASES:
+        start = min((first[e] for e in starts if e in first), default=None)
+        end = max((first[e] for e in ends if e in first), default=None)
+        phases[name] = end - start if start is not None and end is not None and end >= start else None
+    missing = [e for e in EXPECTED[mode] if e not in first]
+    done = EXPECTED[mode][-1]
+    total = first[done] - attempt["start"] if done in first else None
+    return {
+        "sta": mac(attempt["sta"]), "bssid": mac(attempt["bssid"]), "mode": mode, "start": attempt["start"],
+        "complete": not missing, "total": total, "phases": phases, "missing": missing,
+        "repeated": {e: n - 1 for e, n in attempt["count"].items() if n > 1},
+        "retries": attempt["retries"], "deauth": attempt["deauth"],
+    }
+
+def iter_capture(source):
+    '''Records of a capture, or of several ring-buffer segments (a list of paths) one after the other.'''
+    if isinstance(source, (list, tuple)):
+        for segment in source:
+            yield from iter_records(segment)
+    else:
+        yield from iter_records(source)
+
+def iter_handshakes(source, bssid=None, idle_timeout=IDLE_TIMEOUT):
+    '''Stream a capture (or its ring-buffer segments) once and yield one report per connection attempt as soon as it is over.
+
+    Only the stations that are in the middle of a handshake are kept in memory: an attempt
+    is reported when its 4/4 arrives, on deauth/disassoc, when the station starts over,
+    or after `idle_timeout` seconds of capture time without frames (how open networks end).'''
+    active = {}
+    next_sweep = None
+    bssid = bytes.fromhex(bssid.replace(":", "")) if bssid else None
+    for linktype, ts, data in iter_capture(source):
+        if linktype == LINKTYPE_RADIOTAP:
+            frame = strip_radiotap(data)
+        elif linktype == LINKTYPE_IEEE802_11:
+            frame = data
+        else:
+            continue
+        hit = classify(frame) if frame else None
+        ts = ts or 0.0
+        if next_sweep is None or ts >= next_sweep:
+            for sta in [s for s, a in active.items() if ts - a["last"] > idle_timeout]:
+                yield finish_attempt(active.pop(sta))
+            next_sweep = ts + 1.0
+        if not hit:
+            continue
+        event, sta, frame_bssid, retry = hit
+        if bssid and frame_bssid != bssid:
+            continue
+
+        attempt = active.get(sta)
+        if event == "deauth":
+            if attempt:
+                attempt["deauth"] = True
+                yield finish_attempt(active.pop(sta))
+            continue
+        starts_over = event in ("auth_req", "sae_commit_sta") and attempt and not retry and (
+            "assoc_req" in attempt["first"] or any(e.startswith("eapol_") for e in attempt["first"]))
+        if attempt and starts_over:
+            yield finish_attempt(active.pop(sta))
+            attempt = None
+        if attempt is None:
+            if event not in START_EVENTS:
+                continue
+            attempt = active[sta] = new_attempt(sta, frame_bssid, ts)
+
+        attempt["last"] = ts
+        attempt["first"].setdefault(event, ts)
+        attempt["count"][event] = attempt["count"].get(event, 0) + 1
+        attempt["retries"] += retry
+        if event == "eapol_4":
+            yield finish_attempt(active.pop(sta))
+    for attempt in active.values():
+        yield finish_attempt(attempt)
+
+
+# --- REPORTING ---
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+class HandshakeStats:
+    '''Per-mode attempt counts and connection-time statistics, fed one report at a time.'''
+    def __init__(self):
+        self.modes = {}
+
+    def add(self, report):
+        entry = self.modes.setdefault(report["mode"], {"attempts": 0, "complete": 0, "totals": [], "phases": {}})
+        entry["attempts"] += 1
+        if report["complete"]:
+            entry["complete"] += 1
+            entry["totals"].append(report["total"])
+            for name, value in report["phases"].items():
+                if value is not None:
+                    phase = entry["phases"].setdefault(name, [0, 0.0])
+                    phase[0] += 1
+                    phase[1] += value
+
+    def summary(self):
+        summary = {}
+        for mode, entry in self.modes.items():
+            totals = sorted(entry["totals"])
+            summary[mode] = {
+                "attempts": entry["attempts"], "complete": entry["complete"],
+                "total_mean": sum(totals) / len(totals) if totals else None,
+                "total_median": totals[len(totals) // 2] if totals else None,
+                "total_max": totals[-1] if totals else None,
+                "phase_mean": {name: total / n for name, (n, total) in entry["phases"].items()},
+            }
+        return summary
+
+REPORT_HEADER = f"{'station':<18} {'mode':<9} {'auth ms':>8} {'assoc ms':>9} {'4way ms':>8} {'total ms':>9} {'retries':>7}  notes"
+
+def format_report(r):
+    notes = []
+    if r["missing"]:
+        notes.append("missing " + ",".join(r["missing"]))
+    if r["repeated"]:
+        notes.append("repeated " + ",".join(f"{e}x{n}" for e, n in r["repeated"].items()))
+    if r["deauth"]:
+        notes.append("deauth")
+    p = r["phases"]
+    return (f"{r['sta']:<18} {r['mode']:<9} {_ms(p['auth']):>8} {_ms(p['assoc']):>9} {_ms(p['4way']):>8} "
+            f"{_ms(r['total']):>9} {r['retries']:>7}  {'; '.join(notes)}")
+
+def format_summary(summary):
+    lines = []
+    for mode, s in summary.items():
+        phases = "  ".join(f"{name} {v * 1000:.1f}" for name, v in s["phase_mean"].items())
+        lines.append(f"[{mode}] {s['complete']}/{s['attempts']} complete, total mean {_ms(s['total_mean'])} ms, "
+                     f"median {_ms(s['total_median'])} ms, max {_ms(s['total_max'])} ms; phase means (ms): {phases}")
+    return "\n".join(lines)
+
+def analyze_capture(pcap_file, bssid=None):
+    '''Return (reports, per-mode summary) for a capture.'''
+    stats = HandshakeStats()
+    reports = []
+    for report in iter_handshakes(pcap_file, bssid):
+        stats.add(report)
+        reports.append(report)
+    return reports, stats.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report auth / assoc / SAE / EAPOL handshake timing per station from a capture")
+    parser.add_argument("pcap", nargs="+", help="pcap or pcapng capture (radiotap or raw 802.11); several ring-buffer segments are read in order")
+    parser.add_argument("--bssid", help="Only look at handshakes with this BSSID")
+    parser.add_argument("--json", action="store_true", help="Print the reports and summary as JSON")
+    args = parser.parse_args()
+
+    if args.json:
+        reports, summary = analyze_capture(args.pcap, args.bssid)
+        print(json.dumps({"reports": reports, "summary": summary}, indent=2))
+        return
+    # Print each attempt as it completes; only the running statistics are kept.
+    stats = HandshakeStats()
+    print(REPORT_HEADER)
+    for report in iter_handshakes(args.pcap, args.bssid):
+        stats.add(report)
+        print(format_report(report))
+    print(format_summary(stats.summary()))
+
+
+if __name__ == "__main__":
+    main()
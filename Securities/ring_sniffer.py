@@ -0,0 +1,49 @@
+import glob
+import os
+import subprocess
+
+from capture_ready import watch_capture
+
+# Management subtypes a connection attempt is made of; beacons and probes, which are most
+# of the traffic on a busy channel, are left out.
+HANDSHAKE_SUBTYPES = ["auth", "assoc-req", "assoc-resp", "reassoc-req", "reassoc-resp", "deauth", "disassoc"]
+EAPOL_ETHERTYPE = 0x888e
+
+
+# --- CAPTURE FILTER ---
+def handshake_filter(bssid=None):
+    '''BPF filter (evaluated in the kernel) for auth/assoc/deauth frames and EAPOL, optionally for one BSSID.'''
+    mgmt = " or ".join(f"subtype {s}" for s in HANDSHAKE_SUBTYPES)
+    bpf = f"(type mgt and ({mgmt})) or (type data and ether proto 0x{EAPOL_ETHERTYPE:04x})"
+    if bssid:
+        bpf = f"({bpf}) and wlan host {bssid}"
+    return bpf
+
+
+# --- TSHARK ---
+def sniffer_cmd(interface, pcap_file, capture_filter=None, ring_files=0, ring_size_mb=10):
+    '''tshark command line; with `ring_files` it keeps at most that many `ring_size_mb` segments.'''
+    cmd = ["tshark", "-i", interface, "-w", pcap_file]
+    if capture_filter:
+        cmd += ["-f", capture_filter]
+    if ring_files:
+        cmd += ["-b", f"filesize:{ring_size_mb * 1000}", "-b", f"files:{ring_files}"]
+    return cmd
+
+def start_capture(cmd):
+    '''Start tshark in its own process group and watch it with watch_capture().'''
+    return watch_capture(subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True, preexec_fn=os.setsid))
+
+# --- SEGMENTS ---
+def capture_segments(pcap_file, ring=False):
+    '''Files of a capture in order: the file itself, or the surviving ring-buffer segments
+    (tshark names them <name>_<index>_<timestamp><ext>).'''
+    if not ring:
+        return [pcap_file]
+    stem, ext = os.path.splitext(pcap_file)
+    return sorted(glob.glob(f"{glob.escape(stem)}_[0-9]*{ext}"))
+
+def clear_segments(pcap_file):
+    '''Remove ring-buffer segments left by an earlier run so they are not analyzed with this one.'''
+    for path in capture_segments(pcap_file, ring=True):
+        os.remove(path)
@@ -3,55 +3,156 @@ import time
 import os
 import signal
 import argparse
+import atexit
 import sys
 
+# pcap_reader, monitor_client, capture_ready, results_store and tracing live in Common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+
+from ring_sniffer import handshake_filter, sniffer_cmd, start_capture, capture_segments, clear_segments
+from capture_ready import wait_until_capturing, READY_TIMEOUT
+from station_scale import (STATION_SCRIPT, station_cmd, create_batch, plan_batches, run_batches, fill_station_macs,
+                           join_with_capture, format_scale_report)
+from handshake_analyzer import HandshakeStats, REPORT_HEADER, format_report, format_summary, iter_handshakes
+from monitor_client import MonitorClient, DaemonError, DEFAULT_SOCKET, write_pcap
+from results_store import record_run, DEFAULT_STORE
+from tracing import span, traced, run_traced, watch_process, enable_tracing, finish_tracing, add_trace_argument
+
+# How long the daemon's capture may lag behind the end of the client run, and how often to check.
+DAEMON_CATCHUP = 5.0
+DAEMON_POLL = 0.1
+
 # --- SETUP MONITOR ---
+@traced()
 def setup_monitor(base_iface, mon_iface):
     '''Create and bring up a monitor interface.'''
     print(f"[INFO] Setting up monitor interface '{mon_iface}' from '{base_iface}'...")
-    subprocess.run(["iw", "dev", base_iface, "interface", "add", mon_iface, "type", "monitor"], check=True)
-    subprocess.run(["ip", "link", "set", mon_iface, "up"], check=True)
+    run_traced(["iw", "dev", base_iface, "interface", "add", mon_iface, "type", "monitor"], check=True)
+    run_traced(["ip", "link", "set", mon_iface, "up"], check=True)
     print(f"[INFO] Monitor interface '{mon_iface}' is up.")
     
 
 # --- START SNIFFING ---
-def start_sniffer(interface, channel, pcap_file):
-    '''Start tshark capture on the given interface.'''
+@traced()
+def start_sniffer(interface, channel, pcap_file, capture_filter=None, ring_files=0, ring_size_mb=10):
+    '''Start tshark capture on the given interface, optionally filtered and into a ring buffer.'''
     print(f"[INFO] Setting channel {channel} on {interface}")
-    subprocess.run(["iw", interface, "set", "channel", str(channel)], check=True)
-    print(f"[INFO] Starting tshark on {interface}, writing to {pcap_file}...")
-    cmd = [
-        "tshark",
-        "-i", interface,
-        "-w", pcap_file
-    ]
-    return subprocess.Popen(cmd, preexec_fn=os.setsid)
+    run_traced(["iw", interface, "set", "channel", str(channel)], check=True)
+    if ring_files:
+        clear_segments(pcap_file)
+        print(f"[INFO] Starting tshark on {interface}, ring buffer of {ring_files} x {ring_size_mb} MB segments at {pcap_file}...")
+    else:
+        print(f"[INFO] Starting tshark on {interface}, writing to {pcap_file}...")
+    if capture_filter:
+        print(f"[INFO] Capture filter: {capture_filter}")
+    return watch_process(start_capture(sniffer_cmd(interface, pcap_file, capture_filter, ring_files, ring_size_mb)))
 
 # --- STOP SNIFFING ---
+@traced()
 def stop_sniffer(proc):
     '''Terminate the tshark process group.'''
     print("[INFO] Stopping tshark capture...")
     try:
         os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+        # Let tshark flush the capture before anything reads it.
+        proc.wait(timeout=10)
     except Exception as e:
         print(f"[WARN] Failed to stop sniffer cleanly: {e}")
 
+# --- MONITOR DAEMON ---
+def wait_for_daemon_window(client, until, timeout=DAEMON_CATCHUP):
+    '''Poll until the daemon's newest frame is from `until` (time.time()) or later, i.e. frames
+    still on their way through its capture have arrived. Returns False after `timeout` seconds.'''
+    deadline = time.monotonic() + timeout
+    while True:
+        newest = client.status()["window"]["newest"]
+        if newest is not None and newest >= until:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(DAEMON_POLL)
+
+@traced()
+def collect_from_daemon(client, bssid, since, until, pcap_file):
+    '''Save the frames the daemon captured from `since` to the end of the run at `until`
+    (only those with `bssid`, if given) as a pcap.'''
+    if not wait_for_daemon_window(client, until):
+        print(f"[WARN] The monitor daemon captured nothing after the client run within {DAEMON_CATCHUP:.0f}s; the last frames may be missing.")
+    records, complete = client.frames(bssid, since)
+    if not complete:
+        print("[WARN] The daemon's frame window no longer covers the whole run; raise its --window.")
+    write_pcap(pcap_file, records)
+    print(f"[INFO] {len(records)} frames from the monitor daemon written to {pcap_file}")
+
 # --- CREATE CLIENT METHOD ---
-def create_client_cli(mgr, radio, ssid, bssid, passwd, security):
-    '''Start a client from cli using lanforge script'''
-    CREATE_STATION_CMD = [
-        "python3", "/home/lanforge/lanforge-scripts/py-scripts/create_station.py",
-        "--mgr", mgr,
-        "--radio", radio,
-        "--ssid", ssid,
-        "--bssid", bssid,
-        "--passwd", passwd,
-        "--security", security,
-        "--num_stations", "1"
-    ]
-    return subprocess.run(CREATE_STATION_CMD, check=True)
+@traced()
+def create_client_cli(mgr, radio, ssid, bssid, passwd, security, script=STATION_SCRIPT):
+    '''Start a client from cli using lanforge script (or a stand-in with the same arguments)'''
+    return run_traced(station_cmd(mgr, radio, ssid, bssid, passwd, security, script=script), os.path.basename(script), check=True)
+
+# --- SCALE TEST ---
+@traced()
+def run_scale_test(args):
+    '''Create --num-stations stations in batches of --batch-size, --concurrency batches at a time.'''
+    batches = plan_batches(args.num_stations, args.batch_size)
+    print(f"[INFO] Creating {args.num_stations} stations in {len(batches)} batches ({args.concurrency} at a time)...")
+    def create(start_id, count, on_line):
+        create_batch(station_cmd(args.mgr, args.radio, args.ssid, args.bssid, args.passwd, args.security,
+                                 num_stations=count, start_id=start_id, script=args.station_script), on_line)
+    batches = run_batches(create, batches, args.concurrency)
+    fill_station_macs(batches, args.mgr, args.radio)
+    return batches
 
+# --- ANALYZE HANDSHAKES ---
+@traced()
+def analyze_connection(pcap_file, bssid=None):
+    '''Print auth / assoc / SAE / EAPOL timing for every connection attempt in the capture
+    (a file or a list of ring-buffer segments).
+
+    Returns (reports, per-mode summary).'''
+    name = ", ".join(pcap_file) if isinstance(pcap_file, list) else pcap_file
+    print(f"[INFO] Analyzing handshakes in {name}...")
+    stats = HandshakeStats()
+    reports = []
+    try:
+        print(REPORT_HEADER)
+        for report in iter_handshakes(pcap_file, bssid):
+            stats.add(report)
+            reports.append(report)
+            print(format_report(report))
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not analyze {name}: {e}")
+        return reports, None
+    summary = stats.summary()
+    print(format_summary(summary) or "[WARN] No connection attempts found in the capture.")
+    return reports, summary
 
+# --- RESULTS STORE ---
+def connection_metrics(summary, batches=None):
+    '''Per-mode attempt counts and connection times (ms), e.g. wpa3_sae_total_mean_ms.'''
+    metrics = {}
+    for mode, s in (summary or {}).items():
+        prefix = mode.lower().replace("-", "_")
+        metrics[f"{prefix}_attempts"] = s["attempts"]
+        metrics[f"{prefix}_complete"] = s["complete"]
+        for key in ("total_mean", "total_median", "total_max"):
+            if s[key] is not None:
+                metrics[f"{prefix}_{key}_ms"] = s[key] * 1000
+        for name, value in s["phase_mean"].items():
+            metrics[f"{prefix}_{name}_mean_ms"] = value * 1000
+    if batches:
+        metrics["stations"] = sum(b["count"] for b in batches)
+        metrics["creation_wall_s"] = max(b["finished"] for b in batches) - min(b["launched"] for b in batches)
+    return metrics
+
+@traced()
+def store_connection_run(args, started, summary=None, reports=None, batches=None, status="ok"):
+    record_run(args.results_db, "securities", "connection", metrics=connection_metrics(summary, batches),
+               payload={"summary": summary, "reports": reports, "batches": batches},
+               device=args.device or (None if args.bssid == "DEFAULT" else args.bssid) or args.ssid,
+               firmware=args.firmware, started=started, status=status,
+               params={"ssid": args.ssid, "bssid": args.bssid, "security": args.security, "channel": args.channel,
+                       "num_stations": args.num_stations, "batch_size": args.batch_size, "concurrency": args.concurrency})
 
 def main():
     parser = argparse.ArgumentParser(
@@ -61,43 +162,106 @@ def main():
     parser.add_argument("-m", "--monitor-iface", default="mon0", help="Monitor interface name to create")
     parser.add_argument("-c", "--channel", default=None, help="Wireless channel to set on monitor interface (optional)")
     parser.add_argument("-p", "--pcap-out", default="/tmp/connection.pcap", help="Path to write captured pcap")
+    parser.add_argument("--ring-files", type=int, default=0,
+                        help="Capture into a ring buffer of this many segments instead of one growing file (0 = off)")
+    parser.add_argument("--ring-size-mb", type=int, default=10, help="Size of each ring-buffer segment in MB")
+    parser.add_argument("--handshake-filter", action="store_true",
+                        help="Only capture auth/assoc/deauth and EAPOL frames (for --bssid if given), filtered in the kernel")
+    parser.add_argument("--capture-timeout", type=float, default=READY_TIMEOUT,
+                        help="Seconds to wait for tshark to start capturing")
+    parser.add_argument("--daemon", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Use the monitor interface and frame window of a running monitor_daemon.py (default socket: {DEFAULT_SOCKET})")
     parser.add_argument("--mgr", required=True, help="LANforge manager IP")
     parser.add_argument("--radio", required=True, help="Radio interface (e.g. 1.1.wiphy1)")
     parser.add_argument("--ssid", required=True, help="SSID to connect to")
     parser.add_argument("--bssid", default="DEFAULT", help="BSSID to connect to")
     parser.add_argument("--passwd", required=True, help="Password for the SSID")
     parser.add_argument("--security", required=True, help="Security type (e.g. wpa2, wpa3)")
+    parser.add_argument("-n", "--num-stations", type=int, default=1, help="Number of stations to create (scale test when > 1)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Stations per create_station.py call in a scale test")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batches created at the same time in a scale test")
+    parser.add_argument("--station-script", default=STATION_SCRIPT,
+                        help="Station creation script (e.g. create_station_stub.py to benchmark offline)")
+
+    parser.add_argument("--results-db", default=DEFAULT_STORE,
+                        help=f"Shared results store the run is added to ('' = off, default: {DEFAULT_STORE})")
+    parser.add_argument("--device", help="Device (AP) name for the results store (default: --bssid, else --ssid)")
+    parser.add_argument("--firmware", help="AP firmware build for the results store")
+    add_trace_argument(parser)
 
     args = parser.parse_args()
+    started = time.time()
+    if args.trace:
+        enable_tracing("securities_full")
+        atexit.register(finish_tracing, args.trace)
+    if args.daemon and (args.channel is None or args.ring_files or args.handshake_filter):
+        parser.error("--daemon needs --channel and captures through the daemon (no --ring-files/--handshake-filter)")
 
-    # Setup monitor
-    try:
-        setup_monitor(args.base_iface, args.monitor_iface)
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Failed to set up monitor interface: {e}")
-        sys.exit(1)
+    bssid = None if args.bssid == "DEFAULT" else args.bssid
+    sniffer = daemon = None
+    if args.daemon:
+        daemon = MonitorClient(args.daemon)
+        try:
+            with span("daemon ensure"):
+                state = daemon.ensure(args.base_iface, args.monitor_iface, args.channel)
+        except DaemonError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        print(f"[INFO] Monitor daemon: {state['mon']} on channel {state['channel']} ready in {state['ms']:.1f} ms")
+        since = time.time()
+    else:
+        # Setup monitor
+        try:
+            setup_monitor(args.base_iface, args.monitor_iface)
+        except subprocess.CalledProcessError as e:
+            print(f"[ERROR] Failed to set up monitor interface: {e}")
+            sys.exit(1)
 
-    sniffer = start_sniffer(args.monitor_iface, args.channel, args.pcap_out)
-    time.sleep(1)
-    
+        sniffer = start_sniffer(args.monitor_iface, args.channel, args.pcap_out,
+                                handshake_filter(bssid) if args.handshake_filter else None, args.ring_files, args.ring_size_mb)
+        # Don't start the client before tshark is capturing, or the first frames are lost.
+        with span("wait_until_capturing"):
+            capturing = wait_until_capturing(sniffer, args.capture_timeout)
+        if not capturing and sniffer.poll() is not None:
+            sys.exit(1)
+
+    batches = None
     try:
         print("[INFO] Running client creation command...")
-        create_client_cli(
-            mgr=args.mgr,
-            radio=args.radio,
-            ssid=args.ssid,
-            bssid=args.bssid,
-            passwd=args.passwd,
-            security=args.security
-        )
+        if args.num_stations > 1:
+            batches = run_scale_test(args)
+        else:
+            create_client_cli(
+                mgr=args.mgr,
+                radio=args.radio,
+                ssid=args.ssid,
+                bssid=args.bssid,
+                passwd=args.passwd,
+                security=args.security,
+                script=args.station_script
+            )
     except subprocess.CalledProcessError as e:
         print(f"[ERROR] Client creation failed: {e}")
-        stop_sniffer(sniffer)
+        store_connection_run(args, started, status="failed")
         sys.exit(1)
     finally:
-        stop_sniffer(sniffer)
+        finished = time.time()
+        if sniffer:
+            stop_sniffer(sniffer)
 
-    print(f"[INFO] Capture available at {args.pcap_out}")
+    if daemon:
+        try:
+            collect_from_daemon(daemon, bssid, since, finished, args.pcap_out)
+        except DaemonError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+    segments = capture_segments(args.pcap_out, ring=args.ring_files > 0)
+    print(f"[INFO] Capture available at {', '.join(segments) or args.pcap_out}")
+    reports, summary = analyze_connection(segments, bssid)
+    if batches:
+        unmatched = join_with_capture(batches, reports)
+        print(format_scale_report(batches, unmatched))
+    store_connection_run(args, started, summary, reports, batches, "ok" if summary is not None else "failed")
 
 
 if __name__ == "__main__":
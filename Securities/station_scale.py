@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == "__main__":
+    # Run as a script; securities_full.py sets up the path when it imports this module.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from tracing import watch_process
+
+STATION_SCRIPT = "/home/lanforge/lanforge-scripts/py-scripts/create_station.py"
+# create_station.py names the stations sta0000, sta0001, ... counting from --start_id.
+STATION_PREFIX = "sta"
+STATION_NAME = re.compile(rf"\b{STATION_PREFIX}\d{{4,}}\b")
+MAC = re.compile(r"\b(?:[0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2}\b")
+# LANforge JSON API, used to look up the MACs of the created stations.
+LANFORGE_PORT = 8080
+
+
+# --- STATION COMMANDS ---
+def station_names(start_id, count):
+    return [f"{STATION_PREFIX}{n:04d}" for n in range(start_id, start_id + count)]
+
+def station_cmd(mgr, radio, ssid, bssid, passwd, security, num_stations=1, start_id=None, script=STATION_SCRIPT):
+    '''The create_station.py command line (or one for a stand-in with the same arguments).'''
+    cmd = [
+        "python3", script,
+        "--mgr", mgr,
+        "--radio", radio,
+        "--ssid", ssid,
+        "--bssid", bssid,
+        "--passwd", passwd,
+        "--security", security,
+        "--num_stations", str(num_stations)
+    ]
+    if start_id is not None:
+        cmd += ["--start_id", str(start_id)]
+    return cmd
+
+def create_batch(cmd, on_line=None):
+    '''Run a station creation command, passing each output line to `on_line` as it arrives.
+    Raises CalledProcessError if it fails.'''
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    watch_process(proc, os.path.basename(cmd[1]))
+    output = []
+    for line in proc.stdout:
+        output.append(line)
+        if on_line:
+            on_line(line)
+    proc.stdout.close()
+    if proc.wait():
+        raise subprocess.CalledProcessError(proc.returncode, cmd, "".join(output))
+
+def port_macs(mgr, radio, names, timeout=5):
+    '''MAC per station name from the LANforge port list of the radio's shelf/resource.'''
+    shelf, resource = radio.split(".")[:2]
+    url = f"http://{mgr}:{LANFORGE_PORT}/port/{shelf}/{resource}/{','.join(names)}?fields=alias,mac"
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = json.load(response)
+    # One port comes back as "interface", several as "interfaces": [{eid: fields}, ...].
+    ports = [data["interface"]] if "interface" in data else [
+        fields for entry in data.get("interfaces", []) for fields in entry.values()]
+    return {port["alias"]: port["mac"].lower() for port in ports if port.get("alias") and port.get("mac")}
+
+
+# --- BATCH PLANNING ---
+def plan_batches(num_stations, batch_size, start_id=0):
+    '''Split N stations into (start_id, count) batches of at most `batch_size`.'''
+    batches = []
+    for first in range(0, num_stations, batch_size):
+        batches.append((start_id + first, min(batch_size, num_stations - first)))
+    return batches
+
+
+# --- BATCH EXECUTION ---
+def run_batches(create, batches, concurrency=4):
+    '''Run `create(start_id, count, on_line)` for every batch, at most `concurrency` at a time.
+
+    Returns one record per batch with its wall-clock launch/finish times (time.time(),
+    the same clock as the capture timestamps), the error, if any, and one record per
+    station: its name, its MAC if the output names it, when it was requested and when
+    the output first reported it.'''
+    def run(batch):
+        start_id, count = batch
+        record = {"start_id": start_id, "count": count, "launched": time.time(), "error": None}
+        stations = {name: {"name": name, "mac": None, "requested": record["launched"], "created": None}
+                    for name in station_names(start_id, count)}
+
+        def on_line(line):
+            now = time.time()
+            names = [name for name in STATION_NAME.findall(line) if name in stations]
+            macs = MAC.findall(line)
+            for name in names:
+                if stations[name]["created"] is None:
+                    stations[name]["created"] = now
+            if len(names) == 1 and len(macs) == 1:
+                stations[names[0]]["mac"] = macs[0].lower()
+
+        try:
+            create(start_id, count, on_line)
+        except Exception as e:
+            record["error"] = str(e)
+        record["finished"] = time.time()
+        record["stations"] = list(stations.values())
+        print(f"[INFO] Stations {start_id}-{start_id + count - 1}: "
+              f"{'FAILED ' + record['error'] if record['error'] else 'created'} in {record['finished'] - record['launched']:.2f}s")
+        return record
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return list(pool.map(run, batches))
+
+def fill_station_macs(batches, mgr, radio):
+    '''Look up the MACs the creation output did not print in the LANforge port list.'''
+    missing = [sta["name"] for b in batches if not b["error"] for sta in b["stations"] if not sta["mac"]]
+    if not missing:
+        return
+    try:
+        macs = port_macs(mgr, radio, missing)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Could not read the station MACs from LANforge on {mgr}: {e}")
+        return
+    for b in batches:
+        for sta in b["stations"]:
+            sta["mac"] = sta["mac"] or macs.get(sta["name"])
+
+
+# --- JOIN WITH CAPTURE ---
+def join_with_capture(batches, reports):
+    '''Attribute each handshake report to the created station with its MAC and add per-batch
+    attempt and connected counts and request-to-4/4 latencies (first complete attempt of
+    each station). Returns the number of reports from no created station.'''
+    by_mac = {}
+    for batch in batches:
+        batch["attempts"] = 0
+        batch["connected"] = 0
+        batch["latencies"] = []
+        for sta in batch["stations"]:
+            sta["attempts"] = 0
+            sta["connected"] = None
+            if sta["mac"]:
+                by_mac[sta["mac"]] = (batch, sta)
+    unmatched = 0
+    for report in sorted(reports, key=lambda r: r["start"]):
+        owner = by_mac.get(report["sta"].lower())
+        if owner is None:
+            unmatched += 1
+            continue
+        batch, sta = owner
+        batch["attempts"] += 1
+        sta["attempts"] += 1
+        if report["complete"] and sta["connected"] is None:
+            sta["connected"] = report["start"] + report["total"]
+            batch["connected"] += 1
+            batch["latencies"].append(sta["connected"] - sta["requested"])
+    return unmatched
+
+
+def format_scale_report(batches, unmatched=0):
+    lines = [f"{'stations':<12} {'create s':>9} {'attempts':>9} {'connected':>10} {'p50 s':>7} {'max s':>7}  status"]
+    for b in sorted(batches, key=lambda b: b["start_id"]):
+        latencies = sorted(b.get("latencies", []))
+        p50 = f"{latencies[len(latencies) // 2]:.2f}" if latencies else "-"
+        worst = f"{latencies[-1]:.2f}" if latencies else "-"
+        span = f"{b['start_id']}-{b['start_id'] + b['count'] - 1}"
+        lines.append(f"{span:<12} {b['finished'] - b['launched']:>9.2f} {b.get('attempts', '-'):>9} {b.get('connected', '-'):>10} "
+                     f"{p50:>7} {worst:>7}  {'FAILED ' + b['error'] if b['error'] else 'ok'}")
+    wall = max(b["finished"] for b in batches) - min(b["launched"] for b in batches)
+    busy = sum(b["finished"] - b["launched"] for b in batches)
+    lines.append(f"[INFO] {sum(b['count'] for b in batches)} stations in {len(batches)} batches: "
+                 f"{wall:.2f}s wall clock, {busy:.2f}s spent in station creation")
+    unknown = sum(1 for b in batches if not b["error"] for sta in b["stations"] if not sta["mac"])
+    if unknown:
+        lines.append(f"[WARN] {unknown} stations have no known MAC; their connection attempts are not counted")
+    if unmatched:
+        lines.append(f"[WARN] {unmatched} connection attempts in the capture are from no created station")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time batched station creation without sniffing (e.g. against create_station_stub.py)")
+    parser.add_argument("-n", "--num-stations", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--station-script", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "create_station_stub.py"))
+    parser.add_argument("--mgr", default="localhost")
+    parser.add_argument("--radio", default="1.1.wiphy0")
+    parser.add_argument("--ssid", default="scale-test")
+    parser.add_argument("--bssid", default="DEFAULT")
+    parser.add_argument("--passwd", default="12345678")
+    parser.add_argument("--security", default="wpa2")
+    args = parser.parse_args()
+
+    def create(start_id, count, on_line):
+        create_batch(station_cmd(args.mgr, args.radio, args.ssid, args.bssid, args.passwd, args.security,
+                                 num_stations=count, start_id=start_id, script=args.station_script), on_line)
+    batches = run_batches(create, plan_batches(args.num_stations, args.batch_size), args.concurrency)
+    print(format_scale_report(batches))
+
+
+if __name__ == "__main__":
+    main()